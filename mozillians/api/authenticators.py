@@ -13,14 +13,13 @@ class AppAuthentication(Authentication):
         app_key = request.GET.get('app_key', '')
         app_name = request.GET.get('app_name', '')
 
-        try:
-            app = APIApp.objects.get(name__iexact=app_name, key=app_key, is_active=True)
-        except APIApp.DoesNotExist:
+        app = APIApp.get_auth_data(app_name, app_key)
+        if not app:
             statsd.incr('api.auth.failed')
             return False
 
         statsd.incr('api.auth.success')
-        if not app.is_mozilla_app:
+        if not app['is_mozilla_app']:
             statsd.incr('api.requests.total_community')
             data = request.GET.copy()
             data['restricted'] = True
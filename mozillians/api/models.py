@@ -1,9 +1,24 @@
 import hmac
+import time
 import uuid
 from hashlib import sha1
 
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import models
+from django.db.models import signals as dbsignals
+from django.dispatch import receiver
+
+
+AUTH_CACHE_KEY = 'api:auth:%s'
+AUTH_CACHE_TIMEOUT = getattr(settings, 'API_AUTH_CACHE_TIMEOUT', 60 * 10)
+AUTH_NEGATIVE_CACHE_TIMEOUT = getattr(settings, 'API_AUTH_NEGATIVE_CACHE_TIMEOUT', 30)
+# Entries cached in process cannot be invalidated from other
+# processes, keep them for a short time only.
+AUTH_LOCAL_CACHE_TIMEOUT = getattr(settings, 'API_AUTH_LOCAL_CACHE_TIMEOUT', 30)
+AUTH_LOCAL_CACHE_MAX_ENTRIES = 1000
+_auth_local_cache = {}
 
 
 class APIApp(models.Model):
@@ -34,3 +49,71 @@ class APIApp(models.Model):
         """Return a key."""
         new_uuid = uuid.uuid4()
         return hmac.new(str(new_uuid), digestmod=sha1).hexdigest()
+
+    @classmethod
+    def get_auth_data(cls, name, key):
+        """Return a dictionary with the id and is_mozilla_app of the
+        active app matching name and key, or None if there is none.
+
+        Results, including misses, are cached in process and in the
+        cache backend, so most API requests do not hit the database.
+
+        """
+        cache_key = _auth_cache_key(name, key)
+        entry = _auth_local_cache.get(cache_key)
+        if entry and entry[0] > time.time():
+            return entry[1]
+
+        data = cache.get(cache_key)
+        if data is None:
+            try:
+                app = cls.objects.get(name__iexact=name, key=key, is_active=True)
+            except cls.DoesNotExist:
+                data = False
+                timeout = AUTH_NEGATIVE_CACHE_TIMEOUT
+            else:
+                data = {'id': app.id, 'is_mozilla_app': app.is_mozilla_app}
+                timeout = AUTH_CACHE_TIMEOUT
+            cache.set(cache_key, data, timeout)
+        else:
+            timeout = AUTH_CACHE_TIMEOUT if data else AUTH_NEGATIVE_CACHE_TIMEOUT
+
+        if len(_auth_local_cache) >= AUTH_LOCAL_CACHE_MAX_ENTRIES:
+            # Don't let floods of bad keys grow the cache forever.
+            _auth_local_cache.clear()
+        _auth_local_cache[cache_key] = (
+            time.time() + min(timeout, AUTH_LOCAL_CACHE_TIMEOUT), data)
+        return data or None
+
+
+def _auth_cache_key(name, key):
+    # Names are matched case insensitively. Hash the pair so that any
+    # name or key gives a valid memcached key.
+    digest = sha1((u'%s:%s' % (name.lower(), key)).encode('utf-8')).hexdigest()
+    return AUTH_CACHE_KEY % digest
+
+
+def invalidate_auth_cache(name, key):
+    cache_key = _auth_cache_key(name, key)
+    _auth_local_cache.pop(cache_key, None)
+    cache.delete(cache_key)
+
+
+@receiver(dbsignals.pre_save, sender=APIApp,
+          dispatch_uid='invalidate_api_auth_cache_pre_save_sig')
+def invalidate_previous_auth_cache(sender, instance, raw, **kwargs):
+    """Forget the name and key the app had before it gets saved."""
+    if instance.pk and not raw:
+        try:
+            previous = APIApp.objects.get(pk=instance.pk)
+        except APIApp.DoesNotExist:
+            return
+        invalidate_auth_cache(previous.name, previous.key)
+
+
+@receiver(dbsignals.post_save, sender=APIApp,
+          dispatch_uid='invalidate_api_auth_cache_post_save_sig')
+@receiver(dbsignals.post_delete, sender=APIApp,
+          dispatch_uid='invalidate_api_auth_cache_post_delete_sig')
+def invalidate_app_auth_cache(sender, instance, **kwargs):
+    invalidate_auth_cache(instance.name, instance.key)
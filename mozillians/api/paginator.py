@@ -1,9 +1,21 @@
+import base64
+from urllib import urlencode
+
 from django.conf import settings
 from tastypie import paginator
+from tastypie.exceptions import BadRequest
 
 
 class Paginator(paginator.Paginator):
-    """Paginator with a hard limit on results per page."""
+    """Paginator with a hard limit on results per page.
+
+    Passing a ``cursor`` parameter switches to cursor pagination:
+    objects are returned in ``id`` order, starting after the object
+    the cursor points to, and ``meta['next']`` links to the next page
+    with a new cursor. An empty cursor starts from the beginning. The
+    total count is only computed when ``total_count=true`` is passed.
+
+    """
 
     def get_limit(self):
         """Determines the proper maximum number of results to return.
@@ -28,3 +40,52 @@ class Paginator(paginator.Paginator):
         Elastic Search crashes and timeouts.
         """
         return min(super(Paginator, self).get_offset(), self.get_count())
+
+    def encode_cursor(self, last_id):
+        return base64.urlsafe_b64encode('id:%d' % last_id)
+
+    def decode_cursor(self, cursor):
+        """Return the id cursor points after, 0 for an empty cursor."""
+        if not cursor:
+            return 0
+        try:
+            prefix, last_id = base64.urlsafe_b64decode(cursor.encode('ascii')).split(':')
+            if prefix != 'id':
+                raise ValueError
+            return int(last_id)
+        except (TypeError, UnicodeError, ValueError):
+            raise BadRequest("Invalid cursor '%s' provided." % cursor)
+
+    def _generate_cursor_uri(self, limit, cursor):
+        if self.resource_uri is None:
+            return None
+        request_params = self.request_data.copy()
+        for param in ['offset', 'limit', 'cursor']:
+            if param in request_params:
+                del request_params[param]
+        request_params.update({'limit': limit, 'cursor': cursor})
+        try:
+            encoded_params = request_params.urlencode()
+        except AttributeError:
+            # request_data is a plain dict.
+            encoded_params = urlencode(request_params)
+        return '%s?%s' % (self.resource_uri, encoded_params)
+
+    def page(self):
+        if 'cursor' not in self.request_data:
+            return super(Paginator, self).page()
+
+        limit = self.get_limit() or getattr(settings, 'HARD_API_LIMIT_PER_PAGE', 500)
+        last_id = self.decode_cursor(self.request_data['cursor'])
+
+        meta = {'limit': limit, 'next': None}
+        if self.request_data.get('total_count', '').lower() == 'true':
+            meta['total_count'] = self.get_count()
+
+        self.objects = self.objects.filter(id__gt=last_id).order_by('id')
+        objects = list(self.get_slice(limit, 0))
+        # A full page means there may be more objects after it.
+        if len(objects) == limit:
+            meta['next'] = self._generate_cursor_uri(limit, self.encode_cursor(objects[-1].id))
+
+        return {'objects': objects, 'meta': meta}
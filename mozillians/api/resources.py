@@ -28,13 +28,19 @@ class ClientCacheResourceMixIn(object):
 class AdvancedSortingResourceMixIn(object):
     """
     MixIn to allow sorting on multiple values in the same query.
+
+    Values listed in an optional ``ordering_aliases`` dictionary in
+    Meta are translated to the field names they sort by.
     """
 
     def apply_sorting(self, obj_list, options=None):
         """Allow sorting on multiple values. """
-        sort_list = [order_value for order_value
-                     in options.get('order_by', '').split(',')
-                     if order_value.strip('-') in self.Meta.ordering]
+        aliases = getattr(self.Meta, 'ordering_aliases', {})
+        sort_list = []
+        for order_value in options.get('order_by', '').split(','):
+            name = order_value.strip('-')
+            if name in self.Meta.ordering:
+                sort_list.append(order_value.replace(name, aliases.get(name, name)))
 
         if not sort_list:
             sort_list = self.Meta.default_order
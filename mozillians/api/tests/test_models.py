@@ -1,8 +1,12 @@
-from nose.tools import ok_
+from django.core.cache import get_cache
+
+from mock import patch
+from nose.tools import eq_, ok_
 from test_utils import TestCase
 
 from mozillians.users.tests import UserFactory
-from mozillians.api.models import APIApp
+from mozillians.api.models import APIApp, _auth_local_cache
+from mozillians.api.tests import APIAppFactory
 
 
 class APIAppTests(TestCase):
@@ -12,3 +16,54 @@ class APIAppTests(TestCase):
                                         description='Foo',
                                         key='')
         ok_(api_app.key != '')
+
+
+class AuthDataTests(TestCase):
+    def setUp(self):
+        _auth_local_cache.clear()
+        patcher = patch('mozillians.api.models.cache',
+                        get_cache('django.core.cache.backends.locmem.LocMemCache'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cached(self):
+        app = APIAppFactory.create(is_mozilla_app=True)
+        data = {'id': app.id, 'is_mozilla_app': True}
+        eq_(APIApp.get_auth_data(app.name.upper(), app.key), data)
+        with self.assertNumQueries(0):
+            eq_(APIApp.get_auth_data(app.name, app.key), data)
+        _auth_local_cache.clear()
+        with self.assertNumQueries(0):
+            eq_(APIApp.get_auth_data(app.name, app.key), data)
+
+    def test_negative_cached(self):
+        eq_(APIApp.get_auth_data('invalid', 'invalid'), None)
+        with self.assertNumQueries(0):
+            eq_(APIApp.get_auth_data('invalid', 'invalid'), None)
+
+    def test_invalidate_on_save(self):
+        app = APIAppFactory.create()
+        ok_(APIApp.get_auth_data(app.name, app.key))
+        app.is_active = False
+        app.save()
+        eq_(APIApp.get_auth_data(app.name, app.key), None)
+
+    def test_invalidate_on_key_change(self):
+        app = APIAppFactory.create()
+        old_key = app.key
+        ok_(APIApp.get_auth_data(app.name, old_key))
+        app.key = app.generate_key()
+        app.save()
+        eq_(APIApp.get_auth_data(app.name, old_key), None)
+        ok_(APIApp.get_auth_data(app.name, app.key))
+
+    def test_invalidate_on_create(self):
+        eq_(APIApp.get_auth_data('Foo', 'bar'), None)
+        APIAppFactory.create(name='Foo', key='bar')
+        ok_(APIApp.get_auth_data('Foo', 'bar'))
+
+    def test_invalidate_on_delete(self):
+        app = APIAppFactory.create()
+        ok_(APIApp.get_auth_data(app.name, app.key))
+        app.delete()
+        eq_(APIApp.get_auth_data(app.name, app.key), None)
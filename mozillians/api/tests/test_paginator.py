@@ -0,0 +1,46 @@
+from django.http import QueryDict
+
+from nose.tools import eq_, ok_
+from tastypie.exceptions import BadRequest
+
+from mozillians.api.paginator import Paginator
+from mozillians.common.tests import TestCase
+from mozillians.users.models import UserProfile
+from mozillians.users.tests import UserFactory
+
+
+class PaginatorCursorTests(TestCase):
+    def setUp(self):
+        self.profiles = [UserFactory.create().userprofile for i in range(3)]
+
+    def get_page(self, query):
+        paginator = Paginator(QueryDict(query), UserProfile.objects.all(),
+                              resource_uri='/api/v1/users/')
+        return paginator.page()
+
+    def test_walk(self):
+        page = self.get_page('cursor=&limit=2')
+        eq_(page['objects'], self.profiles[:2])
+        ok_('total_count' not in page['meta'])
+
+        query = page['meta']['next'].split('?')[1]
+        page = self.get_page(query)
+        eq_(page['objects'], self.profiles[2:])
+        eq_(page['meta']['next'], None)
+
+    def test_total_count(self):
+        page = self.get_page('cursor=&limit=2&total_count=true')
+        eq_(page['meta']['total_count'], 3)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(BadRequest):
+            self.get_page('cursor=foo')
+
+    def test_non_ascii_cursor(self):
+        with self.assertRaises(BadRequest):
+            self.get_page('cursor=%C3%A9')
+
+    def test_offset_mode(self):
+        page = self.get_page('limit=2&offset=1')
+        eq_(page['meta']['offset'], 1)
+        eq_(list(page['objects']), list(UserProfile.objects.all()[1:3]))
@@ -11,6 +11,9 @@ from mock import patch
 from nose.tools import make_decorator, ok_
 from test_utils import TestCase as BaseTestCase
 
+from mozillians.geo.index import reset_index as reset_geo_index
+from mozillians.geo.registry import geo_registry
+
 
 AUTHENTICATION_BACKENDS = (
     'mozillians.common.tests.authentication.DummyAuthenticationBackend',
@@ -24,6 +27,12 @@ ES_INDEXES = {
 @override_settings(AUTHENTICATION_BACKENDS=AUTHENTICATION_BACKENDS,
                    ES_INDEXES=ES_INDEXES)
 class TestCase(BaseTestCase):
+    def _pre_setup(self):
+        # Runs before setUp, which tests override without calling it.
+        super(TestCase, self)._pre_setup()
+        reset_geo_index()
+        geo_registry.clear()
+
     @contextmanager
     def login(self, user):
         client = Client()
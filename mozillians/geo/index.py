@@ -0,0 +1,309 @@
+"""
+Local reverse geocoding.
+
+GeoIndex answers reverse geocoding queries from the cities already in
+the database and, when GEO_BOUNDARIES_FILE is set, from country and
+region boundaries, without calling Mapbox.
+
+The boundaries file is a GeoJSON FeatureCollection of Polygon or
+MultiPolygon features whose properties hold the 'mapbox_id' of a
+Country or Region and its Mapbox 'type' ('country' or 'province').
+"""
+import json
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import signals as dbsignals
+from django.dispatch import receiver
+
+from mozillians.geo.models import City, Country, Region
+
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+
+def distance(lat1, lng1, lat2, lng2):
+    """Return the great circle distance between two points in km."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(a)))
+
+
+class Grid(object):
+    """Buckets of items in cells of cell_size by cell_size degrees.
+
+    Columns wrap around the antimeridian.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.columns = int(math.ceil(360 / cell_size))
+        self.cells = defaultdict(list)
+
+    def cell(self, lat, lng):
+        row = int(math.floor((lat + 90) / self.cell_size))
+        column = int(math.floor((lng + 180) / self.cell_size)) % self.columns
+        return row, column
+
+    def add(self, lat, lng, item):
+        """Add item to the cell of a point and return the cell."""
+        cell = self.cell(lat, lng)
+        self.cells[cell].append(item)
+        return cell
+
+    def remove(self, cell, item):
+        """Remove item from cell. The list of the cell is replaced, so
+        that lookups iterating over it aren't disturbed.
+        """
+        items = self.cells.get(cell, [])
+        self.cells[cell] = [other for other in items if other is not item]
+
+    def add_box(self, south, west, north, east, item):
+        """Add item to all cells overlapping a bounding box."""
+        bottom, left = self.cell(south, west)
+        top, right = self.cell(north, east)
+        if right < left:
+            right += self.columns
+        for row in range(bottom, top + 1):
+            for column in range(left, right + 1):
+                self.cells[(row, column % self.columns)].append(item)
+
+    def near(self, lat, lng, rows=0, columns=0):
+        """Yield the items in the cells up to rows and columns away
+        from the cell of a point.
+        """
+        row, column = self.cell(lat, lng)
+        columns = min(columns, self.columns // 2)
+        for i in range(row - rows, row + rows + 1):
+            for j in range(column - columns, column + columns + 1):
+                for item in self.cells.get((i, j % self.columns), ()):
+                    yield item
+
+
+class Boundary(object):
+    """Polygons outlining a Country or a Region."""
+
+    def __init__(self, polygons, country, region=None):
+        # Polygons are lists of rings, rings are lists of (lng, lat).
+        self.polygons = [[[(float(point[0]), float(point[1])) for point in ring]
+                          for ring in polygon]
+                         for polygon in polygons]
+        self.country = country
+        self.region = region
+        points = [point for polygon in self.polygons for point in polygon[0]]
+        self.west = min(lng for lng, lat in points)
+        self.east = max(lng for lng, lat in points)
+        self.south = min(lat for lng, lat in points)
+        self.north = max(lat for lng, lat in points)
+
+    def contains(self, lat, lng):
+        if not (self.south <= lat <= self.north and self.west <= lng <= self.east):
+            return False
+        for polygon in self.polygons:
+            # Inside the outer ring and outside of all the holes.
+            if (_ring_contains(polygon[0], lat, lng)
+                    and not any(_ring_contains(hole, lat, lng) for hole in polygon[1:])):
+                return True
+        return False
+
+
+def _ring_contains(ring, lat, lng):
+    """Ray casting point in polygon test."""
+    inside = False
+    x1, y1 = ring[-1]
+    for x2, y2 in ring:
+        if (y2 > lat) != (y1 > lat) and lng < (x1 - x2) * (lat - y2) / (y1 - y2) + x2:
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+
+def load_boundaries(path):
+    """Return the Boundaries in a GeoJSON file, matched to the
+    Countries and Regions in the database by mapbox_id.
+    """
+    with open(path) as f:
+        data = json.load(f)
+
+    countries = dict((country.mapbox_id, country) for country in Country.objects.all())
+    regions = dict((region.mapbox_id, region)
+                   for region in Region.objects.select_related('country'))
+
+    boundaries = []
+    for feature in data.get('features', []):
+        properties = feature.get('properties') or {}
+        geometry = feature.get('geometry') or {}
+        mapbox_id = properties.get('mapbox_id')
+        if geometry.get('type') == 'Polygon':
+            polygons = [geometry['coordinates']]
+        elif geometry.get('type') == 'MultiPolygon':
+            polygons = geometry['coordinates']
+        else:
+            continue
+
+        if properties.get('type') == 'province' and mapbox_id in regions:
+            region = regions[mapbox_id]
+            boundaries.append(Boundary(polygons, region.country, region))
+        elif properties.get('type') == 'country' and mapbox_id in countries:
+            boundaries.append(Boundary(polygons, countries[mapbox_id]))
+        else:
+            logger.debug('Skipping boundary of unknown %s.' % mapbox_id)
+    return boundaries
+
+
+class GeoIndex(object):
+    """Spatial index of cities and boundaries for reverse geocoding.
+
+    Returned Country, Region and City objects are shared between
+    lookups and must not be modified.
+    """
+
+    def __init__(self, cities, boundaries=(), city_cell_size=1.0, boundary_cell_size=5.0):
+        self.cities = Grid(city_cell_size)
+        # Maps city ids to the city and the cell it was added to.
+        self.city_cells = {}
+        for city in cities:
+            self.add_city(city)
+
+        self.boundaries = Grid(boundary_cell_size)
+        for boundary in boundaries:
+            self.boundaries.add_box(boundary.south, boundary.west,
+                                    boundary.north, boundary.east, boundary)
+
+    @classmethod
+    def load(cls):
+        """Build an index of all cities and of the boundaries in
+        GEO_BOUNDARIES_FILE.
+        """
+        cities = City.objects.select_related('region', 'country')
+        path = getattr(settings, 'GEO_BOUNDARIES_FILE', None)
+        boundaries = load_boundaries(path) if path else []
+        return cls(cities, boundaries)
+
+    def add_city(self, city):
+        """Add city to the index, replacing the city with its id."""
+        self.remove_city(city.id)
+        self.city_cells[city.id] = (city, self.cities.add(city.lat, city.lng, city))
+
+    def remove_city(self, city_id):
+        """Remove the city with city_id from the index, if it's there."""
+        entry = self.city_cells.pop(city_id, None)
+        if entry is not None:
+            city, cell = entry
+            self.cities.remove(cell, city)
+
+    def nearest_city(self, lat, lng, max_distance):
+        """Return the city closest to a point within max_distance km,
+        or None.
+        """
+        cell_size = self.cities.cell_size
+        rows = int(math.ceil(max_distance / (KM_PER_DEGREE * cell_size)))
+        # Degrees of longitude get shorter towards the poles.
+        parallel = KM_PER_DEGREE * cell_size * math.cos(math.radians(min(abs(lat), 89.9)))
+        columns = int(math.ceil(max_distance / parallel))
+
+        nearest, nearest_distance = None, max_distance
+        for city in self.cities.near(lat, lng, rows, columns):
+            city_distance = distance(lat, lng, city.lat, city.lng)
+            if city_distance <= nearest_distance:
+                nearest, nearest_distance = city, city_distance
+        return nearest
+
+    def boundaries_at(self, lat, lng):
+        """Return the Country and Region whose boundaries contain a
+        point. Either might be None.
+        """
+        country = region = None
+        for boundary in self.boundaries.near(lat, lng):
+            if boundary.contains(lat, lng):
+                if boundary.region:
+                    region = boundary.region
+                country = boundary.country
+        return country, region
+
+    def lookup(self, lat, lng, max_distance=None):
+        """Return a 3-tuple of Country, Region and City objects for a
+        point, like lookup.reverse_geocode, or None if the index
+        doesn't know the country of the point.
+        """
+        if max_distance is None:
+            max_distance = getattr(settings, 'GEO_LOCAL_MAX_DISTANCE', 5)
+        country, region = self.boundaries_at(lat, lng)
+        city = self.nearest_city(lat, lng, max_distance)
+
+        # Boundaries are more precise than the distance to a city.
+        if city and country and city.country_id != country.id:
+            city = None
+        if city and region and city.region_id != region.id:
+            city = None
+
+        if city:
+            return city.country, city.region, city
+        if country:
+            return country, region, None
+        return None
+
+
+_index = None
+_index_expires = 0
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Return the process wide GeoIndex, building it when it's missing
+    or older than GEO_LOCAL_INDEX_TIMEOUT seconds.
+    """
+    global _index, _index_expires
+    with _index_lock:
+        if _index is None or _index_expires < time.time():
+            _index = GeoIndex.load()
+            _index_expires = time.time() + getattr(settings, 'GEO_LOCAL_INDEX_TIMEOUT', 3600)
+        return _index
+
+
+def reset_index():
+    """Drop the GeoIndex so that the next lookup rebuilds it."""
+    global _index
+    _index = None
+
+
+@receiver(dbsignals.post_save, sender=City, dispatch_uid='index_geo_city_save_sig')
+def index_city(sender, instance, **kwargs):
+    """Add a saved city to the GeoIndex, if it's built."""
+    index = _index
+    if index is not None and not kwargs.get('raw'):
+        # Lookups return the city with its country and region, load
+        # them along with a copy of the city that isn't shared.
+        city = City.objects.select_related('region', 'country').get(pk=instance.pk)
+        with _index_lock:
+            index.add_city(city)
+
+
+@receiver(dbsignals.post_delete, sender=City, dispatch_uid='unindex_geo_city_delete_sig')
+def unindex_city(sender, instance, **kwargs):
+    index = _index
+    if index is not None:
+        with _index_lock:
+            index.remove_city(instance.id)
+
+
+@receiver(dbsignals.post_save, sender=Region, dispatch_uid='reset_geo_index_region_save_sig')
+@receiver(dbsignals.post_delete, sender=Region,
+          dispatch_uid='reset_geo_index_region_delete_sig')
+@receiver(dbsignals.post_save, sender=Country, dispatch_uid='reset_geo_index_country_save_sig')
+@receiver(dbsignals.post_delete, sender=Country,
+          dispatch_uid='reset_geo_index_country_delete_sig')
+def reset_index_after_change(sender, instance, **kwargs):
+    """Drop the GeoIndex when a country or region it might hold
+    changes. New ones aren't in the index yet.
+    """
+    if not kwargs.get('created'):
+        reset_index()
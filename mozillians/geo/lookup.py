@@ -1,12 +1,19 @@
 import logging
+import threading
+import time
+from collections import OrderedDict
+
 import requests
 from requests import ConnectionError, HTTPError
 
 from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
 
-from product_details import product_details
+from django_statsd.clients import statsd
 
+from mozillians.geo.index import get_index
 from mozillians.geo.models import Country, Region, City
+from mozillians.geo.registry import geo_registry
 
 
 logger = logging.getLogger(__name__)
@@ -42,17 +49,125 @@ logger = logging.getLogger(__name__)
 # }
 
 
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
 class GeoLookupException(Exception):
     pass
 
 
+def geohash(lat, lng, precision):
+    """Return the geohash of a point with precision characters."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < precision:
+        # Bits alternate between halving longitude and latitude ranges.
+        coordinate, bounds = (lng, lng_range) if even else (lat, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+class ReverseGeocodeCache(object):
+    """LRU cache of the Country, Region and City ids Mapbox resolved
+    locations to, keyed on the geohash of the locations.
+
+    Locations sharing a geohash of precision characters share results.
+    Entries expire after timeout seconds and the least recently used
+    entries are dropped beyond max_entries.
+    """
+
+    def __init__(self, precision, timeout, max_entries):
+        self.precision = precision
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, lat, lng):
+        """Return the (country_id, region_id, city_id) cached for a
+        location or None.
+        """
+        key = geohash(lat, lng, self.precision)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry and entry[0] > time.time():
+                # Move to the most recently used end.
+                self.entries[key] = entry
+                self.hits += 1
+                statsd.incr('geo.reverse_geocode_cache.hit')
+                return entry[1]
+            self.misses += 1
+        statsd.incr('geo.reverse_geocode_cache.miss')
+        return None
+
+    def set(self, lat, lng, country, region, city):
+        ids = tuple(obj.id if obj else None for obj in (country, region, city))
+        key = geohash(lat, lng, self.precision)
+        with self.lock:
+            self.entries.pop(key, None)
+            while self.entries and len(self.entries) >= self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.entries[key] = (time.time() + self.timeout, ids)
+
+    def delete(self, lat, lng):
+        with self.lock:
+            self.entries.pop(geohash(lat, lng, self.precision), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            }
+
+
+reverse_geocode_cache = ReverseGeocodeCache(
+    precision=getattr(settings, 'GEO_CACHE_PRECISION', 6),
+    timeout=getattr(settings, 'GEO_CACHE_TIMEOUT', 86400),
+    max_entries=getattr(settings, 'GEO_CACHE_MAX_ENTRIES', 10000))
+
+
 def reverse_geocode(lat, lng):
     """
     Given a lat and lng (floats), return a 3-tuple of
     Country, Region, and City objects.
 
+    Locations reverse_geocode_locally knows don't call mapbox. Others
+    only do when GEO_MAPBOX_FALLBACK is set. Mapbox results are cached
+    in reverse_geocode_cache.
+
     Raises exception if there's any error calling mapbox.
     """
+    result = reverse_geocode_locally(lat, lng)
+    if result:
+        return result
+    if not getattr(settings, 'GEO_MAPBOX_FALLBACK', True):
+        return None, None, None
+
     try:
         result = get_first_mapbox_geocode_result('%s,%s' % (lng, lat))
     except HTTPError:
@@ -63,9 +178,49 @@ def reverse_geocode(lat, lng):
         raise GeoLookupException
 
     if result:
-        return result_to_country_region_city(result)
+        country, region, city = result_to_country_region_city(result)
     else:
-        return None, None, None
+        country = region = city = None
+    reverse_geocode_cache.set(lat, lng, country, region, city)
+    return country, region, city
+
+
+def reverse_geocode_locally(lat, lng):
+    """
+    Given a lat and lng (floats), return a 3-tuple of Country, Region,
+    and City objects from the local GeoIndex or reverse_geocode_cache,
+    or None if neither knows the location. Never calls mapbox.
+    """
+    if getattr(settings, 'GEO_LOCAL_LOOKUP', True):
+        result = get_index().lookup(lat, lng)
+        if result:
+            return result
+
+    ids = reverse_geocode_cache.get(lat, lng)
+    if ids is not None:
+        result = ids_to_country_region_city(*ids)
+        if result:
+            return result
+        # Some of the objects are gone.
+        reverse_geocode_cache.delete(lat, lng)
+    return None
+
+
+def ids_to_country_region_city(country_id, region_id, city_id):
+    """
+    Return a 3-tuple of the Country, Region and City objects with
+    the given ids, any of which might be None, or None if any of
+    the objects doesn't exist anymore.
+    """
+    try:
+        if city_id:
+            city = geo_registry.get_by_id(City, city_id)
+            return city.country, city.region, city
+        country = geo_registry.get_by_id(Country, country_id) if country_id else None
+        region = geo_registry.get_by_id(Region, region_id) if region_id else None
+    except ObjectDoesNotExist:
+        return None
+    return country, region, None
 
 
 def get_first_mapbox_geocode_result(query):
@@ -79,7 +234,8 @@ def get_first_mapbox_geocode_result(query):
     If no results are returned, returns an empty dictionary.
     """
     map_id = settings.MAPBOX_MAP_ID
-    url = 'http://api.tiles.mapbox.com/v3/%s/geocode/%s.json' % (map_id, query)
+    api_url = getattr(settings, 'MAPBOX_API_URL', 'http://api.tiles.mapbox.com/v3')
+    url = '%s/%s/geocode/%s.json' % (api_url, map_id, query)
 
     r = requests.get(url)
     r.raise_for_status()
@@ -116,20 +272,19 @@ def result_to_country(result):
     if 'country' in result:
 
         mapbox_country = result['country']
-        codes = dict((v, k) for k, v in product_details.get_regions('en-US').iteritems())
-        code = codes.get(mapbox_country['name'], '')
-        country, created = Country.objects.get_or_create(
-            mapbox_id=mapbox_country['id'],
-            defaults=dict(
-                name=mapbox_country['name'],
-                code=code,
+        country = geo_registry.get(Country, mapbox_country['id'])
+        if country is None:
+            country, created = Country.objects.get_or_create(
+                mapbox_id=mapbox_country['id'],
+                defaults=dict(
+                    name=mapbox_country['name'],
+                    code=geo_registry.get_country_code(mapbox_country['name']),
+                )
             )
-        )
-        if not created:
-            # Update name if it's changed in mapbox
-            if country.name != mapbox_country['name']:
-                country.name = mapbox_country['name']
-                country.save()
+        # Update name if it's changed in mapbox
+        if country.name != mapbox_country['name']:
+            country.name = mapbox_country['name']
+            country.save()
         return country
 
 
@@ -140,18 +295,19 @@ def result_to_region(result, country):
     """
     if 'province' in result:
         mapbox_region = result['province']
-        region, created = Region.objects.get_or_create(
-            mapbox_id=mapbox_region['id'],
-            defaults=dict(
-                name=mapbox_region['name'],
-                country=country,
+        region = geo_registry.get(Region, mapbox_region['id'])
+        if region is None:
+            region, created = Region.objects.get_or_create(
+                mapbox_id=mapbox_region['id'],
+                defaults=dict(
+                    name=mapbox_region['name'],
+                    country=country,
+                )
             )
-        )
-        if not created:
-            # Update name if it's changed in mapbox
-            if region.name != mapbox_region['name']:
-                region.name = mapbox_region['name']
-                region.save()
+        # Update name if it's changed in mapbox
+        if region.name != mapbox_region['name']:
+            region.name = mapbox_region['name']
+            region.save()
         return region
 
 
@@ -163,7 +319,6 @@ def result_to_city(result, country, region):
     # City has more data, but is similar to region and country
     if 'city' in result:
         mapbox_city = result['city']
-        created = False
         lookup_args = dict(
             name=mapbox_city['name'],
             country=country,
@@ -175,24 +330,29 @@ def result_to_city(result, country, region):
             lng=mapbox_city['lon'],
         )
 
-        try:
-            city = City.objects.get(mapbox_id=mapbox_city['id'])
-        except City.DoesNotExist:
-            # Mapbox sometimes returns multiple cities with the same
-            # name but different ids. So we need to check for existing
-            # (name, region, country) groups to avoid filling the
-            # database with multiple rows for a particular city.
-
+        # Mapbox sometimes returns multiple cities with the same
+        # name but different ids. So we need to check for existing
+        # (name, region, country) groups to avoid filling the
+        # database with multiple rows for a particular city.
+        city = (geo_registry.get(City, mapbox_city['id'])
+                or geo_registry.get_city_by_name(mapbox_city['name'], country, region))
+        if city is None:
             city, created = City.objects.get_or_create(defaults=defaults, **lookup_args)
+            if created:
+                return city
 
-        if not created:
-            # Update if anything has changed
-            do_save = False
-            defaults.update(lookup_args)
-            for key, val in defaults.iteritems():
-                if getattr(city, key) != val:
-                    setattr(city, key, val)
-                    do_save = True
-            if do_save:
-                city.save()
+        # Update if anything has changed
+        do_save = False
+        defaults.update(lookup_args)
+        for key, val in defaults.iteritems():
+            if key in ('country', 'region'):
+                # Compare ids to avoid loading related objects.
+                changed = getattr(city, '%s_id' % key) != (val.id if val else None)
+            else:
+                changed = getattr(city, key) != val
+            if changed:
+                setattr(city, key, val)
+                do_save = True
+        if do_save:
+            city.save()
         return city
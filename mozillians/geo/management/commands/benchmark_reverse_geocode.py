@@ -0,0 +1,126 @@
+"""
+Compare the latency of reverse geocoding through Mapbox, with and
+without the reverse geocode cache, with the local GeoIndex. Mapbox is
+replaced by a stub HTTP server answering with one of the cities in the
+database, after an optional delay.
+"""
+import json
+import random
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from mozillians.geo import lookup
+from mozillians.geo.index import get_index, reset_index
+from mozillians.geo.models import City
+
+
+def mapbox_result(city):
+    """Return a Mapbox reverse geocoding response for city."""
+    result = [{'type': 'city', 'id': city.mapbox_id, 'name': city.name,
+               'lat': city.lat, 'lon': city.lng}]
+    if city.region:
+        result.append({'type': 'province', 'id': city.region.mapbox_id,
+                       'name': city.region.name})
+    result.append({'type': 'country', 'id': city.country.mapbox_id,
+                   'name': city.country.name})
+    return {'results': [result]}
+
+
+class StubMapboxHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        body = json.dumps(self.server.response)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Measures reverse geocoding latency through Mapbox and the local index'
+
+    option_list = list(BaseCommand.option_list) + [
+        make_option('--number',
+                    dest='number',
+                    type='int',
+                    default=200,
+                    help='Number of locations to reverse geocode.'),
+        make_option('--latency',
+                    dest='latency',
+                    type='int',
+                    default=0,
+                    help='Milliseconds the stub Mapbox server waits before answering.'),
+    ]
+
+    def measure(self, func, points):
+        """Return median and maximum seconds func takes per point."""
+        timings = []
+        for lat, lng in points:
+            start = time.time()
+            func(lat, lng)
+            timings.append(time.time() - start)
+        timings.sort()
+        return timings[len(timings) // 2], timings[-1]
+
+    def handle(self, *args, **options):
+        cities = list(City.objects.select_related('region', 'country'))
+        if not cities:
+            raise CommandError('There are no cities to reverse geocode.')
+        # Locations within a few hundred meters of known cities.
+        points = [(city.lat + random.uniform(-0.002, 0.002),
+                   city.lng + random.uniform(-0.002, 0.002))
+                  for city in (random.choice(cities) for i in range(options['number']))]
+
+        server = HTTPServer(('127.0.0.1', 0), StubMapboxHandler)
+        server.latency = options['latency'] / 1000.0
+        server.response = mapbox_result(cities[0])
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        try:
+            api_url = 'http://127.0.0.1:%d' % server.server_port
+            cache = lookup.reverse_geocode_cache
+
+            def uncached(lat, lng):
+                cache.clear()
+                lookup.reverse_geocode(lat, lng)
+
+            with override_settings(MAPBOX_API_URL=api_url, GEO_LOCAL_LOOKUP=False):
+                mapbox = self.measure(uncached, points)
+                cache.clear()
+                # Repeat lookups in the same places, like profile edits do.
+                self.measure(lookup.reverse_geocode, points)
+                mapbox_cached = self.measure(lookup.reverse_geocode, points)
+                stats = cache.stats()
+            cache.clear()
+
+            reset_index()
+            start = time.time()
+            index = get_index()
+            build = time.time() - start
+            local = self.measure(index.lookup, points)
+            with override_settings(GEO_LOCAL_LOOKUP=True):
+                local_lookup = self.measure(lookup.reverse_geocode, points)
+        finally:
+            server.shutdown()
+
+        self.stdout.write('Reverse geocoded %d locations near %d cities, '
+                          'built local index in %.2fs.\n' % (len(points), len(cities), build))
+        for name, (median, worst) in [('mapbox', mapbox), ('mapbox, cached', mapbox_cached),
+                                      ('GeoIndex.lookup', local),
+                                      ('reverse_geocode', local_lookup)]:
+            self.stdout.write('%s: median %.1f usec, max %.1f usec\n'
+                              % (name, median * 1e6, worst * 1e6))
+        self.stdout.write('Cache: %(entries)d entries, %(hits)d hits, %(misses)d misses '
+                          '(%(hit_rate).0f%%)\n' % dict(stats, hit_rate=stats['hit_rate'] * 100))
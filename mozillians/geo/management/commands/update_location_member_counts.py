@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from mozillians.geo.models import City, Country, Region
+
+
+class Command(BaseCommand):
+    help = 'Recounts the vouched members of all countries, regions and cities'
+
+    def handle(self, *args, **options):
+        for model in [Country, Region, City]:
+            updated = model.update_member_counts()
+            self.stdout.write('Updated member counts of %d %s.\n'
+                              % (updated, model._meta.verbose_name_plural))
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding field 'City.normalized_name'
+        db.add_column(u'geo_city', 'normalized_name',
+                      self.gf('django.db.models.fields.CharField')(default='', max_length=120, db_index=True),
+                      keep_default=False)
+
+        # Adding field 'City.vouched_member_count'
+        db.add_column(u'geo_city', 'vouched_member_count',
+                      self.gf('django.db.models.fields.PositiveIntegerField')(default=0, db_index=True),
+                      keep_default=False)
+
+        # Adding field 'Country.normalized_name'
+        db.add_column(u'geo_country', 'normalized_name',
+                      self.gf('django.db.models.fields.CharField')(default='', max_length=120, db_index=True),
+                      keep_default=False)
+
+        # Adding field 'Country.vouched_member_count'
+        db.add_column(u'geo_country', 'vouched_member_count',
+                      self.gf('django.db.models.fields.PositiveIntegerField')(default=0, db_index=True),
+                      keep_default=False)
+
+        # Adding field 'Region.normalized_name'
+        db.add_column(u'geo_region', 'normalized_name',
+                      self.gf('django.db.models.fields.CharField')(default='', max_length=120, db_index=True),
+                      keep_default=False)
+
+        # Adding field 'Region.vouched_member_count'
+        db.add_column(u'geo_region', 'vouched_member_count',
+                      self.gf('django.db.models.fields.PositiveIntegerField')(default=0, db_index=True),
+                      keep_default=False)
+
+
+    def backwards(self, orm):
+        # Deleting field 'City.normalized_name'
+        db.delete_column(u'geo_city', 'normalized_name')
+
+        # Deleting field 'City.vouched_member_count'
+        db.delete_column(u'geo_city', 'vouched_member_count')
+
+        # Deleting field 'Country.normalized_name'
+        db.delete_column(u'geo_country', 'normalized_name')
+
+        # Deleting field 'Country.vouched_member_count'
+        db.delete_column(u'geo_country', 'vouched_member_count')
+
+        # Deleting field 'Region.normalized_name'
+        db.delete_column(u'geo_region', 'normalized_name')
+
+        # Deleting field 'Region.vouched_member_count'
+        db.delete_column(u'geo_region', 'vouched_member_count')
+
+
+    models = {
+        u'geo.city': {
+            'Meta': {'unique_together': "(('name', 'region', 'country'),)", 'object_name': 'City'},
+            'country': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['geo.Country']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'lat': ('django.db.models.fields.FloatField', [], {}),
+            'lng': ('django.db.models.fields.FloatField', [], {}),
+            'mapbox_id': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '40'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '120'}),
+            'normalized_name': ('django.db.models.fields.CharField', [], {'max_length': '120', 'db_index': 'True'}),
+            'region': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['geo.Region']", 'null': 'True', 'blank': 'True'}),
+            'vouched_member_count': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0', 'db_index': 'True'})
+        },
+        u'geo.country': {
+            'Meta': {'object_name': 'Country'},
+            'code': ('django.db.models.fields.CharField', [], {'max_length': '2'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'mapbox_id': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '40'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '120'}),
+            'normalized_name': ('django.db.models.fields.CharField', [], {'max_length': '120', 'db_index': 'True'}),
+            'vouched_member_count': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0', 'db_index': 'True'})
+        },
+        u'geo.region': {
+            'Meta': {'unique_together': "(('name', 'country'),)", 'object_name': 'Region'},
+            'country': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['geo.Country']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'mapbox_id': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '40'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '120'}),
+            'normalized_name': ('django.db.models.fields.CharField', [], {'max_length': '120', 'db_index': 'True'}),
+            'vouched_member_count': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0', 'db_index': 'True'})
+        }
+    }
+
+    complete_apps = ['geo']
@@ -1,7 +1,85 @@
 from django.db import models
+from django.db.models import Count, get_model
 
 
-class Country(models.Model):
+def normalize_name(name):
+    """Return name lowercased with whitespace collapsed, the form
+    locations are looked up by.
+    """
+    return u' '.join(name.split()).lower()
+
+
+def update_location_member_counts(locations):
+    """Recount the vouched members of the countries, regions and
+    cities in locations, an iterable of (country_id, region_id,
+    city_id) tuples. Missing ids are None.
+    """
+    locations = list(locations)
+    for index, model in enumerate([Country, Region, City]):
+        ids = set(location[index] for location in locations)
+        ids.discard(None)
+        model.update_member_counts(list(ids))
+
+
+class LocationBase(models.Model):
+    # Lookups by name in URLs match normalized_name instead of name.
+    normalized_name = models.CharField(max_length=120, db_index=True, editable=False)
+    # Denormalized count, kept up to date by update_member_counts.
+    vouched_member_count = models.PositiveIntegerField(default=0, db_index=True,
+                                                       editable=False)
+
+    # Name of the UserProfile field pointing to this model.
+    PROFILE_FIELD = None
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_name(self.name)
+        # The count changes in the database while instances are
+        # around, saving an existing object must not write it back.
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and not kwargs.get('update_fields')):
+            kwargs['update_fields'] = [field.name for field in self._meta.fields
+                                       if not field.primary_key
+                                       and field.name != 'vouched_member_count']
+        super(LocationBase, self).save(*args, **kwargs)
+
+    @classmethod
+    def count_members(cls, ids=None):
+        """Return a dictionary mapping ids to the number of vouched
+        members, for objects with ids or for all of them. Objects
+        without members are left out.
+        """
+        profiles = get_model('users', 'UserProfile').objects.vouched()
+        if ids is not None:
+            profiles = profiles.filter(**{'%s__in' % cls.PROFILE_FIELD: ids})
+        return dict(profiles.values_list(cls.PROFILE_FIELD).annotate(Count('id')).order_by())
+
+    @classmethod
+    def update_member_counts(cls, ids=None):
+        """Recount the vouched members of objects with ids, or of all
+        objects.
+
+        Only objects whose counts changed are updated. Return the
+        number of objects updated.
+        """
+        if ids is not None and not ids:
+            return 0
+        counts = cls.count_members(ids)
+        objects = cls.objects.all()
+        if ids is not None:
+            objects = objects.filter(pk__in=ids)
+
+        updated = 0
+        for pk, count in objects.values_list('pk', 'vouched_member_count'):
+            if count != counts.get(pk, 0):
+                cls.objects.filter(pk=pk).update(vouched_member_count=counts.get(pk, 0))
+                updated += 1
+        return updated
+
+
+class Country(LocationBase):
     #  {u'type': u'country', u'id': u'country.4150104525', u'name': u'United States'}
     name = models.CharField(
         max_length=120, unique=True,
@@ -15,6 +93,8 @@ class Country(models.Model):
         help_text="'id' field from Mapbox"
     )
 
+    PROFILE_FIELD = 'geo_country'
+
     class Meta(object):
         verbose_name_plural = 'Countries'
 
@@ -22,7 +102,7 @@ class Country(models.Model):
         return self.name
 
 
-class Region(models.Model):
+class Region(LocationBase):
     # {u'type': u'province', u'id': u'province.2516948401', u'name': u'North Carolina'}
     name = models.CharField(
         max_length=120,
@@ -34,6 +114,8 @@ class Region(models.Model):
     )
     country = models.ForeignKey(Country)
 
+    PROFILE_FIELD = 'geo_region'
+
     class Meta(object):
         unique_together = (
             ('name', 'country'),
@@ -43,7 +125,7 @@ class Region(models.Model):
         return u'%s, %s' % (self.name, self.country.name)
 
 
-class City(models.Model):
+class City(LocationBase):
     # {u'name': u'Carrboro', u'lon': -79.083798999999999, u'lat': 35.918596000000001,
     # u'bounds': [-79.100728852067547, 35.889960723848048,
     #             -79.063862048216336, 35.947221266002018],
@@ -61,6 +143,8 @@ class City(models.Model):
     lat = models.FloatField()
     lng = models.FloatField()
 
+    PROFILE_FIELD = 'geo_city'
+
     class Meta:
         verbose_name_plural = 'Cities'
         unique_together = (
@@ -0,0 +1,190 @@
+"""
+Process wide lookup tables of Countries, Regions and Cities.
+
+geo_registry resolves mapbox ids, city names and country names to
+geo objects without querying the database. The tables are loaded on
+first use and reloaded every GEO_REGISTRY_TIMEOUT seconds to pick up
+writes in other processes. Objects missing from the tables are read
+from the database when they're asked for.
+
+Writes in this process drop the objects they change from the tables,
+instead of registering them before they're committed, so that they're
+read again on next use. Callers get copies of the registered objects,
+which they're free to change.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import signals as dbsignals
+from django.dispatch import receiver
+
+from product_details import product_details
+
+from mozillians.geo.models import City, Country, Region
+
+
+def _copy_instance(obj):
+    """Return a shallow copy of a model instance with its own state."""
+    obj = copy.copy(obj)
+    obj._state = copy.copy(obj._state)
+    return obj
+
+
+class GeoRegistry(object):
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        """Drop all tables. They are loaded again on next use."""
+        with self.lock:
+            self.loaded = False
+            self.expires = 0
+            self.objects = {Country: {}, Region: {}, City: {}}
+            self.by_mapbox_id = {Country: {}, Region: {}, City: {}}
+            self.cities_by_name = {}
+            self.country_codes = None
+
+    def _ensure_loaded(self):
+        if self.loaded and self.expires > time.time():
+            return
+        with self.lock:
+            self.clear()
+            for country in Country.objects.all():
+                self._add(country)
+            for region in Region.objects.all():
+                self._link(region, 'country', Country)
+                self._add(region)
+            for city in City.objects.all():
+                self._link(city, 'country', Country)
+                self._link(city, 'region', Region)
+                self._add(city)
+            self.loaded = True
+            self.expires = time.time() + getattr(settings, 'GEO_REGISTRY_TIMEOUT', 3600)
+
+    def _link(self, obj, field, model):
+        """Share the registered object obj.field points to instead of
+        loading it again through the foreign key.
+        """
+        entry = self.objects[model].get(getattr(obj, '%s_id' % field))
+        if entry is not None:
+            setattr(obj, field, entry[0])
+
+    def _add(self, obj):
+        model = type(obj)
+        name_key = None
+        self.by_mapbox_id[model][obj.mapbox_id] = obj
+        if model is City:
+            name_key = (obj.name, obj.country_id, obj.region_id)
+            self.cities_by_name[name_key] = obj
+        self.objects[model][obj.id] = (obj, obj.mapbox_id, name_key)
+
+    def _remove(self, model, pk):
+        if pk not in self.objects[model]:
+            return
+        obj, mapbox_id, name_key = self.objects[model].pop(pk)
+        if self.by_mapbox_id[model].get(mapbox_id) is obj:
+            del self.by_mapbox_id[model][mapbox_id]
+        if self.cities_by_name.get(name_key) is obj:
+            del self.cities_by_name[name_key]
+
+    def _register(self, obj):
+        """Add obj, read from the database, to the loaded tables."""
+        with self.lock:
+            if type(obj) is not Country:
+                self._link(obj, 'country', Country)
+            if type(obj) is City:
+                self._link(obj, 'region', Region)
+            self._remove(type(obj), obj.id)
+            self._add(obj)
+
+    def _copy(self, obj):
+        """Return a copy of the registered obj and the objects it's
+        linked to, or None.
+        """
+        if obj is None:
+            return None
+        obj = _copy_instance(obj)
+        for field in ('country', 'region'):
+            cache_name = '_%s_cache' % field
+            if getattr(obj, cache_name, None) is not None:
+                setattr(obj, cache_name, _copy_instance(getattr(obj, cache_name)))
+        return obj
+
+    def unregister(self, obj):
+        """Drop obj and the objects linked to it from the tables.
+        They're read from the database again when they're asked for.
+        """
+        model = type(obj)
+        with self.lock:
+            if not self.loaded:
+                return
+            self._remove(model, obj.id)
+            if model is not City:
+                field = '%s_id' % model.__name__.lower()
+                for linked_model in (Region, City):
+                    for pk, entry in self.objects[linked_model].items():
+                        if getattr(entry[0], field, None) == obj.id:
+                            self._remove(linked_model, pk)
+
+    def _get_or_read(self, model, find, **lookup):
+        """Return a copy of the registered object find() returns,
+        reading it from the database with lookup if it's not there.
+        """
+        self._ensure_loaded()
+        obj = find()
+        if obj is None:
+            objs = list(model.objects.filter(**lookup)[:1])
+            if not objs:
+                return None
+            obj = objs[0]
+            self._register(obj)
+        return self._copy(obj)
+
+    def get(self, model, mapbox_id):
+        """Return the object of model with mapbox_id or None."""
+        return self._get_or_read(model, lambda: self.by_mapbox_id[model].get(mapbox_id),
+                                 mapbox_id=mapbox_id)
+
+    def get_by_id(self, model, pk):
+        """Return the object of model with pk. Raise
+        model.DoesNotExist if it doesn't exist.
+        """
+        obj = self._get_or_read(model, lambda: self.objects[model].get(pk, (None,))[0],
+                                pk=pk)
+        if obj is None:
+            raise model.DoesNotExist('%s matching query does not exist.'
+                                     % model._meta.object_name)
+        return obj
+
+    def get_city_by_name(self, name, country, region):
+        """Return the City called name in country and region or None."""
+        region_id = region.id if region else None
+        key = (name, country.id, region_id)
+        return self._get_or_read(City, lambda: self.cities_by_name.get(key),
+                                 name=name, country=country.id, region=region_id)
+
+    def get_country_code(self, name):
+        """Return the lowercased 2-letter code of the country called
+        name in Mozilla product data, or ''.
+        """
+        if self.country_codes is None:
+            regions = product_details.get_regions('en-US')
+            self.country_codes = dict((v, k) for k, v in regions.iteritems())
+        return self.country_codes.get(name, '')
+
+
+geo_registry = GeoRegistry()
+
+
+@receiver(dbsignals.post_save, sender=City, dispatch_uid='unregister_city_save_sig')
+@receiver(dbsignals.post_save, sender=Region, dispatch_uid='unregister_region_save_sig')
+@receiver(dbsignals.post_save, sender=Country, dispatch_uid='unregister_country_save_sig')
+@receiver(dbsignals.post_delete, sender=City, dispatch_uid='unregister_city_sig')
+@receiver(dbsignals.post_delete, sender=Region, dispatch_uid='unregister_region_sig')
+@receiver(dbsignals.post_delete, sender=Country, dispatch_uid='unregister_country_sig')
+def unregister_geo_object(sender, instance, **kwargs):
+    geo_registry.unregister(instance)
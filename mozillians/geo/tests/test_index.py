@@ -0,0 +1,155 @@
+import json
+import os
+import tempfile
+
+from django.test.utils import override_settings
+
+from nose.tools import eq_, ok_
+
+from mozillians.common.tests import TestCase
+from mozillians.geo.index import (Boundary, GeoIndex, Grid, distance, get_index,
+                                  load_boundaries, reset_index)
+from mozillians.geo.tests import CityFactory, CountryFactory, RegionFactory
+
+
+SQUARE = [[[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]]
+SQUARE_WITH_HOLE = SQUARE + [[[4, 4], [6, 4], [6, 6], [4, 6], [4, 4]]]
+
+
+class GridTests(TestCase):
+    def test_near(self):
+        grid = Grid(1.0)
+        grid.add(10.5, 20.5, 'a')
+        grid.add(11.5, 21.5, 'b')
+        grid.add(13.5, 20.5, 'c')
+        eq_(list(grid.near(10.1, 20.1)), ['a'])
+        eq_(sorted(grid.near(10.1, 20.1, 1, 1)), ['a', 'b'])
+
+    def test_antimeridian(self):
+        grid = Grid(1.0)
+        grid.add(0.5, 179.5, 'east')
+        eq_(list(grid.near(0.5, -179.5, 0, 1)), ['east'])
+
+    def test_add_box(self):
+        grid = Grid(5.0)
+        grid.add_box(0, 178, 1, -178, 'box')
+        eq_(list(grid.near(0.5, 179)), ['box'])
+        eq_(list(grid.near(0.5, -179)), ['box'])
+        eq_(list(grid.near(0.5, 0)), [])
+
+    def test_remove(self):
+        grid = Grid(1.0)
+        cell = grid.add(10.5, 20.5, 'a')
+        grid.add(10.6, 20.6, 'b')
+        grid.remove(cell, 'a')
+        eq_(list(grid.near(10.5, 20.5)), ['b'])
+
+
+class BoundaryTests(TestCase):
+    def test_contains(self):
+        boundary = Boundary([SQUARE_WITH_HOLE], None)
+        ok_(boundary.contains(2, 2))
+        ok_(not boundary.contains(5, 5))
+        ok_(not boundary.contains(11, 5))
+
+    def test_multipolygon(self):
+        other_square = [[[20, 20], [30, 20], [30, 30], [20, 30], [20, 20]]]
+        boundary = Boundary([SQUARE, other_square], None)
+        ok_(boundary.contains(25, 25))
+        ok_(not boundary.contains(15, 15))
+
+    def test_load_boundaries(self):
+        country = CountryFactory.create()
+        region = RegionFactory.create(country=country)
+        features = [
+            {'type': 'Feature',
+             'geometry': {'type': 'Polygon', 'coordinates': SQUARE},
+             'properties': {'type': 'country', 'mapbox_id': country.mapbox_id}},
+            {'type': 'Feature',
+             'geometry': {'type': 'MultiPolygon', 'coordinates': [SQUARE]},
+             'properties': {'type': 'province', 'mapbox_id': region.mapbox_id}},
+            {'type': 'Feature',
+             'geometry': {'type': 'Polygon', 'coordinates': SQUARE},
+             'properties': {'type': 'country', 'mapbox_id': 'country.unknown'}},
+        ]
+        fd, path = tempfile.mkstemp(suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'type': 'FeatureCollection', 'features': features}, f)
+            boundaries = load_boundaries(path)
+        finally:
+            os.remove(path)
+
+        eq_([(boundary.country, boundary.region) for boundary in boundaries],
+            [(country, None), (country, region)])
+
+
+class GeoIndexTests(TestCase):
+    def setUp(self):
+        reset_index()
+
+    def test_distance(self):
+        eq_(int(distance(0, 0, 0, 1)), 111)
+        eq_(int(distance(60, 0, 60, 1)), 55)
+
+    def test_nearest_city(self):
+        city_1 = CityFactory.create(lat=50.0, lng=8.0)
+        city_2 = CityFactory.create(lat=50.02, lng=8.0)
+        index = GeoIndex.load()
+        eq_(index.nearest_city(50.004, 8.0, 5), city_1)
+        eq_(index.nearest_city(50.015, 8.0, 5), city_2)
+        eq_(index.nearest_city(50.5, 8.0, 5), None)
+
+    def test_nearest_city_across_cells(self):
+        city = CityFactory.create(lat=49.999, lng=7.999)
+        index = GeoIndex.load()
+        eq_(index.nearest_city(50.001, 8.001, 5), city)
+
+    def test_lookup(self):
+        city = CityFactory.create(lat=50.0, lng=8.0)
+        index = GeoIndex.load()
+        eq_(index.lookup(50.001, 8.001), (city.country, city.region, city))
+        eq_(index.lookup(0, 0), None)
+
+    def test_lookup_boundaries(self):
+        country = CountryFactory.create()
+        region = RegionFactory.create(country=country)
+        other_city = CityFactory.create(lat=5.0, lng=10.01)
+        index = GeoIndex([other_city], [Boundary([SQUARE], country),
+                                        Boundary([[[[0, 0], [10, 0], [10, 5], [0, 0]]]],
+                                                 country, region)])
+        # The closest city is on the other side of the border.
+        eq_(index.lookup(5.0, 9.99, 5), (country, None, None))
+        eq_(index.lookup(1.0, 9.0, 5), (country, region, None))
+
+    def test_get_index(self):
+        index = get_index()
+        ok_(get_index() is index)
+
+    def test_city_changes(self):
+        index = get_index()
+        city = CityFactory.create(lat=50.0, lng=8.0)
+        ok_(get_index() is index)
+        eq_(index.nearest_city(50.0, 8.0, 5), city)
+
+        city.lat = 40.0
+        city.save()
+        eq_(index.nearest_city(50.0, 8.0, 5), None)
+        eq_(index.nearest_city(40.0, 8.0, 5), city)
+
+        city.delete()
+        eq_(index.nearest_city(40.0, 8.0, 5), None)
+        ok_(get_index() is index)
+
+    def test_region_changes(self):
+        city = CityFactory.create(lat=50.0, lng=8.0)
+        index = get_index()
+        city.region.name = 'Foo'
+        city.region.save()
+        ok_(get_index() is not index)
+        eq_(get_index().lookup(50.0, 8.0)[1].name, 'Foo')
+
+    def test_get_index_timeout(self):
+        with override_settings(GEO_LOCAL_INDEX_TIMEOUT=-1):
+            index = get_index()
+            ok_(get_index() is not index)
@@ -5,15 +5,23 @@ from nose.tools import eq_, ok_
 from requests import ConnectionError, HTTPError
 
 from mozillians.common.tests import TestCase
+from mozillians.geo.index import reset_index
 from mozillians.geo.models import Country, Region, City
-from mozillians.geo.lookup import (GeoLookupException, get_first_mapbox_geocode_result,
-                                   result_to_city, result_to_country_region_city,
-                                   result_to_country, result_to_region, reverse_geocode)
+from mozillians.geo.registry import geo_registry
+from mozillians.geo.lookup import (GeoLookupException, ReverseGeocodeCache, geohash,
+                                   get_first_mapbox_geocode_result, result_to_city,
+                                   result_to_country_region_city, result_to_country,
+                                   result_to_region, reverse_geocode, reverse_geocode_cache)
 from mozillians.geo.tests import CountryFactory, RegionFactory, CityFactory
 
 
 @patch('mozillians.geo.lookup.requests')
 class TestCallingGeocode(TestCase):
+    def setUp(self):
+        reset_index()
+        reverse_geocode_cache.clear()
+        geo_registry.clear()
+
     def test_raise_on_error(self, mock_requests):
         mock_requests.get.return_value.raise_for_status.side_effect = HTTPError
         with self.assertRaises(GeoLookupException):
@@ -34,6 +42,11 @@ class TestCallingGeocode(TestCase):
 @patch('mozillians.geo.lookup.result_to_country_region_city')
 @patch('mozillians.geo.lookup.get_first_mapbox_geocode_result')
 class TestReverseGeocode(TestCase):
+    def setUp(self):
+        reset_index()
+        reverse_geocode_cache.clear()
+        geo_registry.clear()
+
     def test_empty(self, mock_get_result, mock_result_to_country):
         # If get result returns nothing, reverse_geocode returns Nones
         mock_get_result.return_value = {}
@@ -43,10 +56,76 @@ class TestReverseGeocode(TestCase):
     def test_results(self, mock_get_result, mock_result_to_country):
         # If any result, calls result_to_country_region_city
         mock_get_result.return_value = {'foo': 1}
-        mock_result_to_country.return_value = (1, 2, 3)
-        eq_((1, 2, 3), reverse_geocode(0.0, 0.0))
+        city = CityFactory.create()
+        mock_result_to_country.return_value = (city.country, city.region, city)
+        eq_((city.country, city.region, city), reverse_geocode(0.0, 0.0))
         mock_result_to_country.assert_called_with(mock_get_result.return_value)
 
+    def test_cached(self, mock_get_result, mock_result_to_country):
+        # Nearby locations are resolved once
+        mock_get_result.return_value = {'foo': 1}
+        city = CityFactory.create(lat=0.0, lng=0.0)
+        mock_result_to_country.return_value = (city.country, city.region, city)
+        with override_settings(GEO_LOCAL_LOOKUP=False):
+            reverse_geocode(45.0, 45.0)
+            eq_((city.country, city.region, city), reverse_geocode(45.0001, 45.0001))
+        eq_(mock_get_result.call_count, 1)
+
+    def test_cached_deleted(self, mock_get_result, mock_result_to_country):
+        # Cached objects that are gone are looked up again
+        mock_get_result.return_value = {'foo': 1}
+        city = CityFactory.create(lat=0.0, lng=0.0)
+        mock_result_to_country.return_value = (city.country, city.region, city)
+        with override_settings(GEO_LOCAL_LOOKUP=False):
+            reverse_geocode(45.0, 45.0)
+            city.delete()
+            mock_result_to_country.return_value = (None, None, None)
+            eq_((None, None, None), reverse_geocode(45.0, 45.0))
+        eq_(mock_get_result.call_count, 2)
+
+    def test_local(self, mock_get_result, mock_result_to_country):
+        # Locations near known cities don't call mapbox
+        city = CityFactory.create(lat=35.9, lng=-79.1)
+        eq_((city.country, city.region, city), reverse_geocode(35.91, -79.09))
+        ok_(not mock_get_result.called)
+
+    def test_no_fallback(self, mock_get_result, mock_result_to_country):
+        with override_settings(GEO_MAPBOX_FALLBACK=False):
+            eq_((None, None, None), reverse_geocode(0.0, 0.0))
+        ok_(not mock_get_result.called)
+
+
+class TestReverseGeocodeCache(TestCase):
+    def test_geohash(self):
+        eq_(geohash(42.6, -5.6, 5), 'ezs42')
+        eq_(geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_get_set(self):
+        cache = ReverseGeocodeCache(precision=6, timeout=60, max_entries=10)
+        city = CityFactory.create()
+        eq_(cache.get(10.0, 10.0), None)
+        cache.set(10.0, 10.0, city.country, None, city)
+        eq_(cache.get(10.001, 10.001), (city.country.id, None, city.id))
+        eq_(cache.get(11.0, 10.0), None)
+        stats = cache.stats()
+        eq_(stats['hits'], 1)
+        eq_(stats['misses'], 2)
+
+    def test_timeout(self):
+        cache = ReverseGeocodeCache(precision=6, timeout=-1, max_entries=10)
+        cache.set(10.0, 10.0, None, None, None)
+        eq_(cache.get(10.0, 10.0), None)
+
+    def test_lru(self):
+        cache = ReverseGeocodeCache(precision=6, timeout=60, max_entries=2)
+        cache.set(1.0, 1.0, None, None, None)
+        cache.set(2.0, 2.0, None, None, None)
+        cache.get(1.0, 1.0)
+        cache.set(3.0, 3.0, None, None, None)
+        eq_(cache.get(1.0, 1.0), (None, None, None))
+        eq_(cache.get(2.0, 2.0), None)
+        eq_(cache.stats()['evictions'], 1)
+
 
 class TestResultToCountryRegionCity(TestCase):
     @patch('mozillians.geo.lookup.result_to_country')
@@ -76,6 +155,9 @@ class TestResultToCountryRegionCity(TestCase):
 
 
 class TestResultToCountry(TestCase):
+    def setUp(self):
+        geo_registry.clear()
+
     def test_no_country(self):
         eq_(None, result_to_country({'foo': 1}))
 
@@ -98,6 +180,13 @@ class TestResultToCountry(TestCase):
         country = Country.objects.get(pk=country.pk)
         eq_(new_name, country.name)
 
+    def test_registered_country(self):
+        country = CountryFactory.create()
+        result = {'country': {'id': country.mapbox_id, 'name': country.name}}
+        result_to_country(result)
+        with self.assertNumQueries(0):
+            eq_(result_to_country(result), country)
+
     def test_country_code_set(self):
         greece = {'country': {'id': 'mapbox_id', 'name': 'Greece'}}
         country = result_to_country(greece)
@@ -106,6 +195,9 @@ class TestResultToCountry(TestCase):
 
 
 class TestResultToRegion(TestCase):
+    def setUp(self):
+        geo_registry.clear()
+
     def test_no_region(self):
         country = CountryFactory.create()
         eq_(None, result_to_region({}, country))
@@ -140,6 +232,9 @@ class TestResultToRegion(TestCase):
 
 
 class TestResultToCity(TestCase):
+    def setUp(self):
+        geo_registry.clear()
+
     def test_no_city(self):
         eq_(None, result_to_city({}, None, None))
 
@@ -178,6 +273,20 @@ class TestResultToCity(TestCase):
         eq_(region, city.region)
         eq_(country, city.country)
 
+    def test_registered_city(self):
+        city = CityFactory.create()
+        result = {
+            'city': {
+                'name': city.name,
+                'id': city.mapbox_id,
+                'lat': city.lat,
+                'lon': city.lng,
+            }
+        }
+        result_to_city(result, city.country, city.region)
+        with self.assertNumQueries(0):
+            eq_(result_to_city(result, city.country, city.region), city)
+
     def test_update_name(self):
         city = CityFactory.create()
         new_name = 'New %s' % city.name
@@ -0,0 +1,65 @@
+from nose.tools import eq_
+
+from mozillians.common.tests import TestCase
+from mozillians.geo.models import City, Country, Region, normalize_name
+from mozillians.geo.tests import CityFactory, CountryFactory
+from mozillians.users.tests import UserFactory
+
+
+class LocationTests(TestCase):
+    def setUp(self):
+        self.city = CityFactory.create()
+        self.region = self.city.region
+        self.country = self.city.country
+
+    def located(self, **kwargs):
+        userprofile = {'geo_country': self.country, 'geo_region': self.region,
+                       'geo_city': self.city}
+        userprofile.update(kwargs)
+        return UserFactory.create(userprofile=userprofile).userprofile
+
+    def counts(self):
+        return (Country.objects.get(pk=self.country.pk).vouched_member_count,
+                Region.objects.get(pk=self.region.pk).vouched_member_count,
+                City.objects.get(pk=self.city.pk).vouched_member_count)
+
+    def test_normalize_name(self):
+        eq_(normalize_name(u'  New   York '), u'new york')
+        country = CountryFactory.create(name=u'United  Kingdom')
+        eq_(country.normalized_name, u'united kingdom')
+
+    def test_update_member_counts(self):
+        self.located()
+        self.located()
+        UserFactory.create(vouched=False, userprofile={'geo_city': self.city})
+        Country.objects.filter(pk=self.country.pk).update(vouched_member_count=10)
+        eq_(Country.update_member_counts(), 1)
+        eq_(self.counts(), (2, 2, 2))
+
+    def test_save_does_not_overwrite_count(self):
+        self.located()
+        self.city.name = 'Renamed'
+        self.city.save()
+        eq_(self.counts(), (1, 1, 1))
+
+    def test_profile_moved(self):
+        profile = self.located()
+        other_city = CityFactory.create()
+        profile.geo_country = other_city.country
+        profile.geo_region = other_city.region
+        profile.geo_city = other_city
+        profile.save()
+        eq_(self.counts(), (0, 0, 0))
+        eq_(City.objects.get(pk=other_city.pk).vouched_member_count, 1)
+
+    def test_profile_unvouched(self):
+        profile = self.located()
+        eq_(self.counts(), (1, 1, 1))
+        profile.vouches_received.all().delete()
+        eq_(self.counts(), (0, 0, 0))
+
+    def test_profile_deleted(self):
+        profile = self.located()
+        self.located(geo_city=None)
+        profile.user.delete()
+        eq_(self.counts(), (1, 1, 0))
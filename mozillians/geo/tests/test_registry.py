@@ -0,0 +1,76 @@
+from nose.tools import eq_, ok_
+
+from mozillians.common.tests import TestCase
+from mozillians.geo.models import City, Country, Region
+from mozillians.geo.registry import GeoRegistry, geo_registry
+from mozillians.geo.tests import CityFactory, CountryFactory
+
+
+class GeoRegistryTests(TestCase):
+    def setUp(self):
+        self.registry = GeoRegistry()
+
+    def test_get(self):
+        city = CityFactory.create()
+        with self.assertNumQueries(3):
+            eq_(self.registry.get(City, city.mapbox_id), city)
+        with self.assertNumQueries(0):
+            eq_(self.registry.get(Region, city.region.mapbox_id), city.region)
+            eq_(self.registry.get(Country, city.country.mapbox_id), city.country)
+            eq_(self.registry.get_city_by_name(city.name, city.country, city.region), city)
+            registered = self.registry.get(City, city.mapbox_id)
+            eq_(unicode(registered), unicode(city))
+        with self.assertNumQueries(1):
+            eq_(self.registry.get(City, 'unknown'), None)
+
+    def test_get_copy(self):
+        city = CityFactory.create()
+        registered = self.registry.get(City, city.mapbox_id)
+        registered.name = 'Foo'
+        registered.country.name = 'Bar'
+        eq_(self.registry.get(City, city.mapbox_id).name, city.name)
+        eq_(self.registry.get(Country, city.country.mapbox_id).name, city.country.name)
+
+    def test_get_by_id(self):
+        country = CountryFactory.create()
+        self.registry.get(Country, country.mapbox_id)
+        with self.assertNumQueries(0):
+            eq_(self.registry.get_by_id(Country, country.id), country)
+        with self.assertRaises(Country.DoesNotExist):
+            self.registry.get_by_id(Country, country.id + 1)
+
+    def test_get_unregistered(self):
+        self.registry.get(Country, 'unknown')
+        city = CityFactory.create()
+        with self.assertNumQueries(1):
+            eq_(self.registry.get_city_by_name(city.name, city.country, city.region), city)
+        with self.assertNumQueries(0):
+            eq_(self.registry.get(City, city.mapbox_id), city)
+
+    def test_unregister(self):
+        city = CityFactory.create()
+        self.registry.get(City, city.mapbox_id)
+        old_name = city.name
+        City.objects.filter(pk=city.pk).update(name='New %s' % old_name)
+        self.registry.unregister(city.country)
+        eq_(self.registry.get_city_by_name(old_name, city.country, city.region), None)
+        eq_(self.registry.get(City, city.mapbox_id).name, 'New %s' % old_name)
+
+    def test_get_country_code(self):
+        eq_(self.registry.get_country_code('Greece'), 'gr')
+        eq_(self.registry.get_country_code('Petoria'), '')
+
+
+class SignalTests(TestCase):
+    def test_save_and_delete(self):
+        geo_registry.clear()
+        country = CountryFactory.create()
+        ok_(geo_registry.get(Country, country.mapbox_id))
+        new_country = CountryFactory.create()
+        with self.assertNumQueries(1):
+            eq_(geo_registry.get(Country, new_country.mapbox_id), new_country)
+        new_country.name = 'Foo'
+        new_country.save()
+        eq_(geo_registry.get(Country, new_country.mapbox_id).name, 'Foo')
+        new_country.delete()
+        eq_(geo_registry.get(Country, new_country.mapbox_id), None)
@@ -1,5 +1,4 @@
 from django.core.urlresolvers import reverse
-from django.db.models import Count, Sum
 
 from funfactory import utils
 from tastypie import fields
@@ -17,7 +16,7 @@ from mozillians.groups.models import Group, Skill
 
 class GroupBaseResource(AdvancedSortingResourceMixIn, ClientCacheResourceMixIn,
                         GraphiteMixIn, ModelResource):
-    number_of_members = fields.IntegerField(attribute='number_of_members',
+    number_of_members = fields.IntegerField(attribute='member_count',
                                             readonly=True)
 
     class Meta:
@@ -30,6 +29,7 @@ class GroupBaseResource(AdvancedSortingResourceMixIn, ClientCacheResourceMixIn,
         serializer = Serializer(formats=['json', 'jsonp'])
         fields = ['id', 'name', 'number_of_members']
         ordering = ['id', 'name', 'number_of_members']
+        ordering_aliases = {'number_of_members': 'member_count'}
         default_order = ['id']
 
 
@@ -38,11 +38,7 @@ class GroupResource(GroupBaseResource):
 
     class Meta(GroupBaseResource.Meta):
         resource_name = 'groups'
-        # This Sum hack counts the number of 1's in database, only
-        # works with MySQL because it stores booleans as 0s and 1s
-        queryset = (Group.objects
-                    .annotate(number_of_members=Count('members'))
-                    .filter(number_of_members__gt=0))
+        queryset = Group.objects.filter(member_count__gt=0)
 
     def dehydrate_url(self, bundle):
         url = reverse('groups:show_group', args=[bundle.obj.url])
@@ -50,9 +46,10 @@ class GroupResource(GroupBaseResource):
 
 
 class SkillResource(GroupBaseResource):
+    number_of_members = fields.IntegerField(attribute='vouched_member_count',
+                                            readonly=True)
 
     class Meta(GroupBaseResource.Meta):
         resource_name = 'skills'
-        queryset = (Skill.objects
-                    .annotate(number_of_members=Sum('members__is_vouched'))
-                    .filter(number_of_members__gt=0))
+        ordering_aliases = {'number_of_members': 'vouched_member_count'}
+        queryset = Skill.objects.filter(vouched_member_count__gt=0)
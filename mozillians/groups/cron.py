@@ -0,0 +1,9 @@
+import cronjobs
+
+from mozillians.groups.models import GroupTopSkill
+
+
+@cronjobs.register
+def update_group_top_skills():
+    """Recompute the skills group members have in common. Run nightly."""
+    GroupTopSkill.refresh()
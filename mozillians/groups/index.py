@@ -0,0 +1,274 @@
+"""
+Autocompletion of group and skill names.
+
+AliasIndex is a sorted array of the aliases of groups or skills,
+searched by prefix with bisect. Every word of an alias starts an entry,
+so terms match the beginning of any word. Matches are ranked by member
+count.
+
+The aliases, names and member counts the arrays are built from are kept
+in the cache, shared by all processes, and updated in place when
+aliases, groups or skills are saved and when member counts change.
+Processes rebuild their arrays when the version of the cached data
+changes. The cached data is reloaded from the database every
+GROUP_INDEX_TIMEOUT seconds. It's pickled and split in chunks, so that
+it fits in memcached however many groups there are.
+
+Writes to the cached data hold a lock in the cache, so that concurrent
+updates don't overwrite each other. An update that can't get the lock
+drops the cached data instead.
+"""
+import bisect
+import cPickle as pickle
+import logging
+import re
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import signals as dbsignals
+from django.dispatch import receiver
+
+from mozillians.groups.models import (Group, GroupAlias, Skill, SkillAlias,
+                                      member_counts_updated)
+
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+# Bytes of pickled data per cache item, below the 1MB memcached limit.
+CHUNK_SIZE = 512 * 1024
+
+
+def _keys(name):
+    """Return the suffixes of name starting at its words."""
+    name = name.lower()
+    starts = set([0] + [match.start() for match in WORD_RE.finditer(name)])
+    return [name[start:] for start in sorted(starts)]
+
+
+class AliasIndex(object):
+    """Prefix index of the aliases of groups or skills.
+
+    aliases maps alias ids to (name, group id) pairs and groups maps
+    group ids to (name, member count) pairs. Aliases of groups missing
+    from groups are ignored.
+    """
+
+    def __init__(self, aliases, groups):
+        self.groups = groups
+        entries = sorted((key, group_id) for name, group_id in aliases.values()
+                         for key in _keys(name))
+        self.keys = [key for key, group_id in entries]
+        self.group_ids = [group_id for key, group_id in entries]
+
+    def search(self, term, limit=None):
+        """Return the names of the groups with an alias having a word
+        starting with term, the ones with the most members first.
+        """
+        term = term.lower().strip()
+        if not term:
+            return []
+        start = bisect.bisect_left(self.keys, term)
+        end = bisect.bisect_left(self.keys, term + u'\uffff', start)
+        groups = [self.groups[group_id] for group_id in set(self.group_ids[start:end])
+                  if group_id in self.groups]
+        groups.sort(key=lambda group: (-group[1], group[0]))
+        return [name for name, count in groups[:limit]]
+
+
+def _cache_key(model, name):
+    return 'groups:index:%s:%s' % (model._meta.object_name.lower(), name)
+
+
+def load_data(model):
+    """Return the aliases and groups AliasIndex is built from, loaded
+    from the database. Hidden groups are left out.
+    """
+    groups = model.objects.all()
+    if model is Group:
+        groups = groups.visible()
+    return {
+        'aliases': dict((pk, (name, group_id)) for pk, name, group_id
+                        in model.ALIAS_MODEL.objects.values_list('pk', 'name', 'alias')),
+        'groups': dict((pk, (name, count)) for pk, name, count
+                       in groups.values_list('pk', 'name', 'member_count')),
+    }
+
+
+# Seconds a lock on the cached data is held at most, and number of
+# times an update tries to get it.
+LOCK_TIMEOUT = 10
+LOCK_ATTEMPTS = 5
+
+
+def _acquire(model, attempts=1):
+    """Try to lock the cached data of model. Return whether it's locked."""
+    for attempt in range(attempts):
+        if attempt:
+            time.sleep(0.01 * attempt)
+        if cache.add(_cache_key(model, 'lock'), True, LOCK_TIMEOUT):
+            return True
+    return False
+
+
+def _release(model):
+    cache.delete(_cache_key(model, 'lock'))
+
+
+def _chunk_keys(model, version, count):
+    return [_cache_key(model, 'data:%s:%d' % (version, i)) for i in range(count)]
+
+
+def _store(model, data):
+    """Store data under a new version. The pickled data is split in
+    chunks that fit in memcached items, and the version is only stored
+    once all of them are.
+    """
+    data['version'] = uuid.uuid4().hex
+    timeout = getattr(settings, 'GROUP_INDEX_TIMEOUT', 3600)
+    chunk_size = getattr(settings, 'GROUP_INDEX_CHUNK_SIZE', CHUNK_SIZE)
+    pickled = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+    chunks = [pickled[start:start + chunk_size]
+              for start in range(0, len(pickled), chunk_size)]
+    keys = _chunk_keys(model, data['version'], len(chunks))
+    cache.set_many(dict(zip(keys, chunks)), timeout)
+    if len(cache.get_many(keys)) == len(keys):
+        cache.set(_cache_key(model, 'version'), (data['version'], len(chunks)), timeout)
+    else:
+        logger.error('Failed to cache the %s index.' % model._meta.object_name)
+    return data
+
+
+def _load(model, entry):
+    """Return the data stored under the version entry, or None if any
+    of its chunks is missing.
+    """
+    version, count = entry
+    keys = _chunk_keys(model, version, count)
+    chunks = cache.get_many(keys)
+    if len(chunks) != count:
+        return None
+    return pickle.loads(''.join(chunks[key] for key in keys))
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(model):
+    """Return the AliasIndex of model, Group or Skill.
+
+    Only the version of the cached data is read from the cache while
+    the index of the process is up to date.
+    """
+    entry = cache.get(_cache_key(model, 'version'))
+    with _indexes_lock:
+        if entry is not None and model in _indexes and _indexes[model][0] == entry[0]:
+            return _indexes[model][1]
+
+    data = _load(model, entry) if entry is not None else None
+    if data is None:
+        data = load_data(model)
+        # While another process writes, use the data without storing it.
+        if _acquire(model):
+            try:
+                _store(model, data)
+            finally:
+                _release(model)
+        else:
+            data['version'] = uuid.uuid4().hex
+    index = AliasIndex(data['aliases'], data['groups'])
+    with _indexes_lock:
+        _indexes[model] = (data['version'], index)
+    return index
+
+
+def reset_index(model):
+    """Drop the cached data of model, so that it's reloaded from the
+    database.
+    """
+    entry = cache.get(_cache_key(model, 'version'))
+    keys = [_cache_key(model, 'version')]
+    if entry is not None:
+        keys += _chunk_keys(model, *entry)
+    cache.delete_many(keys)
+
+
+def _update(model, update):
+    """Apply update to the cached data of model. Missing data is left
+    to be loaded by the next get_index(). update returns False when it
+    changes nothing.
+    """
+    if not _acquire(model, LOCK_ATTEMPTS):
+        reset_index(model)
+        return
+    try:
+        entry = cache.get(_cache_key(model, 'version'))
+        if entry is None:
+            return
+        data = _load(model, entry)
+        if data is None:
+            reset_index(model)
+            return
+        if update(data) is not False:
+            old_keys = _chunk_keys(model, *entry)
+            _store(model, data)
+            cache.delete_many(old_keys)
+    finally:
+        _release(model)
+
+
+@receiver(dbsignals.post_save, sender=GroupAlias, dispatch_uid='index_group_alias_save_sig')
+@receiver(dbsignals.post_save, sender=SkillAlias, dispatch_uid='index_skill_alias_save_sig')
+def index_alias(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        def update(data):
+            data['aliases'][instance.pk] = (instance.name, instance.alias_id)
+        _update(Group if sender is GroupAlias else Skill, update)
+
+
+@receiver(dbsignals.post_delete, sender=GroupAlias,
+          dispatch_uid='unindex_group_alias_delete_sig')
+@receiver(dbsignals.post_delete, sender=SkillAlias,
+          dispatch_uid='unindex_skill_alias_delete_sig')
+def unindex_alias(sender, instance, **kwargs):
+    model = Group if sender is GroupAlias else Skill
+    _update(model, lambda data: data['aliases'].pop(instance.pk, None))
+
+
+@receiver(dbsignals.post_save, sender=Group, dispatch_uid='index_group_save_sig')
+@receiver(dbsignals.post_save, sender=Skill, dispatch_uid='index_skill_save_sig')
+def index_group(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        def update(data):
+            if instance.is_visible:
+                # Saves don't write member counts, keep the cached one.
+                count = data['groups'].get(instance.pk, (None, instance.member_count))[1]
+                data['groups'][instance.pk] = (instance.name, count)
+            else:
+                data['groups'].pop(instance.pk, None)
+        _update(sender, update)
+
+
+@receiver(dbsignals.post_delete, sender=Group, dispatch_uid='reset_group_index_delete_sig')
+@receiver(dbsignals.post_delete, sender=Skill, dispatch_uid='reset_skill_index_delete_sig')
+def reset_index_after_delete(sender, instance, **kwargs):
+    # Merging moves the aliases of deleted groups with an update, which
+    # sends no signals, so the data is reloaded.
+    reset_index(sender)
+
+
+@receiver(member_counts_updated, sender=Group, dispatch_uid='index_group_member_counts_sig')
+@receiver(member_counts_updated, sender=Skill, dispatch_uid='index_skill_member_counts_sig')
+def index_member_counts(sender, counts, **kwargs):
+    def update(data):
+        changed = False
+        for pk, values in counts.items():
+            if pk in data['groups'] and data['groups'][pk][1] != values['member_count']:
+                data['groups'][pk] = (data['groups'][pk][0], values['member_count'])
+                changed = True
+        return changed
+    _update(sender, update)
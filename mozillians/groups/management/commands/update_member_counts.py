@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from mozillians.groups.models import Group, Skill
+
+
+class Command(BaseCommand):
+    help = 'Recounts the members of all groups and skills'
+
+    def handle(self, *args, **options):
+        for model in [Group, Skill]:
+            updated = model.update_member_counts()
+            self.stdout.write('Updated member counts of %d %s.\n'
+                              % (updated, model._meta.verbose_name_plural))
@@ -1,5 +1,9 @@
+from collections import defaultdict
+
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, get_model, signals as dbsignals
+from django.dispatch import Signal, receiver
 from django.utils.timezone import now
 
 from autoslug.fields import AutoSlugField
@@ -14,9 +18,24 @@ from mozillians.groups.tasks import email_membership_change
 from mozillians.users.tasks import update_basket_task
 
 
+# Sent by update_member_counts with the new counts of the groups whose
+# member counts changed, keyed by group id.
+member_counts_updated = Signal(providing_args=['counts'])
+
+
 class GroupBase(models.Model):
     name = models.CharField(db_index=True, max_length=50, unique=True)
     url = models.SlugField(blank=True)
+    # Denormalized counts, kept up to date by update_member_counts.
+    member_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+    vouched_member_count = models.PositiveIntegerField(default=0, db_index=True,
+                                                       editable=False)
+
+    MEMBER_COUNT_FIELDS = ['member_count', 'vouched_member_count']
+    # Model linking groups to their members, as 'app_label.ModelName',
+    # and the name of its field pointing to the group.
+    MEMBERSHIP_MODEL = None
+    MEMBERSHIP_FIELD = None
 
     objects = GroupBaseManager()
 
@@ -50,15 +69,79 @@ class GroupBase(models.Model):
 
     def save(self, *args, **kwargs):
         self.name = self.name.lower()
-        super(GroupBase, self).save()
+        # Member counts change in the database while instances are
+        # around, saving an existing group must not write them back.
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and not kwargs.get('update_fields')):
+            kwargs['update_fields'] = [field.name for field in self._meta.fields
+                                       if not field.primary_key
+                                       and field.name not in self.MEMBER_COUNT_FIELDS]
+        super(GroupBase, self).save(*args, **kwargs)
         if not self.url:
             alias = self.ALIAS_MODEL.objects.create(name=self.name, alias=self)
             self.url = alias.url
-            super(GroupBase, self).save()
+            super(GroupBase, self).save(update_fields=['url'])
 
     def __unicode__(self):
         return self.name
 
+    @classmethod
+    def get_memberships(cls):
+        """Return a queryset of the rows linking groups to their
+        members and the name of the field pointing to the group.
+        """
+        model = get_model(*cls.MEMBERSHIP_MODEL.split('.'))
+        return model.objects.all(), cls.MEMBERSHIP_FIELD
+
+    @classmethod
+    def count_members(cls, ids=None):
+        """Return a dictionary mapping group ids to dictionaries with
+        their member counts, counted in one query per count.
+
+        Only groups with ids are counted if ids are given. Groups
+        without members are left out.
+        """
+        memberships, field = cls.get_memberships()
+        if ids is not None:
+            memberships = memberships.filter(**{'%s__in' % field: ids})
+        queries = {
+            'member_count': memberships,
+            'vouched_member_count': memberships.filter(userprofile__is_vouched=True),
+        }
+        if 'pending_member_count' in cls.MEMBER_COUNT_FIELDS:
+            queries['pending_member_count'] = memberships.filter(status=GroupMembership.PENDING)
+
+        counts = defaultdict(lambda: dict.fromkeys(cls.MEMBER_COUNT_FIELDS, 0))
+        for name in cls.MEMBER_COUNT_FIELDS:
+            query = queries[name]
+            for pk, count in query.values_list(field).annotate(Count('id')).order_by():
+                counts[pk][name] = count
+        return counts
+
+    @classmethod
+    def update_member_counts(cls, ids=None):
+        """Recount the members of groups with ids, or of all groups.
+
+        Only groups whose counts changed are updated. Return the
+        number of groups updated.
+        """
+        if ids is not None and not ids:
+            return 0
+        counts = cls.count_members(ids)
+        groups = cls.objects.all()
+        if ids is not None:
+            groups = groups.filter(pk__in=ids)
+
+        updated = {}
+        for values in groups.values('pk', *cls.MEMBER_COUNT_FIELDS):
+            pk = values.pop('pk')
+            if values != counts[pk]:
+                cls.objects.filter(pk=pk).update(**counts[pk])
+                updated[pk] = counts[pk]
+        if updated:
+            member_counts_updated.send(sender=cls, counts=updated)
+        return len(updated)
+
     def merge_groups(self, group_list):
         for group in group_list:
             map(lambda x: self.add_member(x),
@@ -153,6 +236,12 @@ class GroupMembership(models.Model):
 class Group(GroupBase):
     ALIAS_MODEL = GroupAlias
 
+    pending_member_count = models.PositiveIntegerField(default=0, editable=False)
+
+    MEMBER_COUNT_FIELDS = GroupBase.MEMBER_COUNT_FIELDS + ['pending_member_count']
+    MEMBERSHIP_MODEL = 'groups.GroupMembership'
+    MEMBERSHIP_FIELD = 'group'
+
     # Has a steward taken ownership of this group?
     description = models.TextField(max_length=255,
                                    verbose_name=_lazy(u'Description'),
@@ -318,3 +407,65 @@ class SkillAlias(GroupAliasBase):
 
 class Skill(GroupBase):
     ALIAS_MODEL = SkillAlias
+    # The through model of UserProfile.skills.
+    MEMBERSHIP_MODEL = 'users.UserProfile_skills'
+    MEMBERSHIP_FIELD = 'skill'
+
+
+class GroupTopSkill(models.Model):
+    """A skill shared by members of a group.
+
+    Computed in bulk by refresh(), which update_group_top_skills runs
+    periodically, so that showing a group doesn't have to count the
+    skills of all its members.
+    """
+    # Skills need at least this many members in the group to be listed.
+    MIN_MEMBERS = 2
+
+    group = models.ForeignKey('groups.Group', related_name='top_skills')
+    skill = models.ForeignKey('groups.Skill', related_name='+')
+    member_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('group', 'skill')
+
+    def __unicode__(self):
+        return u'%s in %s' % (self.skill, self.group)
+
+    @classmethod
+    def count_skills(cls, group_ids=None):
+        """Return (group id, skill id, count) tuples counting the full
+        members of each group having each skill, in one query.
+
+        Members without skills show up with a skill id of None.
+        """
+        memberships = GroupMembership.objects.filter(status=GroupMembership.MEMBER)
+        if group_ids is not None:
+            memberships = memberships.filter(group__in=group_ids)
+        return (memberships.values_list('group', 'userprofile__skills')
+                .annotate(num=Count('id')).filter(num__gte=cls.MIN_MEMBERS).order_by())
+
+    @classmethod
+    def refresh(cls, group_ids=None):
+        """Replace the top skills of groups with group_ids, or of all
+        groups. Return the number of top skills stored.
+        """
+        top_skills = [cls(group_id=group_id, skill_id=skill_id, member_count=count)
+                      for group_id, skill_id, count in cls.count_skills(group_ids)
+                      if skill_id is not None]
+        with transaction.commit_on_success():
+            stale = cls.objects.all()
+            if group_ids is not None:
+                stale = stale.filter(group__in=group_ids)
+            stale.delete()
+            cls.objects.bulk_create(top_skills)
+        return len(top_skills)
+
+
+@receiver(dbsignals.post_save, sender=GroupMembership,
+          dispatch_uid='update_group_member_counts_save_sig')
+@receiver(dbsignals.post_delete, sender=GroupMembership,
+          dispatch_uid='update_group_member_counts_delete_sig')
+def update_group_member_counts(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        Group.update_member_counts([instance.group_id])
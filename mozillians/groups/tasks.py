@@ -1,7 +1,7 @@
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.mail import send_mail
-from django.db.models import Count, Max
+from django.db.models import Max
 from django.db.models.loading import get_model
 from django.template import Context
 from django.template.loader import get_template, render_to_string
@@ -18,8 +18,11 @@ def remove_empty_groups():
     Skill = get_model('groups', 'Skill')
 
     for model in [Group, Skill]:
-        (model.objects
-         .annotate(mcount=Count('members')).filter(mcount=0).delete())
+        # Recount before deleting, so that a stale count never
+        # removes a group that has members.
+        ids = list(model.objects.filter(member_count=0).values_list('id', flat=True))
+        model.update_member_counts(ids)
+        model.objects.filter(id__in=ids, member_count=0).delete()
 
 
 # TODO: Schedule this task nightly
@@ -0,0 +1,123 @@
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from mock import patch
+from nose.tools import eq_, ok_
+
+from mozillians.common.tests import TestCase
+from mozillians.groups.index import (AliasIndex, _cache_key, _load, _update, get_index,
+                                     reset_index)
+from mozillians.groups.models import Group, Skill
+from mozillians.groups.tests import GroupAliasFactory, GroupFactory, SkillFactory
+from mozillians.users.tests import UserFactory
+
+
+class AliasIndexTests(TestCase):
+    def setUp(self):
+        aliases = {1: (u'web development', 1),
+                   2: (u'webdev', 1),
+                   3: (u'web qa', 2),
+                   4: (u'Web-QA', 2),
+                   5: (u'weblate', 3)}
+        groups = {1: (u'web development', 5), 2: (u'web qa', 10)}
+        self.index = AliasIndex(aliases, groups)
+
+    def test_search(self):
+        eq_(self.index.search(u'web'), [u'web qa', u'web development'])
+        eq_(self.index.search(u'webd'), [u'web development'])
+        eq_(self.index.search(u'Web D'), [u'web development'])
+
+    def test_search_words(self):
+        eq_(self.index.search(u'dev'), [u'web development'])
+        eq_(self.index.search(u'qa'), [u'web qa'])
+        eq_(self.index.search(u'eb'), [])
+
+    def test_search_limit(self):
+        eq_(self.index.search(u'web', limit=1), [u'web qa'])
+
+    def test_search_empty(self):
+        eq_(self.index.search(u'  '), [])
+
+
+class GetIndexTests(TestCase):
+    def setUp(self):
+        reset_index(Group)
+        reset_index(Skill)
+
+    def test_get_index(self):
+        group = GroupFactory.create(name='Foo', visible=True)
+        GroupFactory.create(name='Food', visible=False)
+        SkillFactory.create(name='Fool')
+        eq_(get_index(Group).search('foo'), [group.name])
+        eq_(get_index(Skill).search('foo'), ['fool'])
+
+    def test_alias_changes(self):
+        group = GroupFactory.create(name='Foo', visible=True)
+        get_index(Group)
+        alias = GroupAliasFactory.create(alias=group, name='bar')
+        eq_(get_index(Group).search('bar'), ['foo'])
+        alias.delete()
+        eq_(get_index(Group).search('bar'), [])
+
+    def test_group_changes(self):
+        group = GroupFactory.create(name='Foo', visible=True)
+        get_index(Group)
+        group.visible = False
+        group.save()
+        eq_(get_index(Group).search('foo'), [])
+
+    def test_merge_groups(self):
+        group_1 = GroupFactory.create(name='Foo', visible=True)
+        group_2 = GroupFactory.create(name='Bar', visible=True)
+        get_index(Group)
+        group_1.merge_groups([group_2])
+        eq_(get_index(Group).search('bar'), ['foo'])
+
+    def test_reset_index(self):
+        get_index(Group)
+        entry = cache.get(_cache_key(Group, 'version'))
+        reset_index(Group)
+        eq_(cache.get(_cache_key(Group, 'version')), None)
+        eq_(_load(Group, entry), None)
+
+    def test_update_without_version(self):
+        GroupFactory.create(name='Foo', visible=True)
+        get_index(Group)
+        entry = cache.get(_cache_key(Group, 'version'))
+        cache.delete(_cache_key(Group, 'version'))
+        _update(Group, lambda data: data['groups'].clear())
+        eq_(cache.get(_cache_key(Group, 'version')), None)
+        ok_(_load(Group, entry)['groups'])
+
+    @override_settings(GROUP_INDEX_CHUNK_SIZE=10)
+    def test_chunks(self):
+        GroupFactory.create(name='Foo', visible=True)
+        get_index(Group)
+        version, count = cache.get(_cache_key(Group, 'version'))
+        ok_(count > 1)
+        eq_(_load(Group, (version, count))['version'], version)
+
+    @patch('mozillians.groups.index.cache.set_many')
+    def test_store_failed(self, set_many_mock):
+        GroupFactory.create(name='Foo', visible=True)
+        eq_(get_index(Group).search('foo'), ['foo'])
+        eq_(cache.get(_cache_key(Group, 'version')), None)
+
+    def test_member_count_changes(self):
+        group_1 = GroupFactory.create(name='Foo A', visible=True)
+        group_2 = GroupFactory.create(name='Foo B', visible=True)
+        group_1.add_member(UserFactory.create().userprofile)
+        eq_(get_index(Group).search('foo'), ['foo a', 'foo b'])
+        group_2.add_member(UserFactory.create().userprofile)
+        group_2.add_member(UserFactory.create().userprofile)
+        eq_(get_index(Group).search('foo'), ['foo b', 'foo a'])
+
+    @patch('mozillians.groups.index.time.sleep')
+    def test_update_while_locked(self, sleep_mock):
+        GroupFactory.create(name='Foo', visible=True)
+        get_index(Group)
+        cache.add(_cache_key(Group, 'lock'), True)
+        _update(Group, lambda data: data['groups'].clear())
+        eq_(cache.get(_cache_key(Group, 'version')), None)
+        cache.delete(_cache_key(Group, 'lock'))
+        eq_(get_index(Group).search('foo'), ['foo'])
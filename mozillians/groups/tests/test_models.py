@@ -5,7 +5,8 @@ from django.core.urlresolvers import reverse
 from nose.tools import eq_, ok_
 
 from mozillians.common.tests import TestCase
-from mozillians.groups.models import Group, GroupAlias, GroupMembership
+from mozillians.groups.models import (Group, GroupAlias, GroupMembership, GroupTopSkill,
+                                      Skill)
 from mozillians.groups.tests import (GroupAliasFactory, GroupFactory,
                                      SkillFactory)
 from mozillians.users.tests import UserFactory
@@ -261,6 +262,133 @@ class GroupTests(TestCase):
         ok_(not group.has_member(user.userprofile))
 
 
+class MemberCountTests(TestCase):
+    def get_counts(self, group):
+        group = type(group).objects.get(pk=group.pk)
+        return [getattr(group, field) for field in group.MEMBER_COUNT_FIELDS]
+
+    def test_group_membership_changes(self):
+        group = GroupFactory.create()
+        user_1 = UserFactory.create()
+        user_2 = UserFactory.create(vouched=False)
+        group.add_member(user_1.userprofile)
+        group.add_member(user_2.userprofile, GroupMembership.PENDING)
+        # member_count, vouched_member_count, pending_member_count
+        eq_(self.get_counts(group), [2, 1, 1])
+
+        group.add_member(user_2.userprofile)
+        eq_(self.get_counts(group), [2, 1, 0])
+
+        group.remove_member(user_1.userprofile)
+        eq_(self.get_counts(group), [1, 0, 0])
+
+        user_2.delete()
+        eq_(self.get_counts(group), [0, 0, 0])
+
+    def test_skill_membership_changes(self):
+        skill_1 = SkillFactory.create()
+        skill_2 = SkillFactory.create()
+        user_1 = UserFactory.create()
+        user_2 = UserFactory.create(vouched=False)
+        user_1.userprofile.skills.add(skill_1, skill_2)
+        skill_1.members.add(user_2.userprofile)
+        eq_(self.get_counts(skill_1), [2, 1])
+        eq_(self.get_counts(skill_2), [1, 1])
+
+        user_1.userprofile.skills.remove(skill_2)
+        eq_(self.get_counts(skill_2), [0, 0])
+
+        user_1.userprofile.skills.clear()
+        eq_(self.get_counts(skill_1), [1, 0])
+
+        user_2.delete()
+        eq_(self.get_counts(skill_1), [0, 0])
+
+    def test_vouch_changes(self):
+        group = GroupFactory.create()
+        skill = SkillFactory.create()
+        user = UserFactory.create(vouched=False)
+        group.add_member(user.userprofile)
+        user.userprofile.skills.add(skill)
+        eq_(self.get_counts(group), [1, 0, 0])
+        eq_(self.get_counts(skill), [1, 0])
+
+        user.userprofile.vouch(None)
+        eq_(self.get_counts(group), [1, 1, 0])
+        eq_(self.get_counts(skill), [1, 1])
+
+    def test_save_keeps_counts(self):
+        group = GroupFactory.create()
+        group.add_member(UserFactory.create().userprofile)
+        group.description = 'foo'
+        group.save()
+        eq_(self.get_counts(group), [1, 1, 0])
+
+    def test_save_with_explicit_pk(self):
+        group = Group(pk=1000, name='foo')
+        group.save()
+        group = Group.objects.get(pk=1000)
+        eq_(group.name, 'foo')
+        ok_(group.url)
+
+    def test_update_member_counts(self):
+        group = GroupFactory.create()
+        group.add_member(UserFactory.create().userprofile)
+        Group.objects.filter(pk=group.pk).update(member_count=5)
+        eq_(Group.update_member_counts(), 1)
+        eq_(self.get_counts(group), [1, 1, 0])
+        eq_(Group.update_member_counts(), 0)
+
+    def test_update_skill_member_counts(self):
+        skill = SkillFactory.create()
+        UserFactory.create().userprofile.skills.add(skill)
+        Skill.objects.filter(pk=skill.pk).update(member_count=5)
+        eq_(Skill.update_member_counts(), 1)
+        eq_(self.get_counts(skill), [1, 1])
+
+
+class GroupTopSkillTests(TestCase):
+    def get_top_skills(self, group):
+        return list(group.top_skills.order_by('-member_count', 'skill__name')
+                    .values_list('skill', 'member_count'))
+
+    def test_refresh(self):
+        group = GroupFactory.create()
+        skill_1 = SkillFactory.create(name='a')
+        skill_2 = SkillFactory.create(name='b')
+        skill_3 = SkillFactory.create(name='c')
+        users = UserFactory.create_batch(3)
+        for user in users:
+            group.add_member(user.userprofile)
+            skill_2.members.add(user.userprofile)
+        skill_1.members.add(users[0].userprofile, users[1].userprofile)
+        skill_3.members.add(users[0].userprofile)
+        # Pending members and members of other groups don't count.
+        pending = UserFactory.create()
+        group.add_member(pending.userprofile, GroupMembership.PENDING)
+        skill_3.members.add(pending.userprofile, UserFactory.create().userprofile)
+
+        eq_(GroupTopSkill.refresh(), 2)
+        eq_(self.get_top_skills(group), [(skill_2.id, 3), (skill_1.id, 2)])
+
+    def test_refresh_replaces_stale(self):
+        group = GroupFactory.create()
+        other_group = GroupFactory.create()
+        skill = SkillFactory.create()
+        users = UserFactory.create_batch(2)
+        for user in users:
+            group.add_member(user.userprofile)
+            other_group.add_member(user.userprofile)
+            skill.members.add(user.userprofile)
+        GroupTopSkill.refresh()
+
+        group.remove_member(users[0].userprofile)
+        other_group.remove_member(users[0].userprofile)
+        eq_(GroupTopSkill.refresh([group.id]), 0)
+        eq_(self.get_top_skills(group), [])
+        eq_(self.get_top_skills(other_group), [(skill.id, 2)])
+
+
 class GroupAliasBaseTests(TestCase):
     def test_auto_slug_field(self):
         group = GroupFactory.create()
@@ -4,8 +4,8 @@ from mock import patch
 from nose.tools import ok_, eq_
 
 from mozillians.common.tests import TestCase
-from mozillians.groups.models import Group
-from mozillians.groups.tests import GroupFactory
+from mozillians.groups.models import Group, Skill
+from mozillians.groups.tests import GroupFactory, SkillFactory
 from mozillians.groups.views import _list_groups
 from mozillians.users.tests import UserFactory
 
@@ -55,6 +55,19 @@ class ListTests(TestCase):
         request, template, data = render_mock.call_args[0]
         eq_(data['groups'].object_list[0], self.group_1)
 
+    def test_sort_skills_by_vouched_members(self, render_mock):
+        skill_1 = SkillFactory.create()
+        skill_2 = SkillFactory.create()
+        skill_1.members.add(self.user.userprofile)
+        for i in range(2):
+            UserFactory.create(vouched=False).userprofile.skills.add(skill_2)
+        query = Skill.objects.filter(pk__in=[skill_1.pk, skill_2.pk])
+        self.request.GET = {'sort': '-member_count'}
+        _list_groups(self.request, self.template, query, count_field='vouched_member_count')
+        ok_(render_mock.called)
+        request, template, data = render_mock.call_args[0]
+        eq_(data['groups'].object_list[0], skill_1)
+
     def test_invalid_sort(self, render_mock):
         self.request.GET = {'sort': 'invalid'}
         _list_groups(self.request, self.template, self.query)
@@ -8,6 +8,8 @@ from funfactory.helpers import urlparams
 from nose.tools import eq_, ok_
 
 from mozillians.common.tests import TestCase, requires_login, requires_vouch
+from mozillians.groups.index import reset_index
+from mozillians.groups.models import Group, Skill
 from mozillians.groups.tests import GroupFactory, SkillFactory
 from mozillians.users.tests import UserFactory
 
@@ -111,6 +113,10 @@ class IndexSkillsTests(TestCase):
 
 
 class SearchTests(TestCase):
+    def setUp(self):
+        reset_index(Group)
+        reset_index(Skill)
+
     def test_search_existing_group(self):
         user = UserFactory.create()
         group_1 = GroupFactory.create(visible=True)
@@ -5,7 +5,8 @@ from funfactory.helpers import urlparams
 from nose.tools import eq_, ok_
 
 from mozillians.common.tests import TestCase, requires_login, requires_vouch
-from mozillians.groups.models import GroupMembership
+from mozillians.groups.cron import update_group_top_skills
+from mozillians.groups.models import GroupMembership, GroupTopSkill
 from mozillians.groups.tests import GroupFactory, GroupAliasFactory, SkillFactory
 from mozillians.users.tests import UserFactory
 
@@ -118,6 +119,7 @@ class ShowTests(TestCase):
         users = UserFactory.create_batch(5)
         for user in users:
             skill_4.members.add(user.userprofile)
+        GroupTopSkill.refresh()
 
         url = reverse('groups:show_group', kwargs={'url': group.url})
         with self.login(user_1) as client:
@@ -129,6 +131,26 @@ class ShowTests(TestCase):
         eq_(skills[2], skill_4)
         ok_(skill_1 not in skills)
 
+    def test_show_skills_after_cron(self):
+        user = UserFactory.create()
+        group = GroupFactory.create()
+        group.add_member(user.userprofile)
+        group.add_member(self.user_2.userprofile)
+        skill = SkillFactory.create(name='shared skill')
+        skill.members.add(user.userprofile)
+        skill.members.add(self.user_2.userprofile)
+
+        url = reverse('groups:show_group', kwargs={'url': group.url})
+        with self.login(user) as client:
+            response = client.get(url, follow=True)
+        ok_('shared skill' not in response.content)
+
+        update_group_top_skills()
+        with self.login(user) as client:
+            response = client.get(url, follow=True)
+        eq_(list(response.context['skills']), [skill])
+        ok_('shared skill' in response.content)
+
     @requires_login()
     def test_show_anonymous(self):
         client = Client()
@@ -1,7 +1,5 @@
 import json
 
-from collections import defaultdict
-
 from django.conf import settings
 from django.contrib import messages
 from django.core.paginator import EmptyPage, Paginator, PageNotAnInteger
@@ -17,17 +15,21 @@ from tower import ugettext as _
 
 from mozillians.common.decorators import allow_unvouched
 from mozillians.groups.forms import GroupForm, MembershipFilterForm, SortForm, SuperuserGroupForm
+from mozillians.groups.index import get_index
 from mozillians.groups.models import Group, Skill, GroupMembership
 
 
-def _list_groups(request, template, query):
-    """Lists groups from given query."""
+def _list_groups(request, template, query, count_field='member_count'):
+    """Lists groups from given query, sorted by count_field when
+    sorting by members.
+    """
 
     sort_form = SortForm(request.GET)
     show_pagination = False
 
     if sort_form.is_valid():
-        query = query.order_by(sort_form.cleaned_data['sort'], 'name')
+        sort = sort_form.cleaned_data['sort'].replace('member_count', count_field)
+        query = query.order_by(sort, 'name')
     else:
         query = query.order_by('name')
 
@@ -61,9 +63,9 @@ def index_groups(request):
 
 def index_skills(request):
     """Lists all public skills (in use) on Mozillians."""
-    query = Skill.objects.filter(members__is_vouched=True)
+    query = Skill.objects.filter(vouched_member_count__gt=0)
     template = 'groups/index_skills.html'
-    return _list_groups(request, template, query)
+    return _list_groups(request, template, query, count_field='vouched_member_count')
 
 
 def index_functional_areas(request):
@@ -76,15 +78,16 @@ def index_functional_areas(request):
 @allow_unvouched
 @cache_control(must_revalidate=True, max_age=3600)
 def search(request, searched_object=Group):
-    """Simple wildcard search for a group using a GET parameter.
+    """Prefix search for a group using a GET parameter.
 
-    Used for group/skill auto-completion.
+    Used for group/skill auto-completion. Groups are looked up in the
+    prefix index of their aliases, most members first.
 
     """
     term = request.GET.get('term', None)
     if request.is_ajax() and term:
-        groups = searched_object.search(term).values_list('name', flat=True)
-        return HttpResponse(json.dumps(list(groups)),
+        groups = get_index(searched_object).search(term)
+        return HttpResponse(json.dumps(groups),
                             mimetype='application/json')
 
     return HttpResponseBadRequest()
@@ -143,21 +146,11 @@ def show(request, url, alias_model, template):
         # Order by UserProfile.Meta.ordering
         memberships = memberships.order_by('userprofile')
 
-        # Find the most common skills of the group members.
-        # Order by popularity in the group.
-        shared_skill_ids = (group.members.filter(groupmembership__status=GroupMembership.MEMBER)
-                            .values_list('skills', flat=True))
-
-        count_skills = defaultdict(int)
-        for skill_id in shared_skill_ids:
-            count_skills[skill_id] += 1
-        common_skills_ids = [k for k, v in sorted(count_skills.items(),
-                                                  key=lambda x: x[1],
-                                                  reverse=True)
-                             if count_skills[k] > 1]
-
-        # Translate ids to Skills preserving order.
-        skills = [Skill.objects.get(id=skill_id) for skill_id in common_skills_ids if skill_id]
+        # Most common skills of the group members, as last computed
+        # by update_group_top_skills. Order by popularity in the group.
+        top_skills = (group.top_skills.select_related('skill')
+                      .order_by('-member_count', 'skill__name'))
+        skills = [top_skill.skill for top_skill in top_skills]
 
         data.update(skills=skills, membership_filter_form=membership_filter_form)
 
@@ -13,12 +13,14 @@ import happyforms
 from PIL import Image
 from tower import ugettext as _, ugettext_lazy as _lazy
 
+from mozillians.geo.models import Country
 from mozillians.groups.models import Skill
 from mozillians.phonebook.models import Invite
 from mozillians.phonebook.validators import validate_username
 from mozillians.phonebook.widgets import MonthYearWidget
 from mozillians.users import get_languages_for_locale
 from mozillians.users.models import ExternalAccount, Language, UserProfile
+from mozillians.users.tasks import reverse_geocode_profile
 
 
 REGEX_NUMERIC = re.compile('\d+', re.IGNORECASE)
@@ -93,15 +95,39 @@ class SearchFilter(django_filters.FilterSet):
     vouched = django_filters.ChoiceFilter(
         name='vouched', label=_lazy('Display only'), required=False,
         choices=CHOICES, action=filter_vouched)
+    country = django_filters.ModelChoiceFilter(
+        name='geo_country', label=_lazy('Country'), required=False,
+        queryset=Country.objects.exclude(mapbox_id='geo_error').order_by('name'))
 
     class Meta:
         model = UserProfile
-        fields = ['vouched', 'skills', 'groups', 'timezone']
+        fields = ['vouched', 'skills', 'groups', 'timezone', 'country']
 
     def __init__(self, *args, **kwargs):
         super(SearchFilter, self).__init__(*args, **kwargs)
         self.filters['timezone'].field.choices.insert(0, ('', _lazy(u'All timezones')))
 
+    def filter_search(self, s):
+        """Return search s filtered like qs, with Elasticsearch
+        filters on the fields of the search documents. The form must
+        be valid.
+        """
+        data = self.form.cleaned_data
+        if data.get('vouched') == self.CHOICE_ONLY_VOUCHED:
+            s = s.filter(is_vouched=True)
+        elif data.get('vouched') == self.CHOICE_ONLY_UNVOUCHED:
+            s = s.filter(is_vouched=False)
+        # Like qs, profiles in any of the selected groups or skills match.
+        if data.get('skills'):
+            s = s.filter(skill_ids__in=[skill.id for skill in data['skills']])
+        if data.get('groups'):
+            s = s.filter(group_ids__in=[group.id for group in data['groups']])
+        if data.get('timezone'):
+            s = s.filter(timezone=data['timezone'])
+        if data.get('country'):
+            s = s.filter(country_id=data['country'].id)
+        return s
+
 
 class UserForm(happyforms.ModelForm):
     """Instead of just inhereting form a UserProfile model form, this
@@ -219,8 +245,9 @@ class ProfileForm(happyforms.ModelForm):
                 'saveregion' in self.changed_data or 'savecity' in self.changed_data):
                 self.instance.lat = self.cleaned_data['lat']
                 self.instance.lng = self.cleaned_data['lng']
-                self.instance.reverse_geocode()
-                if not self.instance.geo_country:
+                self.instance.reverse_geocode(
+                    defer=getattr(settings, 'GEO_ASYNC_GEOCODING', False))
+                if not self.instance.geo_country and not self.instance.geocode_pending:
                     error_msg = _('Location must be inside a country.')
                     self.errors['savecountry'] = self.error_class([error_msg])
                     del self.cleaned_data['savecountry']
@@ -245,6 +272,10 @@ class ProfileForm(happyforms.ModelForm):
         """Save the data to profile."""
         self.instance.set_membership(Skill, self.cleaned_data['skills'])
         super(ProfileForm, self).save(*args, **kwargs)
+        if self.instance.geocode_pending:
+            reverse_geocode_profile.delay(self.instance.id, self.instance.lat, self.instance.lng,
+                                          save_region=bool(self.cleaned_data.get('saveregion')),
+                                          save_city=bool(self.cleaned_data.get('savecity')))
 
 
 class BaseLanguageFormSet(BaseInlineFormSet):
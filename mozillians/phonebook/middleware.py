@@ -9,6 +9,8 @@ from tower import ugettext as _
 
 from mozillians.common.helpers import redirect
 from mozillians.common.middleware import safe_query_string
+from mozillians.phonebook.models import (collect_profile_cache_invalidations,
+                                         repeat_profile_cache_invalidations)
 
 
 class RegisterMiddleware():
@@ -58,3 +60,18 @@ class UsernameRedirectionMiddleware():
                     newurl += '?' + request.META['QUERY_STRING']
             return HttpResponseRedirect(newurl)
         return response
+
+
+class ProfileCacheMiddleware():
+    """
+    Invalidate the cached profile pages the request invalidated again
+    when it's finished, after its writes are committed.
+
+    """
+
+    def process_request(self, request):
+        collect_profile_cache_invalidations()
+
+    def process_response(self, request, response):
+        repeat_profile_cache_invalidations()
+        return response
@@ -1,7 +1,13 @@
+import threading
+import uuid
+
 from django.utils.crypto import get_random_string
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.mail import send_mail
 from django.conf import settings
 from django.db import models
+from django.db.models import Q
 from django.dispatch import receiver
 from django.template.loader import get_template
 
@@ -10,7 +16,8 @@ from funfactory.urlresolvers import reverse
 from funfactory.utils import absolutify
 from tower import ugettext as _, ugettext_lazy as _lazy
 
-from mozillians.users.models import UserProfile
+from mozillians.groups.models import Group, GroupMembership, Skill
+from mozillians.users.models import ExternalAccount, Language, UserProfile, Vouch
 
 
 class Invite(models.Model):
@@ -88,3 +95,144 @@ def generate_code(sender, instance, raw, using, **kwargs):
             continue
 
     instance.code = code
+
+
+# Rendered parts of profile pages are cached under keys holding a
+# version of the profile and a version of all profiles, so changing a
+# version invalidates them.
+PROFILE_VERSION_KEY = 'phonebook:profile:%s:version'
+ALL_PROFILES_VERSION_KEY = 'phonebook:profile:all:version'
+
+
+def get_profile_cache_key(profile_id, *parts):
+    """Return the cache key of a rendered part of the page of the
+    profile with profile_id, identified by parts.
+    """
+    keys = [PROFILE_VERSION_KEY % profile_id, ALL_PROFILES_VERSION_KEY]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            versions[key] = uuid.uuid4().hex
+            cache.set(key, versions[key], getattr(settings, 'PROFILE_CACHE_TIMEOUT', 3600))
+    return 'phonebook:profile:%s:%s:%s:%s' % (profile_id, versions[keys[0]],
+                                             versions[keys[1]], ':'.join(map(str, parts)))
+
+
+# Version keys deleted during the current request.
+_invalidated = threading.local()
+
+
+def invalidate_profile_cache(profile_ids=None):
+    """Invalidate the cached parts of the pages of profiles with
+    profile_ids, or of all profiles.
+
+    Writes are signalled before they're committed, so pages can be
+    cached again from the old data in between. Keys deleted during a
+    request are deleted once more by repeat_profile_cache_invalidations
+    when the request finishes.
+    """
+    if profile_ids is None:
+        keys = [ALL_PROFILES_VERSION_KEY]
+    else:
+        keys = [PROFILE_VERSION_KEY % id_ for id_ in set(profile_ids) if id_]
+    cache.delete_many(keys)
+    pending = getattr(_invalidated, 'keys', None)
+    if pending is not None:
+        pending.update(keys)
+
+
+def collect_profile_cache_invalidations():
+    """Start remembering the keys invalidate_profile_cache deletes."""
+    _invalidated.keys = set()
+
+
+def repeat_profile_cache_invalidations():
+    """Delete the keys deleted since
+    collect_profile_cache_invalidations again.
+    """
+    keys = getattr(_invalidated, 'keys', None)
+    _invalidated.keys = None
+    if keys:
+        cache.delete_many(list(keys))
+
+
+def _with_vouch_partners(profile_ids):
+    """Return profile_ids and the ids of the profiles they vouched for
+    or were vouched by, whose pages show their names.
+    """
+    vouches = Vouch.objects.filter(Q(voucher__in=profile_ids) | Q(vouchee__in=profile_ids))
+    return (list(profile_ids)
+            + [id_ for pair in vouches.values_list('voucher', 'vouchee') for id_ in pair])
+
+
+@receiver(models.signals.post_save, sender=UserProfile,
+          dispatch_uid='invalidate_profile_cache_profile_save_sig')
+@receiver(models.signals.post_delete, sender=UserProfile,
+          dispatch_uid='invalidate_profile_cache_profile_delete_sig')
+def invalidate_profile_cache_for_profile(sender, instance, **kwargs):
+    invalidate_profile_cache(_with_vouch_partners([instance.id]))
+
+
+@receiver(models.signals.post_save, sender=User,
+          dispatch_uid='invalidate_profile_cache_user_save_sig')
+def invalidate_profile_cache_for_user(sender, instance, update_fields=None, **kwargs):
+    # Logging in only updates last_login.
+    if update_fields and set(update_fields) == set(['last_login']):
+        return
+    profile_ids = UserProfile.objects.filter(user=instance).values_list('id', flat=True)
+    invalidate_profile_cache(_with_vouch_partners(list(profile_ids)))
+
+
+@receiver(models.signals.post_save, sender=Vouch,
+          dispatch_uid='invalidate_profile_cache_vouch_save_sig')
+@receiver(models.signals.post_delete, sender=Vouch,
+          dispatch_uid='invalidate_profile_cache_vouch_delete_sig')
+def invalidate_profile_cache_for_vouch(sender, instance, **kwargs):
+    invalidate_profile_cache([instance.vouchee_id, instance.voucher_id])
+
+
+@receiver(models.signals.post_save, sender=GroupMembership,
+          dispatch_uid='invalidate_profile_cache_membership_save_sig')
+@receiver(models.signals.post_delete, sender=GroupMembership,
+          dispatch_uid='invalidate_profile_cache_membership_delete_sig')
+@receiver(models.signals.post_save, sender=Language,
+          dispatch_uid='invalidate_profile_cache_language_save_sig')
+@receiver(models.signals.post_delete, sender=Language,
+          dispatch_uid='invalidate_profile_cache_language_delete_sig')
+def invalidate_profile_cache_for_related(sender, instance, **kwargs):
+    invalidate_profile_cache([instance.userprofile_id])
+
+
+@receiver(models.signals.post_save, sender=ExternalAccount,
+          dispatch_uid='invalidate_profile_cache_account_save_sig')
+@receiver(models.signals.post_delete, sender=ExternalAccount,
+          dispatch_uid='invalidate_profile_cache_account_delete_sig')
+def invalidate_profile_cache_for_account(sender, instance, **kwargs):
+    invalidate_profile_cache([instance.user_id])
+
+
+@receiver(models.signals.m2m_changed, sender=UserProfile.skills.through,
+          dispatch_uid='invalidate_profile_cache_skills_sig')
+def invalidate_profile_cache_for_skills(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_profile_cache([instance.id])
+    elif pk_set:
+        invalidate_profile_cache(pk_set)
+    else:
+        invalidate_profile_cache()
+
+
+@receiver(models.signals.post_save, sender=Group,
+          dispatch_uid='invalidate_profile_cache_group_save_sig')
+@receiver(models.signals.post_delete, sender=Group,
+          dispatch_uid='invalidate_profile_cache_group_delete_sig')
+@receiver(models.signals.post_save, sender=Skill,
+          dispatch_uid='invalidate_profile_cache_skill_save_sig')
+@receiver(models.signals.post_delete, sender=Skill,
+          dispatch_uid='invalidate_profile_cache_skill_delete_sig')
+def invalidate_profile_cache_for_groups(sender, instance, **kwargs):
+    # Names, urls and curators of groups and skills show up on the
+    # pages of all their members.
+    invalidate_profile_cache()
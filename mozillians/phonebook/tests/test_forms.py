@@ -1,12 +1,14 @@
 from django.forms import model_to_dict
 
-from mock import MagicMock, patch
+from mock import MagicMock, call, patch
 from mozillians.geo.tests import CountryFactory
 from nose.tools import eq_, ok_
 
 from mozillians.common.tests import TestCase
 from mozillians.groups.models import Skill
-from mozillians.phonebook.forms import EmailForm, ExternalAccountForm, ProfileForm
+from mozillians.groups.tests import GroupFactory, SkillFactory
+from mozillians.phonebook.forms import (EmailForm, ExternalAccountForm, ProfileForm,
+                                        SearchFilter)
 from mozillians.users.tests import UserFactory
 
 
@@ -120,3 +122,32 @@ class ExternalAccountFormTests(TestCase):
                                         'privacy': 3})
             form.is_valid()
         ok_('identifier' in form.errors)
+
+
+class SearchFilterTests(TestCase):
+    def test_filter_search(self):
+        country = CountryFactory.create()
+        group = GroupFactory.create()
+        skill = SkillFactory.create()
+        filtr = SearchFilter({'vouched': SearchFilter.CHOICE_ONLY_UNVOUCHED,
+                              'groups': [group.id],
+                              'skills': [skill.id],
+                              'timezone': 'Europe/Athens',
+                              'country': country.id})
+        ok_(filtr.form.is_valid())
+        s = MagicMock()
+        s.filter.return_value = s
+        eq_(filtr.filter_search(s), s)
+        eq_(s.filter.call_args_list,
+            [call(is_vouched=False),
+             call(skill_ids__in=[skill.id]),
+             call(group_ids__in=[group.id]),
+             call(timezone='Europe/Athens'),
+             call(country_id=country.id)])
+
+    def test_filter_search_all(self):
+        filtr = SearchFilter({'vouched': SearchFilter.CHOICE_ALL})
+        ok_(filtr.form.is_valid())
+        s = MagicMock()
+        eq_(filtr.filter_search(s), s)
+        ok_(not s.filter.called)
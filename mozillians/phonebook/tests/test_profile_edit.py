@@ -1,4 +1,5 @@
 from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
 
 from mock import patch
 from nose.tools import eq_, ok_
@@ -164,6 +165,62 @@ class LocationEditTests(TestCase):
         ok_(not form.is_valid())
         ok_('saveregion' in form.errors)
 
+    @override_settings(GEO_ASYNC_GEOCODING=True)
+    @patch('mozillians.phonebook.forms.reverse_geocode_profile')
+    @patch('mozillians.geo.lookup.reverse_geocode_locally')
+    def test_location_async(self, mock_reverse_geocode_locally, mock_task):
+        # Locations unknown locally are resolved after saving
+        mock_reverse_geocode_locally.return_value = None
+        self.data.update({'saveregion': True, 'savecity': True})
+        self.data.update(_get_privacy_fields(MOZILLIANS))
+
+        form = ProfileForm(data=self.data, instance=self.user.userprofile)
+        ok_(form.is_valid())
+        ok_(form.instance.geocode_pending)
+        eq_(form.instance.geo_country, None)
+        ok_(not mock_task.delay.called)
+        form.save()
+        mock_task.delay.assert_called_with(self.user.userprofile.id, 40.005814, -3.42071,
+                                           save_region=True, save_city=True)
+
+    @override_settings(GEO_ASYNC_GEOCODING=True)
+    @patch('mozillians.phonebook.forms.reverse_geocode_profile')
+    @patch('mozillians.geo.lookup.reverse_geocode_locally')
+    def test_location_async_keeps_location(self, mock_reverse_geocode_locally, mock_task):
+        # The previous location is shown until the task resolves the new one
+        mock_reverse_geocode_locally.return_value = None
+        profile = self.user.userprofile
+        profile.geo_country = self.country
+        profile.geo_region = self.region
+        profile.geo_city = self.city
+        profile.save()
+        self.data.update({'saveregion': True, 'savecity': True})
+        self.data.update(_get_privacy_fields(MOZILLIANS))
+
+        form = ProfileForm(data=self.data, instance=profile)
+        ok_(form.is_valid())
+        form.save()
+        profile = UserProfile.objects.get(pk=profile.pk)
+        ok_(profile.geocode_pending)
+        eq_((profile.geo_country, profile.geo_region, profile.geo_city),
+            (self.country, self.region, self.city))
+        ok_(mock_task.delay.called)
+
+    @override_settings(GEO_ASYNC_GEOCODING=True)
+    @patch('mozillians.phonebook.forms.reverse_geocode_profile')
+    @patch('mozillians.geo.lookup.reverse_geocode_locally')
+    def test_location_async_known(self, mock_reverse_geocode_locally, mock_task):
+        # Locations known locally are resolved right away
+        mock_reverse_geocode_locally.return_value = (self.country, self.region, self.city)
+        self.data.update(_get_privacy_fields(MOZILLIANS))
+
+        form = ProfileForm(data=self.data, instance=self.user.userprofile)
+        ok_(form.is_valid())
+        ok_(not form.instance.geocode_pending)
+        eq_(form.instance.geo_country, self.country)
+        form.save()
+        ok_(not mock_task.delay.called)
+
     @patch('mozillians.geo.lookup.requests')
     def test_location_profile_save_connectionerror(self, mock_requests):
         mock_requests.get.return_value.raise_for_status.side_effect = ConnectionError
@@ -0,0 +1,63 @@
+from django.core.paginator import EmptyPage
+
+from django.test.utils import override_settings
+
+from mock import MagicMock, patch
+from nose.tools import eq_, ok_
+
+from mozillians.common.tests import TestCase
+from mozillians.phonebook.utils import SearchPaginator
+
+
+class SearchPaginatorTests(TestCase):
+    def search(self, hits, total):
+        page = MagicMock()
+        page.__iter__.return_value = iter(hits)
+        page.count.return_value = total
+        s = MagicMock()
+        s.__getitem__.return_value = page
+        s.count.return_value = total
+        return s, page
+
+    @patch('mozillians.phonebook.utils.statsd')
+    def test_one_request(self, statsd_mock):
+        s, page = self.search(['a', 'b'], 12)
+        paginator = SearchPaginator(s, 2)
+        people = paginator.page(3)
+        eq_(list(people), ['a', 'b'])
+        eq_(paginator.count, 12)
+        eq_(paginator.num_pages, 6)
+        eq_(paginator.search, page)
+        s.__getitem__.assert_called_once_with(slice(4, 6))
+        ok_(not s.count.called)
+        ok_(statsd_mock.timing.called)
+
+    @patch('mozillians.phonebook.utils.statsd')
+    def test_no_hits(self, statsd_mock):
+        s, page = self.search([], 0)
+        paginator = SearchPaginator(s, 2)
+        eq_(list(paginator.page(1)), [])
+        eq_(paginator.count, 0)
+        ok_(not page.count.called)
+        ok_(not s.count.called)
+
+    @patch('mozillians.phonebook.utils.statsd')
+    def test_page_past_last(self, statsd_mock):
+        s, page = self.search([], 3)
+        paginator = SearchPaginator(s, 2)
+        with self.assertRaises(EmptyPage):
+            paginator.page(4)
+        eq_(paginator.count, 3)
+        ok_(s.count.called)
+
+    @override_settings(ES_MAX_RESULT_WINDOW=10)
+    @patch('mozillians.phonebook.utils.statsd')
+    def test_page_past_result_window(self, statsd_mock):
+        s, page = self.search(['a', 'b'], 100)
+        paginator = SearchPaginator(s, 2)
+        with self.assertRaises(EmptyPage):
+            paginator.page(1000000)
+        s.__getitem__.assert_called_once_with(slice(0, 2))
+        eq_(paginator.count, 100)
+        eq_(paginator.num_pages, 5)
+        eq_(paginator.page(5).number, 5)
@@ -195,3 +195,27 @@ class ListTests(TestCase):
         eq_(response.context['city_name'], None)
         eq_(response.context['region_name'], None)
         eq_(response.context['people'].paginator.count, 0)
+
+    def test_list_mozillians_in_location_normalized_name(self):
+        country = CountryFactory.create(name='United Kingdom')
+        user_listed = UserFactory.create(userprofile={'geo_country': country})
+        user = UserFactory.create()
+        with self.login(user) as client:
+            url = reverse('phonebook:list_country', kwargs={'country': 'united  KINGDOM'})
+            response = client.get(url, follow=True)
+        eq_(response.status_code, 200)
+        eq_(response.context['people'].paginator.count, 1)
+        eq_(response.context['people'].object_list[0], user_listed.userprofile)
+
+    def test_list_locations(self):
+        country = CountryFactory.create()
+        CountryFactory.create()
+        UserFactory.create(userprofile={'geo_country': country})
+        user = UserFactory.create()
+        with self.login(user) as client:
+            response = client.get(reverse('phonebook:list_locations'), follow=True)
+        eq_(response.status_code, 200)
+        self.assertTemplateUsed(response, 'phonebook/locations.html')
+        countries = list(response.context['countries'])
+        eq_([c.name for c in countries], sorted([country.name, 'Greece']))
+        eq_([c.vouched_member_count for c in countries if c == country], [1])
@@ -1,3 +1,4 @@
+import json
 import os.path
 from datetime import datetime
 
@@ -7,7 +8,7 @@ from django.core.urlresolvers import reverse
 from django.test.client import Client
 from django.test.utils import override_settings
 
-from mock import patch
+from mock import MagicMock, patch
 from nose.tools import eq_, ok_
 from waffle import Flag
 
@@ -36,6 +37,23 @@ class SearchTests(TestCase):
         eq_(response.get('content-type'),
             'application/opensearchdescription+xml')
 
+    @patch('mozillians.phonebook.views.UserProfile.search')
+    def test_search_facets(self, search_mock):
+        s = MagicMock()
+        s.facet.return_value = s
+        s.hydrate.return_value = s
+        s.__getitem__.return_value = s
+        s.facet_counts.return_value = {'language_codes': [{'term': 'fr', 'count': 2}]}
+        search_mock.return_value = s
+        client = Client()
+        response = client.get(reverse('phonebook:search_facets'), {'q': 'foo'}, follow=True)
+        eq_(response.status_code, 200)
+        eq_(response.get('content-type'), 'application/json')
+        data = json.loads(response.content)
+        eq_(data['languages'], [{'code': 'fr', 'name': 'French', 'count': 2}])
+        eq_(data['country'], [])
+        search_mock.assert_called_with('foo', public=True, include_non_vouched=False)
+
     def test_search_plugin_vouched(self):
         user = UserFactory.create()
         with self.login(user) as client:
@@ -1,6 +1,8 @@
 from django.contrib.auth.decorators import login_required
+from django.core.cache.backends.locmem import LocMemCache
 from django.core.urlresolvers import reverse
 from django.test import Client
+from django.test.client import RequestFactory
 from django.test.utils import override_settings
 
 from funfactory.helpers import urlparams
@@ -10,6 +12,10 @@ from nose.tools import ok_, eq_
 
 from mozillians.common.helpers import redirect
 from mozillians.common.tests import TestCase
+from mozillians.groups.tests import GroupFactory
+from mozillians.phonebook import views
+from mozillians.phonebook.middleware import ProfileCacheMiddleware
+from mozillians.phonebook.models import get_profile_cache_key, invalidate_profile_cache
 from mozillians.users.managers import PUBLIC, MOZILLIANS, EMPLOYEES, PRIVILEGED
 from mozillians.users.tests import UserFactory
 
@@ -225,3 +231,61 @@ class ViewProfileTests(TestCase):
         with self.login(user) as client:
             response = client.get(url, follow=True)
         ok_('vouch_form' in response.context)
+
+
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        cache = LocMemCache('profile-cache-tests', {})
+        cache_patches = [patch('mozillians.phonebook.views.cache', cache),
+                         patch('mozillians.phonebook.models.cache', cache)]
+        for cache_patch in cache_patches:
+            cache_patch.start()
+            self.addCleanup(cache_patch.stop)
+        self.lookup_user = UserFactory.create(userprofile={'privacy_full_name': PUBLIC})
+        self.url = reverse('phonebook:profile_view',
+                           kwargs={'username': self.lookup_user.username})
+
+    @patch('mozillians.phonebook.views._render_profile_details',
+           wraps=views._render_profile_details)
+    def test_cached_per_privacy_level(self, render_mock):
+        user = UserFactory.create()
+        Client().get(self.url, follow=True)
+        Client().get(self.url, follow=True)
+        eq_(render_mock.call_count, 1)
+        with self.login(user) as client:
+            client.get(self.url, follow=True)
+            client.get(self.url, follow=True)
+        eq_(render_mock.call_count, 2)
+
+    def test_invalidated_by_group_membership(self):
+        user = UserFactory.create()
+        group = GroupFactory.create(visible=True)
+        with self.login(user) as client:
+            response = client.get(self.url, follow=True)
+            ok_(group.name not in response.content)
+            group.add_member(self.lookup_user.userprofile)
+            response = client.get(self.url, follow=True)
+        ok_(group.name in response.content)
+
+    @patch('mozillians.phonebook.views._render_profile_details',
+           wraps=views._render_profile_details)
+    def test_own_profile_not_cached(self, render_mock):
+        with self.login(self.lookup_user) as client:
+            client.get(self.url, follow=True)
+            client.get(self.url, follow=True)
+        eq_(render_mock.call_count, 2)
+
+    def test_invalidated_again_after_request(self):
+        # Another request caches the page from data that isn't
+        # committed yet, before the request finishes.
+        profile_id = self.lookup_user.userprofile.id
+        key = get_profile_cache_key(profile_id, PUBLIC)
+        request = RequestFactory().get('/')
+        middleware = ProfileCacheMiddleware()
+        middleware.process_request(request)
+        invalidate_profile_cache([profile_id])
+        stale_key = get_profile_cache_key(profile_id, PUBLIC)
+        ok_(stale_key != key)
+        eq_(get_profile_cache_key(profile_id, PUBLIC), stale_key)
+        middleware.process_response(request, None)
+        ok_(get_profile_cache_key(profile_id, PUBLIC) != stale_key)
@@ -1,8 +1,93 @@
 import datetime
+import time
+
+from django.conf import settings
+from django.core.paginator import Page, PageNotAnInteger, Paginator
+
+from django_statsd.clients import statsd
 
 from mozillians.phonebook.models import Invite
 
 
+class CountedPaginator(Paginator):
+    """Paginator for object lists whose length is already known, so
+    that it isn't counted again.
+    """
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super(CountedPaginator, self).__init__(object_list, per_page, **kwargs)
+        self._count = count
+
+
+class SearchPaginator(Paginator):
+    """Paginator for profile searches.
+
+    The search for a page is run once and returns both the hits of
+    the page and the total number of hits, so the page isn't counted
+    separately. The search of the last page is kept as `search`, so
+    that its facets can be read from the same response.
+
+    Only pages within settings.ES_MAX_RESULT_WINDOW hits are searched,
+    pages past it are empty.
+    """
+
+    def __init__(self, object_list, per_page, **kwargs):
+        super(SearchPaginator, self).__init__(object_list, per_page, **kwargs)
+        self.search = None
+        self._pages = {}
+
+    def _execute(self, number):
+        """Run the search of page number and return its hits."""
+        if number not in self._pages:
+            bottom = (number - 1) * self.per_page
+            s = self.object_list[bottom:bottom + self.per_page]
+            start = time.time()
+            hits = list(s)
+            # The response holds the total number of hits, unless the
+            # page is empty. Only pages past the last one are counted
+            # separately.
+            if hits:
+                self._count = s.count()
+            elif number == 1:
+                self._count = 0
+            else:
+                self._count = self.object_list.count()
+            statsd.timing('phonebook.search.execute', int((time.time() - start) * 1000))
+            self.search = s
+            self._pages[number] = hits
+        return self._pages[number]
+
+    def _get_count(self):
+        if self._count is None:
+            self._execute(1)
+        return self._count
+    count = property(_get_count)
+
+    @property
+    def max_pages(self):
+        """Number of pages within the result window."""
+        return max(1, settings.ES_MAX_RESULT_WINDOW // self.per_page)
+
+    def _get_num_pages(self):
+        if self._num_pages is None:
+            num_pages = super(SearchPaginator, self)._get_num_pages()
+            self._num_pages = min(num_pages, self.max_pages)
+        return self._num_pages
+    num_pages = property(_get_num_pages)
+
+    def page(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        # Pages past the window are validated against the count of the
+        # first page instead of being searched.
+        if 0 < number <= self.max_pages:
+            self._execute(number)
+        number = self.validate_number(number)
+        return Page(self._execute(number), number, self)
+
+
 def redeem_invite(redeemer, code):
     if code:
         try:
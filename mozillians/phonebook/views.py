@@ -1,16 +1,21 @@
+import json
+
 from django.conf import settings
 from django.contrib.auth.views import logout as auth_logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.http import Http404
+from django.http import Http404, HttpResponse, HttpResponseBadRequest
 from django.shortcuts import get_object_or_404, render
 from django.utils import timezone
 from django.views.decorators.cache import cache_page, never_cache
 from django.views.decorators.http import require_POST
 
 from funfactory.urlresolvers import reverse
+from jingo import render_to_string
+from jinja2 import Markup
 from tower import ugettext as _
 from waffle.decorators import waffle_flag
 
@@ -18,12 +23,19 @@ import mozillians.phonebook.forms as forms
 from mozillians.common.decorators import allow_public, allow_unvouched
 from mozillians.common.helpers import redirect
 from mozillians.common.middleware import LOGIN_MESSAGE, GET_VOUCHED_MESSAGE
+from mozillians.geo.models import City, Country, Region, normalize_name
 from mozillians.groups.helpers import stringify_groups
 from mozillians.groups.models import Group
-from mozillians.phonebook.models import Invite
-from mozillians.phonebook.utils import redeem_invite
+from mozillians.phonebook.models import Invite, get_profile_cache_key
+from mozillians.phonebook.utils import CountedPaginator, SearchPaginator, redeem_invite
 from mozillians.users.managers import EMPLOYEES, MOZILLIANS, PUBLIC, PRIVILEGED
 from mozillians.users.models import UserProfile
+from mozillians.users.search import facets_to_json, get_facets, with_facets
+
+
+# Privacy levels of viewers whose profile pages are cached. The pages
+# of privileged viewers and of people viewing their own profile aren't.
+CACHED_PRIVACY_LEVELS = [PUBLIC, MOZILLIANS, EMPLOYEES]
 
 
 @allow_unvouched
@@ -82,7 +94,12 @@ def unvouch(request, username):
 @allow_public
 @never_cache
 def view_profile(request, username):
-    """View a profile by username."""
+    """View a profile by username.
+
+    The details section of other people's profiles is rendered once
+    per privacy level and cached.
+
+    """
     data = {}
     privacy_mappings = {'anonymous': PUBLIC, 'mozillian': MOZILLIANS, 'employee': EMPLOYEES,
                         'privileged': PRIVILEGED, 'myself': None}
@@ -96,12 +113,12 @@ def view_profile(request, username):
         profile = UserProfile.objects.privacy_level(privacy_level).get(user__username=username)
         data['privacy_mode'] = view_as
     else:
-        userprofile_query = UserProfile.objects.filter(user__username=username)
-        public_profile_exists = userprofile_query.public().exists()
-        profile_exists = userprofile_query.exists()
-        profile_complete = userprofile_query.exclude(full_name='').exists()
+        try:
+            profile = UserProfile.objects.select_related('user').get(user__username=username)
+        except UserProfile.DoesNotExist:
+            profile = None
 
-        if not public_profile_exists:
+        if not (profile and profile.is_public):
             if not request.user.is_authenticated():
                 # you have to be authenticated to continue
                 messages.warning(request, LOGIN_MESSAGE)
@@ -113,10 +130,9 @@ def view_profile(request, username):
                 messages.error(request, GET_VOUCHED_MESSAGE)
                 return redirect('phonebook:home')
 
-        if not profile_exists or not profile_complete:
+        if not profile or not profile.full_name:
             raise Http404
 
-        profile = UserProfile.objects.get(user__username=username)
         profile.set_instance_privacy_level(PUBLIC)
         if request.user.is_authenticated():
             profile.set_instance_privacy_level(
@@ -139,17 +155,38 @@ def view_profile(request, username):
     data['profile_is_vouchable'] = profile_is_vouchable
     data['shown_user'] = profile.user
     data['profile'] = profile
-    data['groups'] = profile.get_annotated_groups()
 
     # Only show pending groups if user is looking at their own profile,
     # or current user is a superuser
-    if not (request.user.is_authenticated()
-            and (request.user.username == username or request.user.is_superuser)):
-        data['groups'] = [grp for grp in data['groups'] if not grp.pending]
+    show_pending = (request.user.is_authenticated()
+                    and (request.user.username == username or request.user.is_superuser))
+    show_links = request.user.is_authenticated() and request.user.userprofile.is_vouched
+
+    if not show_pending and profile._privacy_level in CACHED_PRIVACY_LEVELS:
+        key = get_profile_cache_key(profile.id, profile._privacy_level, show_links,
+                                    request.locale)
+        details = cache.get(key)
+        if details is None:
+            details = _render_profile_details(request, profile, show_pending, show_links)
+            cache.set(key, details, getattr(settings, 'PROFILE_CACHE_TIMEOUT', 3600))
+    else:
+        details = _render_profile_details(request, profile, show_pending, show_links)
+    data['profile_details'] = Markup(details)
 
     return render(request, 'phonebook/profile.html', data)
 
 
+def _render_profile_details(request, profile, show_pending, show_links):
+    """Render the bio, groups, skills, languages, websites, accounts
+    and vouches of a profile.
+    """
+    groups = profile.get_annotated_groups()
+    if not show_pending:
+        groups = [group for group in groups if not group.pending]
+    return render_to_string(request, 'phonebook/includes/profile_details.html',
+                            {'profile': profile, 'groups': groups, 'show_links': show_links})
+
+
 @allow_unvouched
 @never_cache
 def edit_profile(request):
@@ -245,6 +282,17 @@ def delete(request):
     return logout(request)
 
 
+def _search_profiles(request, form):
+    """Return the profile search for a valid SearchForm and whether
+    it's public. The search counts facets and returns SearchResults.
+    """
+    public = not (request.user.is_authenticated()
+                  and request.user.userprofile.is_vouched)
+    profiles = UserProfile.search(form.cleaned_data.get('q', u''), public=public,
+                                  include_non_vouched=form.cleaned_data['include_non_vouched'])
+    return with_facets(profiles).hydrate(), public
+
+
 @allow_public
 def search(request):
     limit = None
@@ -253,22 +301,17 @@ def search(request):
     form = forms.SearchForm(request.GET)
     groups = None
     functional_areas = None
+    facets = None
 
     if form.is_valid():
         query = form.cleaned_data.get('q', u'')
         limit = form.cleaned_data['limit']
-        include_non_vouched = form.cleaned_data['include_non_vouched']
         page = request.GET.get('page', 1)
-        functional_areas = Group.get_functional_areas()
-        public = not (request.user.is_authenticated()
-                      and request.user.userprofile.is_vouched)
-
-        profiles = UserProfile.search(query, public=public,
-                                      include_non_vouched=include_non_vouched)
+        profiles, public = _search_profiles(request, form)
         if not public:
             groups = Group.search(query)
 
-        paginator = Paginator(profiles, limit)
+        paginator = SearchPaginator(profiles, limit)
 
         try:
             people = paginator.page(page)
@@ -277,30 +320,47 @@ def search(request):
         except EmptyPage:
             people = paginator.page(paginator.num_pages)
 
-        if profiles.count() == 1 and not groups:
+        if paginator.count == 1 and not groups:
             return redirect('phonebook:profile_view', people[0].user.username)
 
+        # Facets are counted by the search of the page.
+        facets = get_facets(paginator.search)
         show_pagination = paginator.count > settings.ITEMS_PER_PAGE
+        if not people.object_list and not groups:
+            functional_areas = Group.get_functional_areas()
 
     d = dict(people=people,
              search_form=form,
              limit=limit,
              show_pagination=show_pagination,
              groups=groups,
-             functional_areas=functional_areas)
+             functional_areas=functional_areas,
+             facets=facets)
 
     return render(request, 'phonebook/search.html', d)
 
 
+@allow_public
+def search_facets(request):
+    """Return the facets of a profile search as JSON."""
+    form = forms.SearchForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest()
+    profiles, public = _search_profiles(request, form)
+    data = facets_to_json(get_facets(profiles[:0]))
+    return HttpResponse(json.dumps(data), mimetype='application/json')
+
+
 @waffle_flag('betasearch')
 def betasearch(request):
     """This view is for researching new search and data filtering
     options. It will eventually replace the 'search' view.
 
-    Filtering using SearchFilter does not respect privacy levels
-    because it directly hits the db. This should be further
-    investigated before the feature is released to the
-    public. Meanwhile we limit searches only to vouched users.
+    SearchFilter filters are applied as Elasticsearch filters on the
+    search documents, so public searches only match the values
+    profiles made public. Documents in the non-public index hold all
+    values regardless of privacy. This should be further
+    investigated before the feature is released to the public.
 
     This view is behind the 'betasearch' waffle flag.
 
@@ -318,11 +378,12 @@ def betasearch(request):
         public = not (request.user.is_authenticated()
                       and request.user.userprofile.is_vouched)
 
-        profiles_matching_filter = list(filtr.qs.values_list('id', flat=True))
-        profiles = UserProfile.search(query, include_non_vouched=True, public=public)
-        profiles = profiles.filter(id__in=profiles_matching_filter)
-
-        paginator = Paginator(profiles, limit)
+        if filtr.form.is_valid():
+            profiles = UserProfile.search(query, include_non_vouched=True, public=public)
+            paginator = SearchPaginator(filtr.filter_search(profiles).hydrate(), limit)
+        else:
+            # Like SearchFilter.qs, invalid filters match nothing.
+            paginator = Paginator([], limit)
 
         try:
             people = paginator.page(page)
@@ -391,16 +452,36 @@ def delete_invite(request, invite_pk):
     return redirect('phonebook:invite')
 
 
+def list_locations(request):
+    """List the countries with vouched members."""
+    countries = (Country.objects.filter(vouched_member_count__gt=0)
+                 .exclude(mapbox_id='geo_error').order_by('name'))
+    return render(request, 'phonebook/locations.html', {'countries': countries})
+
+
 def list_mozillians_in_location(request, country, region=None, city=None):
-    queryset = UserProfile.objects.vouched().filter(geo_country__name__iexact=country)
+    # Names are matched against the indexed normalized names and the
+    # stored member counts of the matching locations count the people
+    # listed.
+    locations = countries = list(Country.objects.filter(normalized_name=normalize_name(country)))
+    queryset = UserProfile.objects.vouched().filter(geo_country__in=countries)
     show_pagination = False
 
-    if city:
-        queryset = queryset.filter(geo_city__name__iexact=city)
     if region:
-        queryset = queryset.filter(geo_region__name__iexact=region)
-
-    paginator = Paginator(queryset, settings.ITEMS_PER_PAGE)
+        locations = regions = list(Region.objects.filter(country__in=countries,
+                                                         normalized_name=normalize_name(region)))
+        queryset = queryset.filter(geo_region__in=regions)
+    if city:
+        cities = City.objects.filter(country__in=countries, normalized_name=normalize_name(city))
+        if region:
+            cities = cities.filter(region__in=regions)
+        locations = list(cities)
+        queryset = queryset.filter(geo_city__in=locations)
+
+    if not locations:
+        queryset = queryset.none()
+    count = sum(location.vouched_member_count for location in locations)
+    paginator = CountedPaginator(queryset, settings.ITEMS_PER_PAGE, count)
     page = request.GET.get('page', 1)
 
     try:
@@ -93,6 +93,8 @@ def JINJA_CONFIG():
 
 
 MIDDLEWARE_CLASSES = get_middleware(append=[
+    'mozillians.phonebook.middleware.ProfileCacheMiddleware',
+
     'commonware.response.middleware.StrictTransportMiddleware',
     'csp.middleware.CSPMiddleware',
 
@@ -232,6 +234,16 @@ ES_HOSTS = ['127.0.0.1:9200']
 ES_INDEXES = {'default': 'mozillians',
               'public': 'mozillians-public'}
 ES_INDEXING_TIMEOUT = 10
+# ES_INDEXES are aliases, index_all_profiles cron builds new indexes
+# behind them. Maximum size of one bulk request while (re)indexing.
+ES_BULK_MAX_BYTES = 5 * 1024 * 1024
+# Number of profiles loaded per database query while reindexing.
+ES_REINDEX_BATCH_SIZE = 1000
+# Profile saves within this many seconds are indexed together.
+ES_INDEX_QUEUE_WINDOW = 10
+# Searches only page through this many hits, so that a large page
+# number can't make Elasticsearch collect and skip all the hits before.
+ES_MAX_RESULT_WINDOW = 10000
 
 # Sorl settings
 THUMBNAIL_DUMMY = True
@@ -301,6 +313,31 @@ HUMANSTXT_URL = urljoin(STATIC_URL, 'humans.txt')
 MAPBOX_MAP_ID = 'examples.map-i86nkdio'
 # This is the token for the edit profile page alone.
 MAPBOX_PROFILE_ID = MAPBOX_MAP_ID
+MAPBOX_API_URL = 'http://api.tiles.mapbox.com/v3'
+
+# Reverse geocode locally from the cities in the database, and from
+# the country and region boundaries in GEO_BOUNDARIES_FILE (GeoJSON)
+# when set. Mapbox is only asked when this can't answer.
+GEO_LOCAL_LOOKUP = True
+GEO_BOUNDARIES_FILE = None
+# Locations further than this many km from any known city are left to
+# the boundaries or Mapbox.
+GEO_LOCAL_MAX_DISTANCE = 5
+# Seconds before the local index is rebuilt to pick up changes made by
+# other processes.
+GEO_LOCAL_INDEX_TIMEOUT = 3600
+GEO_MAPBOX_FALLBACK = True
+# Save profiles whose locations need Mapbox right away, marked
+# geocode_pending, and resolve them in the reverse_geocode_profile task.
+GEO_ASYNC_GEOCODING = False
+# Mapbox results are cached per geohash of this many characters
+# (6 is about 1.2km by 0.6km), for GEO_CACHE_TIMEOUT seconds.
+GEO_CACHE_PRECISION = 6
+GEO_CACHE_TIMEOUT = 60 * 60 * 24
+GEO_CACHE_MAX_ENTRIES = 10000
+# Seconds before the in-memory Country, Region and City tables are
+# reloaded to pick up changes made by other processes.
+GEO_REGISTRY_TIMEOUT = 3600
 
 
 def _browserid_request_args():
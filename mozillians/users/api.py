@@ -1,3 +1,4 @@
+from collections import defaultdict
 from urllib2 import unquote
 from urlparse import urljoin
 
@@ -17,16 +18,90 @@ from mozillians.api.authenticators import AppAuthentication
 from mozillians.api.paginator import Paginator
 from mozillians.api.resources import (ClientCacheResourceMixIn,
                                       GraphiteMixIn)
-from mozillians.users.models import UserProfile
+from mozillians.groups.models import GroupMembership
+from mozillians.users.models import ExternalAccount, Language, UserProfile, Vouch
+
+
+def prefetch_related_data(profiles):
+    """Load the related data UserResource shows for profiles.
+
+    Groups, skills, languages, accounts and vouches of all profiles
+    are loaded with one query each and stored in profile._api_data,
+    so dehydrating a page of profiles costs the same number of
+    queries regardless of the page size. Privacy controlled data is
+    left empty when the profile's privacy level does not allow it.
+
+    """
+    if not profiles:
+        return
+    ids = [profile.id for profile in profiles]
+    data = dict((id_, defaultdict(list)) for id_ in ids)
+
+    queries = [
+        ('groups', GroupMembership.objects.filter(userprofile__in=ids)
+         .order_by('group__name').values_list('userprofile', 'group__name')),
+        ('skills', UserProfile.skills.through.objects.filter(userprofile__in=ids)
+         .order_by('skill__name').values_list('userprofile', 'skill__name')),
+        ('languages', Language.objects.filter(userprofile__in=ids)
+         .values_list('userprofile', 'code')),
+    ]
+    for field, query in queries:
+        for id_, value in query:
+            data[id_][field].append(value)
+
+    for account in ExternalAccount.objects.filter(user__in=ids):
+        data[account.user_id]['accounts'].append(
+            {'identifier': account.identifier, 'type': account.type})
+
+    vouches = (Vouch.objects.filter(vouchee__in=ids).order_by('date')
+               .values_list('vouchee', 'voucher', 'date'))
+    for vouchee_id, voucher_id, date in vouches:
+        profile_data = data[vouchee_id]
+        profile_data.setdefault('date_vouched', date)
+        if voucher_id:
+            profile_data.setdefault('vouched_by', voucher_id)
+
+    # Like UserProfile.vouched_by, hide vouchers that share no field
+    # with the privacy level. Pages normally have a single level.
+    vouchers = defaultdict(set)
+    for profile in profiles:
+        if profile._privacy_level and data[profile.id].get('vouched_by'):
+            vouchers[profile._privacy_level].add(data[profile.id]['vouched_by'])
+    visible_vouchers = {}
+    for privacy_level, voucher_ids in vouchers.items():
+        query = Q()
+        for field in UserProfile.privacy_fields():
+            query |= Q(**{'privacy_%s__gte' % field: privacy_level})
+        visible_vouchers[privacy_level] = set(
+            UserProfile.objects.filter(query, id__in=voucher_ids).values_list('id', flat=True))
+
+    for profile in profiles:
+        profile_data = data[profile.id]
+        privacy_level = profile._privacy_level
+        if privacy_level:
+            for field in ['groups', 'skills', 'languages']:
+                if getattr(profile, 'privacy_%s' % field) < privacy_level:
+                    profile_data[field] = []
+            if profile_data.get('vouched_by') not in visible_vouchers.get(privacy_level, ()):
+                profile_data['vouched_by'] = None
+        profile._api_data = profile_data
+
+
+class UserPaginator(Paginator):
+    """Paginator that loads the related data of the page's profiles in bulk."""
+
+    def get_slice(self, limit, offset):
+        profiles = list(super(UserPaginator, self).get_slice(limit, offset))
+        prefetch_related_data(profiles)
+        return profiles
 
 
 class UserResource(ClientCacheResourceMixIn, GraphiteMixIn, ModelResource):
     """User Resource."""
     email = fields.CharField(attribute='user__email', null=True, readonly=True)
     username = fields.CharField(attribute='user__username', null=True, readonly=True)
-    vouched_by = fields.IntegerField(attribute='vouched_by__id',
-                                     null=True, readonly=True)
-    date_vouched = fields.DateTimeField(attribute='date_vouched', null=True, readonly=True)
+    vouched_by = fields.IntegerField(null=True, readonly=True)
+    date_vouched = fields.DateTimeField(null=True, readonly=True)
 
     groups = fields.CharField()
     skills = fields.CharField()
@@ -43,7 +118,7 @@ class UserResource(ClientCacheResourceMixIn, GraphiteMixIn, ModelResource):
         authentication = AppAuthentication()
         authorization = ReadOnlyAuthorization()
         serializer = Serializer(formats=['json', 'jsonp'])
-        paginator_class = Paginator
+        paginator_class = UserPaginator
         cache_control = {'max-age': 0}
         list_allowed_methods = ['get']
         detail_allowed_methods = ['get']
@@ -118,22 +193,41 @@ class UserResource(ClientCacheResourceMixIn, GraphiteMixIn, ModelResource):
         return bundle
 
     def dehydrate_accounts(self, bundle):
+        if hasattr(bundle.obj, '_api_data'):
+            return bundle.obj._api_data['accounts']
         accounts = [{'identifier': a.identifier, 'type': a.type}
                     for a in bundle.obj.externalaccount_set.all()]
         return accounts
 
     def dehydrate_groups(self, bundle):
+        if hasattr(bundle.obj, '_api_data'):
+            return bundle.obj._api_data['groups']
         groups = bundle.obj.groups.values_list('name', flat=True)
         return list(groups)
 
     def dehydrate_skills(self, bundle):
+        if hasattr(bundle.obj, '_api_data'):
+            return bundle.obj._api_data['skills']
         skills = bundle.obj.skills.values_list('name', flat=True)
         return list(skills)
 
     def dehydrate_languages(self, bundle):
+        if hasattr(bundle.obj, '_api_data'):
+            return bundle.obj._api_data['languages']
         languages = bundle.obj.languages.values_list('code', flat=True)
         return list(languages)
 
+    def dehydrate_vouched_by(self, bundle):
+        if hasattr(bundle.obj, '_api_data'):
+            return bundle.obj._api_data.get('vouched_by')
+        voucher = bundle.obj.vouched_by
+        return voucher.id if voucher else None
+
+    def dehydrate_date_vouched(self, bundle):
+        if hasattr(bundle.obj, '_api_data'):
+            return bundle.obj._api_data.get('date_vouched')
+        return bundle.obj.date_vouched
+
     def dehydrate_photo(self, bundle):
         if bundle.obj.photo:
             return urljoin(settings.SITE_URL, bundle.obj.photo.url)
@@ -166,4 +260,6 @@ class UserResource(ClientCacheResourceMixIn, GraphiteMixIn, ModelResource):
         if request.GET.get('restricted', False):
             mega_filter &= Q(allows_community_sites=True)
 
-        return UserProfile.objects.complete().filter(mega_filter).distinct().order_by('id')
+        return (UserProfile.objects.complete().filter(mega_filter)
+                .select_related('user', 'geo_country', 'geo_region', 'geo_city')
+                .distinct().order_by('id'))
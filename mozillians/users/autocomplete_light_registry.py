@@ -1,12 +1,52 @@
+from django.conf import settings
 from django.contrib.auth.models import User
 
 import autocomplete_light
+import pyes.exceptions
 
 from mozillians.users.models import UserProfile
 
 
+class TypeaheadAutocompleteMixin(object):
+    """Find choices with UserProfile.typeahead instead of icontains
+    queries on search_fields.
+
+    Profiles are looked up in the public index unless the request
+    comes from a vouched user or staff. Only the matching choices are
+    loaded from the database. The icontains queries are used when
+    Elasticsearch is disabled, fails or finds nothing, since only
+    complete profiles are indexed and new ones only after a while.
+    """
+    include_non_vouched = True
+    # Lookup of choices by profile id and field to order them by.
+    profile_lookup = 'pk__in'
+    name_field = 'full_name'
+
+    def choices_for_request(self):
+        query = self.request.GET.get('q', '').strip()
+        if not query or getattr(settings, 'ES_DISABLED', False):
+            return super(TypeaheadAutocompleteMixin, self).choices_for_request()
+
+        user = self.request.user
+        public = not (user.is_authenticated()
+                      and (user.is_staff or user.userprofile.is_vouched))
+        s = UserProfile.typeahead(query, include_non_vouched=self.include_non_vouched,
+                                  public=public)
+        try:
+            ids = [row[0] for row in s.values_list('id')[:self.limit_choices]]
+        except (pyes.exceptions.ElasticSearchException,
+                pyes.exceptions.NoServerAvailable):
+            ids = None
+        if not ids:
+            return super(TypeaheadAutocompleteMixin, self).choices_for_request()
+        return (self.choices.filter(**{self.profile_lookup: ids})
+                .order_by(self.name_field))
+
+
 class UserProfileAutocomplete(autocomplete_light.AutocompleteModelBase):
     """Any user profile"""
+    # Used by the admin, which has to find incomplete profiles too, so
+    # it queries the database.
     search_fields = ['full_name', 'user__email', 'user__username']
     choices = UserProfile.objects.all()
 
@@ -15,21 +55,27 @@ autocomplete_light.register(UserProfile, UserProfileAutocomplete,
                             name='UserProfiles')
 
 
-class VouchedUserProfileAutocomplete(autocomplete_light.AutocompleteModelBase):
+class VouchedUserProfileAutocomplete(TypeaheadAutocompleteMixin,
+                                     autocomplete_light.AutocompleteModelBase):
     """Only vouched user profiles"""
     search_fields = ['full_name', 'user__email', 'user__username']
     choices = UserProfile.objects.vouched()
+    include_non_vouched = False
 
 
 autocomplete_light.register(UserProfile, VouchedUserProfileAutocomplete,
                             name='VouchedUserProfiles')
 
 
-class VouchedUserAutocomplete(autocomplete_light.AutocompleteModelBase):
+class VouchedUserAutocomplete(TypeaheadAutocompleteMixin,
+                              autocomplete_light.AutocompleteModelBase):
     """Vouched users"""
     search_fields = ['userprofile__full_name', 'email']
     choices = (User.objects.exclude(userprofile__full_name='')
                .filter(userprofile__is_vouched=True))
+    include_non_vouched = False
+    profile_lookup = 'userprofile__in'
+    name_field = 'userprofile__full_name'
 
 autocomplete_light.register(User, VouchedUserAutocomplete,
                             name='VouchedUsers')
@@ -1,41 +1,126 @@
 from django.conf import settings
+from django.utils.timezone import now
 
 import cronjobs
 import pyes.exceptions
+from elasticutils.contrib.django import S, get_es
 
-from celery.task.sets import TaskSet
-from celeryutils import chunked
-from elasticutils.contrib.django import get_es
-
-from mozillians.users.tasks import index_objects
+from mozillians.users.indexing import (BulkIndexer, clear_checkpoint, create_versioned_index,
+                                       delete_stale_indexes, get_checkpoint, save_checkpoint,
+                                       stream_ids, swap_alias)
 from mozillians.users.models import PUBLIC, UserProfile
 
 
+REINDEX_STAGES = ['default', 'public']
+
+
+def _get_reindex_queryset(stage):
+    if stage == 'public':
+        return (UserProfile.objects.complete().public_indexable()
+                .privacy_level(PUBLIC))
+    return UserProfile.objects.complete()
+
+
+def _index_profiles(indexer, index, ids, stage):
+    doc_type = UserProfile.get_mapping_type()
+    privacy_level = PUBLIC if stage == 'public' else None
+    for id_, document in UserProfile.extract_documents(ids, privacy_level=privacy_level):
+        indexer.index(document, index, doc_type, id_)
+
+
+def _get_indexed_ids(index):
+    s = S(UserProfile).indexes(index).values_list('id')
+    return set(int(row[0]) for row in s[:s.count()])
+
+
+def _catch_up(es, indexer, checkpoint):
+    """Bring the new indexes up to date with the database.
+
+    Signal driven updates go to the indexes behind the aliases, which
+    are about to be replaced. Profiles changed since the checkpoint
+    started are reindexed and documents of profiles that were deleted
+    or stopped being indexable, e.g. ones that are not public anymore,
+    are removed. The checkpoint then starts over from when this run
+    began.
+
+    """
+    started = now()
+    doc_type = UserProfile.get_mapping_type()
+    changed = UserProfile.objects.filter(last_updated__gte=checkpoint['started'])
+    changed_ids = list(changed.values_list('id', flat=True))
+
+    for stage in REINDEX_STAGES:
+        index = checkpoint['indexes'][stage]
+        queryset = _get_reindex_queryset(stage)
+        for ids in stream_ids(queryset.filter(id__in=changed_ids)):
+            _index_profiles(indexer, index, ids, stage)
+        indexer.flush()
+
+        es.refresh(index)
+        existing_ids = set(id_ for ids in stream_ids(queryset) for id_ in ids)
+        for id_ in _get_indexed_ids(index) - existing_ids:
+            try:
+                es.delete(index, doc_type, id_)
+            except pyes.exceptions.ElasticSearchException as e:
+                if e.status != 404:
+                    raise
+
+    checkpoint['started'] = started
+    save_checkpoint(checkpoint)
+
+
 @cronjobs.register
 def index_all_profiles():
-    # Get an es object, delete index and re-create it
+    """Rebuild the search indexes.
+
+    Profiles are indexed into new versioned indexes while searches
+    keep using the current ones through the ES_INDEXES aliases. The
+    aliases switch to the new indexes only after all profiles are
+    indexed.
+
+    Progress is checkpointed after every batch, so running this again
+    after a crash resumes the interrupted rebuild. Starting over
+    deletes versioned indexes left behind by rebuilds that lost their
+    checkpoint.
+
+    """
     es = get_es(timeout=settings.ES_INDEXING_TIMEOUT)
     mappings = {'mappings':
                 {UserProfile._meta.db_table: UserProfile.get_mapping()}}
 
-    def _recreate_index(index):
-        try:
-            es.delete_index_if_exists(index)
-        except pyes.exceptions.IndexMissingException:
-            pass
-        es.create_index(index, settings=mappings)
-    _recreate_index(settings.ES_INDEXES['default'])
-    _recreate_index(settings.ES_INDEXES['public'])
-
-    # mozillians index
-    ids = UserProfile.objects.complete().values_list('id', flat=True)
-    ts = [index_objects.subtask(args=[UserProfile, chunk, False])
-          for chunk in chunked(sorted(list(ids)), 150)]
-
-    # public index
-    ids = (UserProfile.objects.complete().public_indexable()
-           .privacy_level(PUBLIC).values_list('id', flat=True))
-    ts += [index_objects.subtask(args=[UserProfile, chunk, True])
-           for chunk in chunked(sorted(list(ids)), 150)]
-
-    TaskSet(ts).apply_async()
+    checkpoint = get_checkpoint()
+    if checkpoint is None:
+        for stage in REINDEX_STAGES:
+            delete_stale_indexes(es, settings.ES_INDEXES[stage])
+        indexes = dict((stage, create_versioned_index(es, settings.ES_INDEXES[stage], mappings))
+                       for stage in REINDEX_STAGES)
+        checkpoint = {'started': now(),
+                      'indexes': indexes,
+                      'stage': REINDEX_STAGES[0],
+                      'last_id': 0}
+        save_checkpoint(checkpoint)
+
+    indexer = BulkIndexer(es)
+    stages = REINDEX_STAGES[REINDEX_STAGES.index(checkpoint['stage']):]
+    for stage in stages:
+        if stage != checkpoint['stage']:
+            checkpoint.update(stage=stage, last_id=0)
+            save_checkpoint(checkpoint)
+
+        index = checkpoint['indexes'][stage]
+        queryset = _get_reindex_queryset(stage)
+        for ids in stream_ids(queryset, last_id=checkpoint['last_id']):
+            _index_profiles(indexer, index, ids, stage)
+            indexer.flush()
+            checkpoint['last_id'] = ids[-1]
+            save_checkpoint(checkpoint)
+
+    _catch_up(es, indexer, checkpoint)
+    # The first catch up can take a while, catch up again with what
+    # changed during it right before the swap.
+    _catch_up(es, indexer, checkpoint)
+
+    for stage in REINDEX_STAGES:
+        es.refresh(checkpoint['indexes'][stage])
+        swap_alias(es, settings.ES_INDEXES[stage], checkpoint['indexes'][stage])
+    clear_checkpoint()
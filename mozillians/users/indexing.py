@@ -0,0 +1,157 @@
+import json
+import logging
+import re
+import sys
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.timezone import now
+
+import pyes.exceptions
+
+
+logger = logging.getLogger(__name__)
+
+BULK_MAX_BYTES = getattr(settings, 'ES_BULK_MAX_BYTES', 5 * 1024 * 1024)
+REINDEX_BATCH_SIZE = getattr(settings, 'ES_REINDEX_BATCH_SIZE', 1000)
+REINDEX_CHECKPOINT_KEY = 'users:reindex:checkpoint'
+# Keep checkpoints long enough to resume a rebuild after a long outage.
+REINDEX_CHECKPOINT_TIMEOUT = 60 * 60 * 24 * 7
+
+
+class BulkIndexer(object):
+    """Send documents to ElasticSearch in bulk requests capped by size.
+
+    pyes flushes its bulk buffer based on the number of queued
+    commands. Profile documents vary a lot in size, so we keep track
+    of the size of the queued payload instead and flush once it
+    reaches max_bytes.
+
+    """
+
+    def __init__(self, es, max_bytes=BULK_MAX_BYTES):
+        self.es = es
+        # Flushing is handled here, never let pyes flush on its own.
+        self.es.bulk_size = sys.maxint
+        self.max_bytes = max_bytes
+        self.queued = 0
+        self.queued_bytes = 0
+        self.indexed = 0
+        self.failed = []
+
+    def index(self, document, index, doc_type, id_):
+        self.es.index(document, index=index, doc_type=doc_type, id=id_, bulk=True)
+        self.queued += 1
+        self.queued_bytes += len(json.dumps(document, default=unicode))
+        if self.queued_bytes >= self.max_bytes:
+            self.flush()
+
+    def flush(self):
+        """Send queued documents, if any, in one bulk request."""
+        if not self.queued:
+            return
+        result = self.es.flush_bulk(forced=True) or {}
+        self.indexed += self.queued
+        self.queued = self.queued_bytes = 0
+
+        for item in result.get('items', []):
+            action = item.values()[0]
+            if 'error' in action:
+                self.indexed -= 1
+                self.failed.append((action.get('_id'), action['error']))
+                logger.error('Failed to index document %s: %s'
+                             % (action.get('_id'), action['error']))
+
+
+def stream_ids(queryset, last_id=0, batch_size=REINDEX_BATCH_SIZE):
+    """Yield lists of ids of the objects in queryset in ascending order.
+
+    Ids are loaded in batches of batch_size starting after last_id, so
+    memory use stays flat regardless of the number of objects and
+    iteration can resume from any id.
+
+    """
+    queryset = queryset.order_by('id').values_list('id', flat=True)
+    while True:
+        batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+
+def create_versioned_index(es, alias, mappings):
+    """Create a new, empty index to be put behind alias later."""
+    index = '%s-%s' % (alias, now().strftime('%Y%m%d%H%M%S'))
+    es.create_index(index, settings=mappings)
+    return index
+
+
+def get_aliased_indexes(es, alias):
+    """Return the names of the indexes behind alias."""
+    try:
+        return es.get_alias(alias)
+    except pyes.exceptions.IndexMissingException:
+        return []
+
+
+def delete_stale_indexes(es, alias):
+    """Delete versioned indexes of alias that the alias doesn't point to.
+
+    Rebuilds that never finished, e.g. because their checkpoint got
+    evicted from the cache, leave them behind.
+
+    """
+    pattern = re.compile(r'^%s-\d{14}$' % re.escape(alias))
+    aliased_indexes = get_aliased_indexes(es, alias)
+    for index in es.get_indices(include_aliases=False):
+        if pattern.match(index) and index not in aliased_indexes:
+            logger.info('Deleting stale index %s.' % index)
+            es.delete_index(index)
+
+
+def swap_alias(es, alias, index):
+    """Point alias to index in one step and drop the indexes it used to point to.
+
+    The first swap after upgrading from an index named like the alias
+    is a one-off migration that isn't atomic: the old index has to be
+    deleted before the alias can take its name, so searches fail until
+    the alias is added. If adding it fails, the new index is kept and
+    the error is raised, and the next index_all_profiles run resumes
+    from its checkpoint and adds the alias.
+
+    """
+    old_indexes = [name for name in get_aliased_indexes(es, alias) if name != index]
+
+    migrating = alias in old_indexes
+    if migrating:
+        # Indexes created before versioned indexes existed use the
+        # name of the alias. They have to go before the alias can
+        # take their name.
+        es.delete_index(alias)
+        old_indexes.remove(alias)
+
+    commands = [('add', index, alias)]
+    commands += [('remove', old_index, alias) for old_index in old_indexes]
+    try:
+        es.change_aliases(commands)
+    except Exception:
+        if migrating:
+            logger.error('Deleted index %s but failed to point it to %s. Searches '
+                         'fail until index_all_profiles runs again.' % (alias, index))
+        raise
+
+    for old_index in old_indexes:
+        es.delete_index(old_index)
+
+
+def get_checkpoint():
+    return cache.get(REINDEX_CHECKPOINT_KEY)
+
+
+def save_checkpoint(checkpoint):
+    cache.set(REINDEX_CHECKPOINT_KEY, checkpoint, REINDEX_CHECKPOINT_TIMEOUT)
+
+
+def clear_checkpoint():
+    cache.delete(REINDEX_CHECKPOINT_KEY)
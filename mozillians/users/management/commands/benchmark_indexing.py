@@ -0,0 +1,54 @@
+"""
+Compare the cost of building search index documents one profile at a
+time with extract_document and in batches with extract_documents.
+"""
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+
+from mozillians.users.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Counts queries needed to build search index documents'
+
+    option_list = list(BaseCommand.option_list) + [
+        make_option('--count',
+                    dest='count',
+                    type='int',
+                    default=1000,
+                    help='Number of profiles to build documents for.'),
+    ]
+
+    def measure(self, func):
+        """Return number of queries and seconds it takes to run func."""
+        use_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        reset_queries()
+        start = time.time()
+        try:
+            func()
+            return len(connection.queries), time.time() - start
+        finally:
+            connection.use_debug_cursor = use_debug_cursor
+            reset_queries()
+
+    def handle(self, *args, **options):
+        ids = list(UserProfile.objects.complete().order_by('id')
+                   .values_list('id', flat=True)[:options['count']])
+        if not ids:
+            raise CommandError('There are no complete profiles to index.')
+
+        results = [
+            ('extract_document', self.measure(
+                lambda: [UserProfile.extract_document(id_) for id_ in ids])),
+            ('extract_documents', self.measure(
+                lambda: list(UserProfile.extract_documents(ids)))),
+        ]
+
+        self.stdout.write('Built documents for %d profiles.\n' % len(ids))
+        for name, (queries, seconds) in results:
+            self.stdout.write('%s: %d queries (%.1f per 1,000 profiles) in %.2fs\n'
+                              % (name, queries, queries * 1000.0 / len(ids), seconds))
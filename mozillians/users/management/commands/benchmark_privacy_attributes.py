@@ -0,0 +1,78 @@
+"""
+Compare the cost of reading attributes of a privacy aware UserProfile
+with the current __getattribute__ and with the implementation it
+replaced, which looked up privacy fields on every access.
+"""
+import timeit
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mozillians.users.managers import PUBLIC
+from mozillians.users.models import UserProfile
+
+
+ATTRIBUTES = ['id', 'is_vouched', 'full_name', 'ircname', 'bio', 'tshirt']
+
+
+def _previous_getattribute(self, attrname):
+    """UserProfile.__getattribute__ before privacy tables were precomputed."""
+    _getattr = (lambda x: object.__getattribute__(self, x))
+    privacy_fields = UserProfile.privacy_fields()
+    privacy_level = _getattr('_privacy_level')
+    special_functions = {'vouches_made': '_vouches_made',
+                         'vouches_received': '_vouches_received'}
+
+    if attrname in special_functions and privacy_level:
+        return _getattr(special_functions[attrname])
+
+    if not privacy_level:
+        return _getattr(attrname)
+
+    if attrname not in privacy_fields:
+        return _getattr(attrname)
+
+    field_privacy = _getattr('privacy_%s' % attrname)
+    if field_privacy < privacy_level:
+        return privacy_fields.get(attrname)
+
+    return _getattr(attrname)
+
+
+class Command(BaseCommand):
+    help = 'Measures attribute access on privacy aware profiles'
+
+    option_list = list(BaseCommand.option_list) + [
+        make_option('--number',
+                    dest='number',
+                    type='int',
+                    default=100000,
+                    help='Number of times to read each attribute.'),
+    ]
+
+    def handle(self, *args, **options):
+        try:
+            profile = UserProfile.objects.complete()[0]
+        except IndexError:
+            raise CommandError('There are no complete profiles.')
+        profile.set_instance_privacy_level(PUBLIC)
+        number = options['number']
+
+        def current():
+            for attrname in ATTRIBUTES:
+                getattr(profile, attrname)
+
+        def previous():
+            for attrname in ATTRIBUTES:
+                _previous_getattribute(profile, attrname)
+
+        def plain():
+            for attrname in ATTRIBUTES:
+                object.__getattribute__(profile, attrname)
+
+        self.stdout.write('Read %s %d times each.\n' % (', '.join(ATTRIBUTES), number))
+        for name, func in [('previous', previous), ('current', current),
+                           ('object.__getattribute__', plain)]:
+            seconds = min(timeit.repeat(func, number=number, repeat=3))
+            self.stdout.write('%s: %.3fs (%.2f usec per access)\n'
+                              % (name, seconds, seconds * 1e6 / (number * len(ATTRIBUTES))))
@@ -0,0 +1,78 @@
+"""
+Compare the latency of autocompleting user profiles with icontains
+queries on the database and with UserProfile.typeahead, for prefixes of
+the names of existing vouched profiles.
+"""
+import random
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from mozillians.users.models import UserProfile
+
+
+SEARCH_FIELDS = ['full_name', 'user__email', 'user__username']
+
+
+def percentile(timings, percent):
+    """Return the value below which percent of sorted timings fall."""
+    return timings[min(len(timings) - 1, int(len(timings) * percent / 100.0))]
+
+
+class Command(BaseCommand):
+    help = 'Measures user autocompletion latency with the database and Elasticsearch'
+
+    option_list = list(BaseCommand.option_list) + [
+        make_option('--number',
+                    dest='number',
+                    type='int',
+                    default=500,
+                    help='Number of prefixes to autocomplete.'),
+        make_option('--limit',
+                    dest='limit',
+                    type='int',
+                    default=20,
+                    help='Number of choices returned per prefix.'),
+    ]
+
+    def measure(self, func, prefixes):
+        """Return 50th and 99th percentile seconds func takes per prefix."""
+        timings = []
+        for prefix in prefixes:
+            start = time.time()
+            func(prefix)
+            timings.append(time.time() - start)
+        timings.sort()
+        return percentile(timings, 50), percentile(timings, 99)
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.vouched().exclude(full_name='')
+        count = profiles.count()
+        if not count:
+            raise CommandError('There are no vouched profiles to autocomplete.')
+        names = list(profiles.order_by('?').values_list('full_name', flat=True)[:100])
+        # What people type: the first few letters of a name.
+        prefixes = [name[:random.randint(2, 5)] for name in
+                    (random.choice(names) for i in range(options['number']))]
+        limit = options['limit']
+
+        def database(prefix):
+            conditions = Q()
+            for field in SEARCH_FIELDS:
+                conditions |= Q(**{'%s__icontains' % field: prefix})
+            list(profiles.filter(conditions)[:limit])
+
+        def typeahead(prefix):
+            s = UserProfile.typeahead(prefix)
+            ids = [row[0] for row in s.values_list('id')[:limit]]
+            list(profiles.filter(pk__in=ids).order_by('full_name'))
+
+        results = [('icontains', self.measure(database, prefixes)),
+                   ('typeahead', self.measure(typeahead, prefixes))]
+
+        self.stdout.write('Autocompleted %d prefixes among %d vouched profiles.\n'
+                          % (len(prefixes), count))
+        for name, (p50, p99) in results:
+            self.stdout.write('%s: p50 %.1f ms, p99 %.1f ms\n' % (name, p50 * 1e3, p99 * 1e3))
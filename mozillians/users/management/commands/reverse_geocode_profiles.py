@@ -0,0 +1,175 @@
+"""
+Reverse geocode the locations of many profiles.
+
+Profiles are loaded in batches and each distinct location is resolved
+once, by a pool of threads sharing a limit on Mapbox calls per second.
+Geo fields are written back with one update per distinct result, so
+no save signals are sent. With --all, regions and cities are only
+written to profiles that have them already, since the others might have
+opted out of sharing them. Changed profiles are reindexed in bulk and
+the member counts of their old and new locations are updated once per
+batch.
+"""
+import threading
+import time
+from collections import defaultdict
+from multiprocessing.pool import ThreadPool
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from mozillians.geo.index import get_index
+from mozillians.geo.lookup import GeoLookupException, reverse_geocode
+from mozillians.geo.models import update_location_member_counts
+from mozillians.users.models import UserProfile
+from mozillians.users.tasks import _update_search_index
+
+
+GEO_FIELDS = ['geo_country', 'geo_region', 'geo_city']
+
+
+class RateLimiter(object):
+    """Space calls to wait() at least 1 / rate seconds apart, across
+    threads. A rate of 0 means no limit.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_call = 0
+
+    def wait(self):
+        with self.lock:
+            now = time.time()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Command(BaseCommand):
+    help = 'Reverse geocodes the locations of profiles in bulk'
+
+    option_list = list(BaseCommand.option_list) + [
+        make_option('--all',
+                    dest='all',
+                    action='store_true',
+                    default=False,
+                    help='Resolve all locations, not only the ones without a country '
+                         'or with the error placeholder.'),
+        make_option('--threads',
+                    dest='threads',
+                    type='int',
+                    default=4,
+                    help='Number of locations resolved concurrently.'),
+        make_option('--rate',
+                    dest='rate',
+                    type='float',
+                    default=5,
+                    help='Maximum number of Mapbox calls per second, 0 for no limit.'),
+        make_option('--batch-size',
+                    dest='batch_size',
+                    type='int',
+                    default=1000,
+                    help='Number of profiles loaded per query.'),
+    ]
+
+    def resolve(self, location):
+        """Return location and the ids of its country, region and
+        city, or None if it can't be resolved right now.
+        """
+        lat, lng = location
+        try:
+            # Only calls that might reach Mapbox are rate limited.
+            if not get_index().lookup(lat, lng):
+                self.rate_limiter.wait()
+            try:
+                result = reverse_geocode(lat, lng)
+            except GeoLookupException:
+                return location, None
+            return location, tuple(obj.id if obj else None for obj in result)
+        finally:
+            if self.threaded:
+                # Every worker thread opens its own connection.
+                connection.close()
+
+    def respect_opt_outs(self, ids, old_ids):
+        """Return the resolved country, region and city ids of a
+        profile, without the region or city it has none of.
+
+        Profiles can opt out of sharing their region and city, which
+        then aren't stored. When all profiles are resolved again, empty
+        ones are kept empty, so that profiles don't get back locations
+        they chose not to share.
+        """
+        country_id, region_id, city_id = ids
+        old_country_id, old_region_id, old_city_id = old_ids
+        return (country_id,
+                region_id if old_region_id else None,
+                city_id if old_city_id else None)
+
+    def handle(self, *args, **options):
+        self.rate_limiter = RateLimiter(options['rate'])
+        threads = options['threads']
+        self.threaded = threads > 1
+        pool = ThreadPool(threads) if self.threaded else None
+        imap = pool.imap_unordered if pool else map
+
+        profiles = UserProfile.objects.filter(lat__isnull=False, lng__isnull=False)
+        if not options['all']:
+            profiles = profiles.filter(Q(geo_country__isnull=True)
+                                       | Q(geo_country__mapbox_id='geo_error'))
+        profiles = profiles.order_by('id').values_list('id', 'lat', 'lng', *GEO_FIELDS)
+
+        # Locations resolved in previous batches.
+        resolved = {}
+        stats = defaultdict(int)
+        start = time.time()
+        last_id = 0
+        try:
+            while True:
+                batch = list(profiles.filter(id__gt=last_id)[:options['batch_size']])
+                if not batch:
+                    break
+                last_id = batch[-1][0]
+                stats['profiles'] += len(batch)
+
+                new_locations = set((row[1], row[2]) for row in batch
+                                    if (row[1], row[2]) not in resolved)
+                for location, ids in imap(self.resolve, new_locations):
+                    resolved[location] = ids
+                    stats['locations'] += 1
+                    if ids is None:
+                        stats['errors'] += 1
+
+                # Group changed profiles by their new geo ids.
+                updates = defaultdict(list)
+                old_locations = set()
+                for row in batch:
+                    ids = resolved[(row[1], row[2])]
+                    # Profiles without a country have no stored region
+                    # or city to go by.
+                    if ids is not None and options['all']:
+                        ids = self.respect_opt_outs(ids, row[3:])
+                    if ids is not None and ids != tuple(row[3:]):
+                        updates[ids].append(row[0])
+                        old_locations.add(tuple(row[3:]))
+                for ids, profile_ids in updates.items():
+                    (UserProfile.objects.filter(id__in=profile_ids)
+                     .update(geocode_pending=False, **dict(zip(GEO_FIELDS, ids))))
+                updated = [id_ for profile_ids in updates.values() for id_ in profile_ids]
+                if updated:
+                    _update_search_index(updated)
+                    update_location_member_counts(old_locations.union(updates))
+                stats['updated'] += len(updated)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        self.stdout.write('Resolved %(locations)d locations of %(profiles)d profiles, '
+                          'updated %(updated)d profiles, %(errors)d lookups failed'
+                          % stats)
+        self.stdout.write(' in %.1fs.\n' % (time.time() - start))
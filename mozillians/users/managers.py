@@ -1,5 +1,5 @@
 from django.db.models import Q, Manager, get_model
-from django.db.models.query import QuerySet, ValuesQuerySet
+from django.db.models.query import QuerySet, ValuesListQuerySet, ValuesQuerySet
 
 from tower import ugettext_lazy as _lazy
 
@@ -13,6 +13,45 @@ PRIVACY_CHOICES = ((MOZILLIANS, _lazy(u'Mozillians')),
 PUBLIC_INDEXABLE_FIELDS = ['full_name', 'ircname', 'email']
 
 
+def _privacy_masking_plan(model, names):
+    """Return a list of (privacy column, field column, default value)
+    tuples, one for every privacy controlled field that appears in
+    names.
+
+    Raise ValueError if a privacy controlled field appears without its
+    privacy field, since it couldn't be masked.
+
+    """
+    columns = dict((name, index) for index, name in enumerate(names))
+    plan = []
+    for field, default in model.privacy_fields().items():
+        if field in columns:
+            privacy_field = 'privacy_%s' % field
+            if privacy_field not in columns:
+                raise ValueError('%s has to be selected to select %s with a privacy level.'
+                                 % (privacy_field, field))
+            plan.append((columns[privacy_field], columns[field], default))
+    return plan
+
+
+def _mask_rows(rows, plan, privacy_level):
+    """Replace the values privacy_level is not allowed to see with
+    their defaults, as planned by _privacy_masking_plan.
+
+    Rows that need no masking are yielded unchanged, others are
+    copied to a list the first time a value is masked.
+
+    """
+    for row in rows:
+        masked = None
+        for levelindex, fieldindex, default in plan:
+            if row[levelindex] < privacy_level:
+                if masked is None:
+                    masked = list(row)
+                masked[fieldindex] = default
+        yield row if masked is None else masked
+
+
 class UserProfileValuesQuerySet(ValuesQuerySet):
     """Custom ValuesQuerySet to support privacy.
 
@@ -36,20 +75,61 @@ class UserProfileValuesQuerySet(ValuesQuerySet):
 
         names = extra_names + field_names + aggregate_names
 
-        model_privacy_fields = self.model.privacy_fields()
+        rows = self.query.get_compiler(self.db).results_iter()
+        privacy_level = getattr(self, '_privacy_level', None)
+        if privacy_level is not None:
+            plan = _privacy_masking_plan(self.model, names)
+            if plan:
+                rows = _mask_rows(rows, plan, privacy_level)
 
-        privacy_fields = [
-            (names.index('privacy_%s' % field), names.index(field), field)
-            for field in set(model_privacy_fields) & set(names)]
-
-        for row in self.query.get_compiler(self.db).results_iter():
-            row = list(row)
-            for levelindex, fieldindex, field in privacy_fields:
-                if row[levelindex] < self._privacy_level:
-                    row[fieldindex] = model_privacy_fields[field]
+        for row in rows:
             yield dict(zip(names, row))
 
 
+class UserProfileValuesListQuerySet(ValuesListQuerySet):
+    """Custom ValuesListQuerySet to support privacy.
+
+    Works like UserProfileValuesQuerySet, but returns tuples. The
+    related privacy field has to be in the query too when a privacy
+    level is set.
+
+    E.g. .values_list('first_name', 'privacy_first_name')
+
+    """
+
+    def _clone(self, *args, **kwargs):
+        c = super(UserProfileValuesListQuerySet, self)._clone(*args, **kwargs)
+        c._privacy_level = getattr(self, '_privacy_level', None)
+        return c
+
+    def iterator(self):
+        extra_names = self.query.extra_select.keys()
+        field_names = self.field_names
+        aggregate_names = self.query.aggregate_select.keys()
+
+        names = extra_names + field_names + aggregate_names
+
+        privacy_level = getattr(self, '_privacy_level', None)
+        if privacy_level is None:
+            return super(UserProfileValuesListQuerySet, self).iterator()
+        plan = _privacy_masking_plan(self.model, names)
+        if not plan:
+            return super(UserProfileValuesListQuerySet, self).iterator()
+
+        rows = _mask_rows(self.query.get_compiler(self.db).results_iter(),
+                          plan, privacy_level)
+        # Extra and aggregate columns come first in the results, put
+        # the columns back in the order they were asked for.
+        if self._fields:
+            fields = list(self._fields) + [f for f in aggregate_names if f not in self._fields]
+        else:
+            fields = names
+        if fields == names:
+            return (tuple(row) for row in rows)
+        columns = [names.index(field) for field in fields]
+        return (tuple([row[column] for column in columns]) for row in rows)
+
+
 class UserProfileQuerySet(QuerySet):
     """Custom QuerySet to support privacy."""
 
@@ -97,6 +177,8 @@ class UserProfileQuerySet(QuerySet):
         """Custom _clone with privacy level propagation."""
         if kwargs.get('klass', None) == ValuesQuerySet:
             kwargs['klass'] = UserProfileValuesQuerySet
+        elif kwargs.get('klass', None) == ValuesListQuerySet:
+            kwargs['klass'] = UserProfileValuesListQuerySet
         c = super(UserProfileQuerySet, self)._clone(*args, **kwargs)
         c._privacy_level = getattr(self, '_privacy_level', None)
         return c
@@ -1,13 +1,14 @@
 import logging
 import os
 import uuid
+from collections import defaultdict
 from datetime import datetime
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.mail import send_mail
 from django.db import models
-from django.db.models import signals as dbsignals, ManyToManyField
+from django.db.models import signals as dbsignals, ManyToManyField, Q
 from django.dispatch import receiver
 from django.utils.encoding import iri_to_uri
 from django.utils.http import urlquote
@@ -27,6 +28,7 @@ from funfactory import utils
 
 from mozillians.common.helpers import gravatar
 from mozillians.common.helpers import offset_of_timezone
+from mozillians.geo.models import update_location_member_counts
 from mozillians.groups.models import (Group, GroupAlias, GroupMembership,
                                       Skill, SkillAlias)
 from mozillians.phonebook.helpers import langcode_to_name
@@ -38,13 +40,20 @@ from mozillians.users.managers import (EMPLOYEES,
                                        MOZILLIANS, PRIVACY_CHOICES, PRIVILEGED,
                                        PUBLIC, PUBLIC_INDEXABLE_FIELDS,
                                        UserProfileManager)
-from mozillians.users.tasks import (index_objects, remove_from_basket_task,
+from mozillians.users.search import RESULT_FIELDS, SearchResult
+from mozillians.users.tasks import (queue_index_update, remove_from_basket_task,
                                     update_basket_task, unindex_objects)
 
 
 COUNTRIES = product_details.get_regions('en-US')
+LOCATION_FIELDS = ['geo_country', 'geo_region', 'geo_city']
 AVATAR_SIZE = (300, 300)
+# Attributes of UserProfile that are returned by a privacy aware
+# method instead, when a privacy level is set.
+PRIVACY_SPECIAL_FUNCTIONS = {'vouches_made': '_vouches_made',
+                             'vouches_received': '_vouches_received'}
 logger = logging.getLogger(__name__)
+_getattribute = object.__getattribute__
 
 
 def _calculate_photo_filename(instance, filename):
@@ -69,18 +78,31 @@ class PrivacyAwareS(S):
         self._privacy_level = level
         return self
 
+    def hydrate(self):
+        """Return SearchResults built from the search documents
+        instead of profiles loaded from the database.
+        """
+        new = self.values_dict()
+        new._hydrate = True
+        return new
+
     def _clone(self, *args, **kwargs):
         new = super(PrivacyAwareS, self)._clone(*args, **kwargs)
         new._privacy_level = getattr(self, '_privacy_level', None)
+        new._hydrate = getattr(self, '_hydrate', False)
         return new
 
     def __iter__(self):
         self._iterator = super(PrivacyAwareS, self).__iter__()
+        privacy_level = getattr(self, '_privacy_level', None)
 
         def _generator():
             while True:
                 obj = self._iterator.next()
-                obj._privacy_level = getattr(self, '_privacy_level', None)
+                if getattr(self, '_hydrate', False):
+                    obj = SearchResult(obj, privacy_level)
+                else:
+                    obj._privacy_level = privacy_level
                 yield obj
         return _generator()
 
@@ -107,6 +129,7 @@ class UserProfilePrivacyModel(models.Model):
     privacy_story_link = PrivacyField()
 
     CACHED_PRIVACY_FIELDS = None
+    CACHED_PRIVACY_TABLE = None
 
     class Meta:
         abstract = True
@@ -118,6 +141,7 @@ class UserProfilePrivacyModel(models.Model):
         (This is only used in testing.)
         """
         cls.CACHED_PRIVACY_FIELDS = None
+        cls.CACHED_PRIVACY_TABLE = None
 
     @classmethod
     def privacy_fields(cls):
@@ -150,6 +174,20 @@ class UserProfilePrivacyModel(models.Model):
             cls.CACHED_PRIVACY_FIELDS = privacy_fields
         return cls.CACHED_PRIVACY_FIELDS
 
+    @classmethod
+    def privacy_table(cls):
+        """
+        Return a dictionary whose keys are the names of the
+        privacy-controlled fields and whose values are tuples of the
+        name of the field holding their privacy level and their default
+        value. This is what __getattribute__ looks attributes up in.
+        """
+        if cls.CACHED_PRIVACY_TABLE is None:
+            cls.CACHED_PRIVACY_TABLE = dict(
+                (name, ('privacy_%s' % name, default))
+                for name, default in cls.privacy_fields().items())
+        return cls.CACHED_PRIVACY_TABLE
+
 
 class UserProfile(UserProfilePrivacyModel, SearchMixin):
     objects = UserProfileManager()
@@ -181,6 +219,8 @@ class UserProfile(UserProfilePrivacyModel, SearchMixin):
     geo_city = models.ForeignKey('geo.City', blank=True, null=True, on_delete=models.SET_NULL)
     lat = models.FloatField(_lazy(u'Latitude'), blank=True, null=True)
     lng = models.FloatField(_lazy(u'Longitude'), blank=True, null=True)
+    # Set while reverse_geocode_profile resolves lat and lng.
+    geocode_pending = models.BooleanField(default=False)
 
     allows_community_sites = models.BooleanField(
         default=True,
@@ -230,44 +270,41 @@ class UserProfile(UserProfilePrivacyModel, SearchMixin):
         Otherwise it returns a default privacy respecting value for
         the attribute, as defined in the privacy_fields dictionary.
 
-        special_functions provides methods that privacy safe their
-        respective properties, where the privacy modifications are
-        more complex.
-        """
-        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
-        privacy_fields = UserProfile.privacy_fields()
-        privacy_level = _getattr('_privacy_level')
-        special_functions = {'vouches_made': '_vouches_made',
-                             'vouches_received': '_vouches_received'}
-
-        if attrname in special_functions and privacy_level:
-            return _getattr(special_functions[attrname])
+        PRIVACY_SPECIAL_FUNCTIONS provides methods that privacy safe
+        their respective properties, where the privacy modifications
+        are more complex.
 
+        This runs on every attribute access, so everything it needs
+        is computed once per class and attributes that are not
+        privacy-controlled are returned without further work.
+        """
+        privacy_level = _getattribute(self, '_privacy_level')
         if not privacy_level:
-            return _getattr(attrname)
+            return _getattribute(self, attrname)
 
-        if attrname not in privacy_fields:
-            return _getattr(attrname)
+        privacy_table = UserProfile.CACHED_PRIVACY_TABLE or UserProfile.privacy_table()
+        if attrname in privacy_table:
+            privacy_attrname, default = privacy_table[attrname]
+            if _getattribute(self, privacy_attrname) < privacy_level:
+                return default
+        elif attrname in PRIVACY_SPECIAL_FUNCTIONS:
+            return _getattribute(self, PRIVACY_SPECIAL_FUNCTIONS[attrname])
 
-        field_privacy = _getattr('privacy_%s' % attrname)
-        if field_privacy < privacy_level:
-            return privacy_fields.get(attrname)
-
-        return _getattr(attrname)
+        return _getattribute(self, attrname)
 
     def _vouches(self, type):
-        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
-        privacy_level = _getattr('_privacy_level')
+        """Return vouches whose vouchee shares at least one field with
+        the current privacy level.
 
-        vouch_ids = []
-        for vouch in _getattr(type).all():
-            vouch.vouchee.set_instance_privacy_level(privacy_level)
-            for field in UserProfile.privacy_fields():
-                if getattr(vouch.vouchee, 'privacy_%s' % field, 0) >= privacy_level:
-                    vouch_ids.append(vouch.id)
-        vouches_made = _getattr(type).filter(pk__in=vouch_ids)
+        The privacy check is done by the database, so no vouchee
+        profiles are loaded here.
+        """
+        privacy_level = _getattribute(self, '_privacy_level')
 
-        return vouches_made
+        query = Q()
+        for field in UserProfile.privacy_fields():
+            query |= Q(**{'vouchee__privacy_%s__gte' % field: privacy_level})
+        return _getattribute(self, type).filter(query)
 
     @property
     def _vouches_made(self):
@@ -282,6 +319,65 @@ class UserProfile(UserProfilePrivacyModel, SearchMixin):
         """Method used by elasticutils."""
         if obj is None:
             obj = cls.objects.get(pk=obj_id)
+
+        related = {}
+        for attribute in ['groups', 'skills']:
+            groups = []
+            for g in getattr(obj, attribute).all():
+                groups.extend((g.id, name) for name in g.aliases.values_list('name', flat=True))
+            related[attribute] = groups
+        related['languages'] = obj.languages.values_list('code', flat=True)
+        return cls._build_document(obj, **related)
+
+    @classmethod
+    def extract_documents(cls, ids, privacy_level=None):
+        """Yield (id, document) tuples for the profiles with ids.
+
+        Documents are the same as the ones extract_document returns,
+        but related data for all the profiles is loaded with a fixed
+        number of queries.
+
+        """
+        profiles = list(cls.objects.privacy_level(privacy_level).filter(id__in=ids)
+                        .select_related('user', 'geo_country', 'geo_region', 'geo_city'))
+        ids = [profile.id for profile in profiles]
+        if not ids:
+            return
+
+        queries = {
+            'groups': (GroupMembership.objects.filter(userprofile__in=ids)
+                       .order_by('group__name')
+                       .values_list('userprofile', 'group', 'group__aliases__name')),
+            'skills': (cls.skills.through.objects.filter(userprofile__in=ids)
+                       .order_by('skill__name')
+                       .values_list('userprofile', 'skill', 'skill__aliases__name')),
+            'languages': (Language.objects.filter(userprofile__in=ids)
+                          .values_list('userprofile', 'code'))
+        }
+        related = dict((attribute, defaultdict(list)) for attribute in queries)
+        for attribute, query in queries.items():
+            for row in query:
+                if row[-1] is not None:
+                    # Groups and skills are (id, alias name) pairs.
+                    related[attribute][row[0]].append(row[1:] if len(row) > 2 else row[1])
+
+        for profile in profiles:
+            kwargs = {}
+            for attribute in queries:
+                # Respect privacy the same way the privacy aware
+                # attributes used by extract_document do.
+                if (profile._privacy_level and
+                        getattr(profile, 'privacy_%s' % attribute) < profile._privacy_level):
+                    kwargs[attribute] = []
+                else:
+                    kwargs[attribute] = related[attribute][profile.id]
+            yield profile.id, cls._build_document(profile, **kwargs)
+
+    @classmethod
+    def _build_document(cls, obj, groups, skills, languages):
+        """Return the search document of obj. groups and skills are
+        lists of (id, alias name) pairs, languages a list of codes.
+        """
         d = {}
 
         attrs = ('id', 'is_vouched', 'ircname',
@@ -293,6 +389,7 @@ class UserProfile(UserProfilePrivacyModel, SearchMixin):
             d.update({a: data})
 
         d['country'] = [obj.geo_country.name, obj.geo_country.code] if obj.geo_country else None
+        d['country_id'] = obj.geo_country.id if obj.geo_country else None
         d['region'] = obj.geo_region.name if obj.geo_region else None
         d['city'] = obj.geo_city.name if obj.geo_city else None
 
@@ -308,20 +405,34 @@ class UserProfile(UserProfilePrivacyModel, SearchMixin):
         d.update(dict(name=obj.full_name.lower()))
         d.update(dict(bio=obj.bio))
         d.update(dict(has_photo=bool(obj.photo)))
+        d['timezone'] = obj.timezone
+        d['groups'] = [name for id_, name in groups]
+        d['skills'] = [name for id_, name in skills]
+        # Ids of groups and skills, for filters.
+        d['group_ids'] = sorted(set(id_ for id_, name in groups))
+        d['skill_ids'] = sorted(set(id_ for id_, name in skills))
 
-        for attribute in ['groups', 'skills']:
-            groups = []
-            for g in getattr(obj, attribute).all():
-                groups.extend(g.aliases.values_list('name', flat=True))
-            d[attribute] = groups
         # Add to search index language code, language name in English
         # native lanugage name.
+        codes = list(languages)
         languages = []
-        for code in obj.languages.values_list('code', flat=True):
+        for code in codes:
             languages.append(code)
             languages.append(langcode_to_name(code, 'en_US').lower())
             languages.append(langcode_to_name(code, code).lower())
         d['languages'] = list(set(languages))
+        d['language_codes'] = sorted(codes)
+
+        # Not indexed, search results are built from these values.
+        d['result'] = {
+            'username': obj.user.username,
+            'full_name': obj.full_name,
+            'email': obj.email,
+            'ircname': obj.ircname,
+            'photo': obj.photo.name if obj.photo else u'',
+            'privacy': dict((field, getattr(obj, 'privacy_%s' % field))
+                            for field in RESULT_FIELDS),
+        }
         return d
 
     @classmethod
@@ -336,16 +447,22 @@ class UserProfile(UserProfilePrivacyModel, SearchMixin):
                 'ircname': {'type': 'string', 'index': 'not_analyzed'},
                 'username': {'type': 'string', 'index': 'not_analyzed'},
                 'country': {'type': 'string', 'analyzer': 'whitespace'},
+                'country_id': {'type': 'integer'},
                 'region': {'type': 'string', 'analyzer': 'whitespace'},
                 'city': {'type': 'string', 'analyzer': 'whitespace'},
                 'skills': {'type': 'string', 'analyzer': 'whitespace'},
                 'groups': {'type': 'string', 'analyzer': 'whitespace'},
+                'group_ids': {'type': 'integer'},
+                'skill_ids': {'type': 'integer'},
+                'timezone': {'type': 'string', 'index': 'not_analyzed'},
                 'languages': {'type': 'string', 'index': 'not_analyzed'},
+                'language_codes': {'type': 'string', 'index': 'not_analyzed'},
                 'bio': {'type': 'string', 'analyzer': 'snowball'},
                 'is_vouched': {'type': 'boolean'},
                 'allows_mozilla_sites': {'type': 'boolean'},
                 'allows_community_sites': {'type': 'boolean'},
                 'photo': {'type': 'boolean'},
+                'result': {'type': 'object', 'enabled': False},
                 'last_updated': {'type': 'date'},
                 'date_joined': {'type': 'date'}}}
 
@@ -380,6 +497,33 @@ class UserProfile(UserProfilePrivacyModel, SearchMixin):
 
         return s
 
+    @classmethod
+    def typeahead(cls, query, include_non_vouched=False, public=False):
+        """Search for UserProfiles to autocomplete query.
+
+        Profiles match when every word of query starts a word of their
+        name, or when a single word query starts their username or
+        email. Prefix queries run on the indexed terms, so no database
+        query is needed.
+        """
+        words = query.lower().split()
+        s = PrivacyAwareS(cls)
+        if public:
+            s = s.privacy_level(PUBLIC)
+        s = s.indexes(cls.get_index(public))
+
+        if len(words) == 1:
+            s = s.query(or_={'fullname__prefix': words[0], 'username__prefix': words[0],
+                             'email__prefix': words[0]})
+        else:
+            for word in words:
+                s = s.query(fullname__prefix=word)
+
+        if not include_non_vouched:
+            s = s.filter(is_vouched=True)
+
+        return s.order_by('name')
+
     @property
     def accounts(self):
         accounts_query = self.externalaccount_set.exclude(type=ExternalAccount.TYPE_WEBSITE)
@@ -729,16 +873,30 @@ class UserProfile(UserProfilePrivacyModel, SearchMixin):
 
         es.delete(cls.get_index(public_index), cls.get_mapping_type(), id)
 
-    def reverse_geocode(self):
+    def reverse_geocode(self, defer=False):
         """
         Use the user's lat and lng to set their city, region, and country.
         Does not save the profile.
+
+        With defer, locations that can't be resolved without calling
+        mapbox set geocode_pending instead, for reverse_geocode_profile
+        to resolve them after saving. The geo fields keep the previous
+        location until then.
         """
         if self.lat is None or self.lng is None:
             return
 
         from mozillians.geo.models import Country
-        from mozillians.geo.lookup import reverse_geocode, GeoLookupException
+        from mozillians.geo.lookup import (reverse_geocode, reverse_geocode_locally,
+                                           GeoLookupException)
+        if defer:
+            result = reverse_geocode_locally(self.lat, self.lng)
+            if result:
+                self.geo_country, self.geo_region, self.geo_city = result
+            self.geocode_pending = not result
+            return
+
+        self.geocode_pending = False
         try:
             result = reverse_geocode(self.lat, self.lng)
         except GeoLookupException:
@@ -780,11 +938,7 @@ def update_basket(sender, instance, **kwargs):
           dispatch_uid='update_search_index_sig')
 def update_search_index(sender, instance, **kwargs):
     if instance.is_complete:
-        index_objects.delay(sender, [instance.id], public_index=False)
-        if instance.is_public_indexable:
-            index_objects.delay(sender, [instance.id], public_index=True)
-        else:
-            unindex_objects.delay(UserProfile, [instance.id], public_index=True)
+        queue_index_update(instance.id)
 
 
 @receiver(dbsignals.pre_delete, sender=UserProfile,
@@ -807,6 +961,78 @@ def delete_user_obj_sig(sender, instance, **kwargs):
         instance.user.delete()
 
 
+@receiver(dbsignals.m2m_changed, sender=UserProfile.skills.through,
+          dispatch_uid='update_skill_member_counts_sig')
+def update_skill_member_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # Members of a skill changed.
+        if action in ['post_add', 'post_remove', 'post_clear']:
+            Skill.update_member_counts([instance.pk])
+    elif action == 'pre_clear':
+        # pk_set is not available on clear, remember the skills now.
+        instance._cleared_skill_ids = list(
+            sender.objects.filter(userprofile=instance).values_list('skill', flat=True))
+    elif action == 'post_clear':
+        Skill.update_member_counts(instance.__dict__.pop('_cleared_skill_ids', []))
+    elif action in ['post_add', 'post_remove'] and pk_set:
+        Skill.update_member_counts(list(pk_set))
+
+
+@receiver(dbsignals.pre_delete, sender=UserProfile,
+          dispatch_uid='remember_skills_before_delete_sig')
+def remember_skills_before_delete(sender, instance, **kwargs):
+    instance._deleted_skill_ids = list(
+        UserProfile.skills.through.objects.filter(userprofile=instance)
+        .values_list('skill', flat=True))
+
+
+@receiver(dbsignals.post_delete, sender=UserProfile,
+          dispatch_uid='update_skill_member_counts_delete_sig')
+def update_skill_member_counts_after_delete(sender, instance, **kwargs):
+    # Group member counts are updated as memberships get deleted.
+    Skill.update_member_counts(instance.__dict__.pop('_deleted_skill_ids', []))
+
+
+def _location_key(is_vouched, full_name, country_id, region_id, city_id):
+    """Return whether a profile counts as a vouched member and the
+    ids of its location.
+    """
+    return bool(is_vouched and full_name), country_id, region_id, city_id
+
+
+@receiver(dbsignals.pre_save, sender=UserProfile,
+          dispatch_uid='remember_location_before_save_sig')
+def remember_location_before_save(sender, instance, raw, **kwargs):
+    if raw or not instance.pk:
+        return
+    instance._saved_location_keys = [
+        _location_key(*row) for row in
+        UserProfile.objects.filter(pk=instance.pk)
+        .values_list('is_vouched', 'full_name', *LOCATION_FIELDS)]
+
+
+@receiver(dbsignals.post_save, sender=UserProfile,
+          dispatch_uid='update_location_member_counts_sig')
+def update_profile_location_member_counts(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    keys = instance.__dict__.pop('_saved_location_keys', [])
+    keys.append(_location_key(instance.is_vouched, instance.full_name, instance.geo_country_id,
+                              instance.geo_region_id, instance.geo_city_id))
+    # Only vouched members are counted, recount if the profile was
+    # counted before or after saving and something changed.
+    if len(set(keys)) > 1 or (len(keys) == 1 and keys[0][0]):
+        update_location_member_counts(key[1:] for key in keys if key[0])
+
+
+@receiver(dbsignals.post_delete, sender=UserProfile,
+          dispatch_uid='update_location_member_counts_delete_sig')
+def update_location_member_counts_after_delete(sender, instance, **kwargs):
+    if instance.is_vouched and instance.full_name:
+        update_location_member_counts([(instance.geo_country_id, instance.geo_region_id,
+                                        instance.geo_city_id)])
+
+
 class Vouch(models.Model):
     vouchee = models.ForeignKey(UserProfile, related_name='vouches_received')
     voucher = models.ForeignKey(UserProfile, related_name='vouches_made',
@@ -839,11 +1065,22 @@ def update_vouch_flags(sender, instance, **kwargs):
         # In this case we delete not only the vouches but the
         # UserProfile as well. Do nothing.
         return
+    was_vouched = list(UserProfile.objects.filter(pk=profile.pk)
+                       .values_list('is_vouched', flat=True))
     vouches = Vouch.objects.filter(vouchee=profile).count()
     profile.is_vouched = vouches > 0
     profile.can_vouch = vouches >= settings.CAN_VOUCH_THRESHOLD
     profile.save()
 
+    if was_vouched and was_vouched[0] != profile.is_vouched:
+        # Vouched member counts of the profile's groups and skills changed.
+        Group.update_member_counts(list(
+            GroupMembership.objects.filter(userprofile=profile)
+            .values_list('group', flat=True)))
+        Skill.update_member_counts(list(
+            UserProfile.skills.through.objects.filter(userprofile=profile)
+            .values_list('skill', flat=True)))
+
 
 class UsernameBlacklist(models.Model):
     value = models.CharField(max_length=30, unique=True)
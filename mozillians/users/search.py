@@ -0,0 +1,158 @@
+"""
+Results and facets of profile searches.
+
+Search hits are turned into SearchResult objects built from the
+search documents, so rendering them doesn't load profiles from the
+database.
+
+Elasticsearch counts the countries, groups, skills, languages and
+vouched status of the profiles matching a search in the same request
+that returns the hits, using the id and code fields of the search
+documents.
+"""
+from django.conf import settings
+
+from sorl.thumbnail import get_thumbnail
+
+from mozillians.common.helpers import gravatar
+from mozillians.geo.models import Country
+from mozillians.geo.registry import geo_registry
+from mozillians.groups.models import Group, Skill
+from mozillians.phonebook.helpers import langcode_to_name
+from mozillians.users.managers import PUBLIC
+
+
+# Fields of UserProfile copied to the 'result' field of search
+# documents, with their privacy levels.
+RESULT_FIELDS = ['full_name', 'email', 'ircname', 'photo']
+
+
+class SearchResultUser(object):
+    """The User of a SearchResult."""
+
+    def __init__(self, username, email):
+        self.username = username
+        self.email = email
+
+
+class SearchResult(object):
+    """A profile found by a search, built from its search document.
+
+    It has the attributes of UserProfile the search_result.html
+    partial uses. Like UserProfile, values whose privacy is below
+    privacy_level are replaced by defaults.
+    """
+
+    def __init__(self, document, privacy_level=None):
+        result = document.get('result')
+        if result is None:
+            # Documents indexed before the result field existed. Their
+            # values were already filtered by privacy when indexed.
+            result = {'username': document.get('username'),
+                      'full_name': document.get('fullname'),
+                      'email': document.get('email'),
+                      'ircname': document.get('ircname'),
+                      'privacy': dict((field, PUBLIC) for field in RESULT_FIELDS)}
+        self.id = self.pk = document['id']
+        self.is_vouched = document.get('is_vouched', False)
+        self.user = SearchResultUser(result.get('username'), document.get('email', u''))
+        self._privacy_level = privacy_level
+        self._values = result
+        self._privacy = result.get('privacy', {})
+
+    def _get(self, field):
+        if self._privacy_level and self._privacy.get(field, 0) < self._privacy_level:
+            return u''
+        return self._values.get(field) or u''
+
+    @property
+    def full_name(self):
+        return self._get('full_name')
+
+    display_name = full_name
+
+    @property
+    def email(self):
+        return self._get('email')
+
+    @property
+    def ircname(self):
+        return self._get('ircname')
+
+    @property
+    def photo(self):
+        return self._get('photo')
+
+    def get_photo_url(self, geometry='160x160', **kwargs):
+        """Return photo url, like UserProfile.get_photo_url."""
+        if not self.photo and self._privacy.get('photo', 0) >= self._privacy_level:
+            return gravatar(self.user.email, size=geometry)
+        kwargs.setdefault('crop', 'center')
+        return get_thumbnail(self.photo or settings.DEFAULT_AVATAR_PATH, geometry, **kwargs).url
+
+    def __repr__(self):
+        return '<SearchResult: %s>' % self.id
+
+
+# Facet names and the search document fields they count.
+FACETS = [('country', 'country_id'),
+          ('groups', 'group_ids'),
+          ('skills', 'skill_ids'),
+          ('languages', 'language_codes'),
+          ('vouched', 'is_vouched')]
+
+
+def with_facets(s):
+    """Return search s counting the FACETS of the profiles matching
+    its query and filters.
+    """
+    return s.facet(*[field for name, field in FACETS], filtered=True)
+
+
+def _is_true(term):
+    # Terms facets on boolean fields return 'T' and 'F'.
+    return term in (True, 1, 'T', 'true')
+
+
+def get_facets(s):
+    """Return the facets counted by s, a search returned by
+    with_facets, as a dictionary mapping facet names to lists of
+    (value, count) pairs, most common first.
+
+    Values are Country, Group and Skill objects, language codes and
+    booleans for the vouched status. Hidden groups are left out.
+    """
+    counts = s.facet_counts()
+    facets = dict((name, [(term['term'], term['count']) for term in counts.get(field, [])])
+                  for name, field in FACETS)
+
+    countries = []
+    for id_, count in facets['country']:
+        try:
+            countries.append((geo_registry.get_by_id(Country, int(id_)), count))
+        except Country.DoesNotExist:
+            pass
+    facets['country'] = countries
+
+    for name, queryset in [('groups', Group.objects.visible()), ('skills', Skill.objects)]:
+        objects = queryset.in_bulk([int(id_) for id_, count in facets[name]])
+        facets[name] = [(objects[int(id_)], count) for id_, count in facets[name]
+                        if int(id_) in objects]
+
+    facets['vouched'] = [(_is_true(term), count) for term, count in facets['vouched']]
+    return facets
+
+
+def facets_to_json(facets):
+    """Return facets returned by get_facets in a form json.dumps can
+    serialize.
+    """
+    data = {}
+    for name in ['country', 'groups', 'skills']:
+        data[name] = [{'id': obj.id, 'name': obj.name, 'count': count}
+                      for obj, count in facets[name]]
+    data['languages'] = [{'code': code, 'name': langcode_to_name(code), 'count': count}
+                         for code, count in facets['languages']]
+    data['vouched'] = [{'vouched': vouched, 'count': count}
+                       for vouched, count in facets['vouched']]
+    return data
@@ -3,6 +3,7 @@ import logging
 import os
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import send_mail
 from django.db.models import get_model
 
@@ -11,8 +12,10 @@ import requests
 import pyes
 from celery.task import task
 from celery.exceptions import MaxRetriesExceededError
+from django_statsd.clients import statsd
 from elasticutils.contrib.django import get_es
 
+from mozillians.users.indexing import BulkIndexer
 from mozillians.users.managers import PUBLIC
 
 
@@ -25,6 +28,19 @@ BASKET_NEWSLETTER = getattr(settings, 'BASKET_NEWSLETTER', False)
 BASKET_API_KEY = os.environ.get('BASKET_API_KEY', getattr(settings, 'BASKET_API_KEY', False))
 BASKET_ENABLED = all([BASKET_URL, BASKET_NEWSLETTER, BASKET_API_KEY])
 INCOMPLETE_ACC_MAX_DAYS = 7
+INDEX_QUEUE_WINDOW = getattr(settings, 'ES_INDEX_QUEUE_WINDOW', 10)
+INDEX_QUEUE_SEQ_KEY = 'users:index_queue:seq'
+INDEX_QUEUE_FLUSHED_KEY = 'users:index_queue:flushed'
+INDEX_QUEUE_SCHEDULED_KEY = 'users:index_queue:scheduled'
+INDEX_QUEUE_ITEM_KEY = 'users:index_queue:item:%d'
+INDEX_QUEUE_TIMEOUT = 60 * 60 * 24 * 30
+INDEX_QUEUE_ITEM_TIMEOUT = 60 * 60
+GEOCODE_TASK_RETRY_DELAY = 60
+GEOCODE_TASK_MAX_RETRIES = 5
+# Seconds to wait for, and times to check, the profile save that queued
+# reverse_geocode_profile to be committed.
+GEOCODE_TASK_PENDING_DELAY = 5
+GEOCODE_TASK_PENDING_RETRIES = 3
 
 
 def _email_basket_managers(action, email, error_message):
@@ -219,21 +235,30 @@ def remove_from_basket_task(email, basket_token):
 
 
 @task
-def index_objects(model, ids, public_index, **kwargs):
+def index_objects(model, ids, public_index, refresh=True, **kwargs):
+    """Index objects in a single bulk request.
+
+    The index is refreshed once after indexing, unless refresh is
+    False. Returns the ids of the objects that failed to index.
+
+    """
     if getattr(settings, 'ES_DISABLED', False):
         return
 
     es = get_es()
-    qs = model.objects.filter(id__in=ids)
-    if public_index:
-        qs = model.objects.privacy_level(PUBLIC).filter(id__in=ids)
+    privacy_level = PUBLIC if public_index else None
 
-    for item in qs:
-        model.index(model.extract_document(item.id, item),
-                    bulk=True, id_=item.id, es=es, public_index=public_index)
+    index = model.get_index(public_index)
+    doc_type = model.get_mapping_type()
+    indexer = BulkIndexer(es)
+    for id_, document in model.extract_documents(ids, privacy_level=privacy_level):
+        indexer.index(document, index, doc_type, id_)
+    indexer.flush()
 
-        es.flush_bulk(forced=True)
-        model.refresh_index(es=es)
+    if refresh and indexer.indexed:
+        model.refresh_index(es=es, public_index=public_index)
+
+    return [id_ for id_, error in indexer.failed]
 
 
 @task
@@ -256,6 +281,131 @@ def unindex_objects(model, ids, public_index, **kwargs):
                 raise e
 
 
+def _update_search_index(ids):
+    """Index complete profiles with ids and update the public index."""
+    from mozillians.users.models import UserProfile
+
+    profiles = UserProfile.objects.filter(id__in=ids).complete()
+    complete_ids = set(profiles.values_list('id', flat=True))
+    if not complete_ids:
+        return
+    public_ids = set(profiles.public_indexable().values_list('id', flat=True))
+
+    index_objects.delay(UserProfile, sorted(complete_ids), public_index=False)
+    if public_ids:
+        index_objects.delay(UserProfile, sorted(public_ids), public_index=True)
+    if complete_ids - public_ids:
+        unindex_objects.delay(UserProfile, sorted(complete_ids - public_ids),
+                              public_index=True)
+
+
+def queue_index_update(profile_id):
+    """Queue profile for indexing.
+
+    Profiles are saved several times while being edited or vouched
+    for. Instead of indexing on every save, profile ids are queued in
+    the cache and flush_index_queue indexes all the profiles queued
+    in the last INDEX_QUEUE_WINDOW seconds together, once each.
+
+    """
+    try:
+        seq = cache.incr(INDEX_QUEUE_SEQ_KEY)
+    except ValueError:
+        cache.add(INDEX_QUEUE_SEQ_KEY, 0, INDEX_QUEUE_TIMEOUT)
+        try:
+            seq = cache.incr(INDEX_QUEUE_SEQ_KEY)
+        except ValueError:
+            # Cache is not available, index right away.
+            _update_search_index([profile_id])
+            return
+
+    if seq == 1:
+        # New queue, nothing has been flushed from it yet.
+        cache.set(INDEX_QUEUE_FLUSHED_KEY, 0, INDEX_QUEUE_TIMEOUT)
+    cache.set(INDEX_QUEUE_ITEM_KEY % seq, profile_id, INDEX_QUEUE_ITEM_TIMEOUT)
+    statsd.incr('users.index_queue.queued')
+
+    if seq <= cache.get(INDEX_QUEUE_FLUSHED_KEY, 0):
+        # A flush started after we got our place in the queue and
+        # might have missed this profile.
+        _update_search_index([profile_id])
+    elif cache.add(INDEX_QUEUE_SCHEDULED_KEY, True, INDEX_QUEUE_WINDOW * 6):
+        # The key expires on its own in case the flush task gets lost.
+        flush_index_queue.apply_async(countdown=INDEX_QUEUE_WINDOW)
+
+
+@task(ignore_result=True)
+def flush_index_queue():
+    """Index the profiles queued with queue_index_update."""
+    # Profiles queued from now on need another flush.
+    cache.delete(INDEX_QUEUE_SCHEDULED_KEY)
+
+    last = cache.get(INDEX_QUEUE_FLUSHED_KEY, 0)
+    current = cache.get(INDEX_QUEUE_SEQ_KEY, 0)
+    if current <= last:
+        return
+    cache.set(INDEX_QUEUE_FLUSHED_KEY, current, INDEX_QUEUE_TIMEOUT)
+
+    keys = [INDEX_QUEUE_ITEM_KEY % seq for seq in range(last + 1, current + 1)]
+    queued = cache.get_many(keys)
+    cache.delete_many(keys)
+
+    ids = set(queued.values())
+    statsd.incr('users.index_queue.flushed', len(ids))
+    statsd.incr('users.index_queue.coalesced', len(queued) - len(ids))
+    _update_search_index(ids)
+
+
+@task(default_retry_delay=GEOCODE_TASK_RETRY_DELAY,
+      max_retries=GEOCODE_TASK_MAX_RETRIES)
+def reverse_geocode_profile(profile_id, lat, lng, save_region=True, save_city=True):
+    """Reverse geocode a profile saved with geocode_pending.
+
+    Geo fields are written with an update, unless the profile has
+    moved to another location since, so save signals aren't sent
+    again. The profile is queued for indexing and the member counts
+    of its new location are updated. If mapbox can't be
+    reached the task retries at most GEOCODE_TASK_MAX_RETRIES times
+    before setting the error placeholder country.
+
+    The task can run before the save that queued it is committed, so
+    it retries a few times while the profile isn't pending at lat and
+    lng yet.
+    """
+    from mozillians.geo.lookup import GeoLookupException, reverse_geocode
+    from mozillians.geo.models import Country, update_location_member_counts
+    from mozillians.users.models import UserProfile
+
+    profiles = UserProfile.objects.filter(id=profile_id, lat=lat, lng=lng, geocode_pending=True)
+    if not profiles.exists():
+        try:
+            reverse_geocode_profile.retry(countdown=GEOCODE_TASK_PENDING_DELAY,
+                                          max_retries=GEOCODE_TASK_PENDING_RETRIES)
+        except MaxRetriesExceededError:
+            # The profile has moved since, a newer task resolves it.
+            return
+
+    try:
+        country, region, city = reverse_geocode(lat, lng)
+    except GeoLookupException:
+        try:
+            reverse_geocode_profile.retry()
+        except MaxRetriesExceededError:
+            country, region, city = Country.objects.get(mapbox_id='geo_error'), None, None
+
+    # If the user doesn't want their region/city saved, respect it.
+    if not save_region:
+        region = None
+    if not save_city:
+        city = None
+
+    if profiles.update(geo_country=country, geo_region=region, geo_city=city,
+                       geocode_pending=False):
+        queue_index_update(profile_id)
+        update_location_member_counts([tuple(obj.id if obj else None
+                                             for obj in (country, region, city))])
+
+
 @task
 def remove_incomplete_accounts(days=INCOMPLETE_ACC_MAX_DAYS):
     """Remove incomplete accounts older than INCOMPLETE_ACC_MAX_DAYS old."""
@@ -2,6 +2,7 @@
 import json
 
 from django.core.urlresolvers import reverse
+from django.db import connection, reset_queries
 from django.test.client import Client
 from django.test.utils import override_settings
 
@@ -13,7 +14,7 @@ from mozillians.api.tests import APIAppFactory
 from mozillians.common.tests import TestCase
 from mozillians.geo.tests import CityFactory, CountryFactory, RegionFactory
 from mozillians.groups.tests import GroupFactory, SkillFactory
-from mozillians.users.models import ExternalAccount
+from mozillians.users.models import ExternalAccount, UserProfile
 from mozillians.users.tests import UserFactory
 
 
@@ -362,3 +363,52 @@ class UserResourceTests(TestCase):
         data = json.loads(response.content)
         eq_(response.status_code, 200)
         eq_(len(data['objects']), 1)
+
+    def test_list_num_queries(self):
+        for i in range(6):
+            user = UserFactory.create()
+            GroupFactory.create().add_member(user.userprofile)
+            user.userprofile.skills.add(SkillFactory.create())
+            user.userprofile.externalaccount_set.create(type=ExternalAccount.TYPE_SUMO,
+                                                        identifier='foo')
+        client = Client()
+
+        def count_queries(limit):
+            connection.use_debug_cursor = True
+            reset_queries()
+            try:
+                response = client.get(urlparams(self.mozilla_resource_url, limit=limit),
+                                      follow=True)
+                eq_(len(json.loads(response.content)['objects']), limit)
+                return len(connection.queries)
+            finally:
+                connection.use_debug_cursor = False
+                reset_queries()
+
+        eq_(count_queries(2), count_queries(8))
+
+    def test_list_matches_detail(self):
+        client = Client()
+        response = client.get(self.mozilla_resource_url, follow=True)
+        data = json.loads(response.content)['objects']
+        data = [obj for obj in data if obj['id'] == self.user.userprofile.id][0]
+        profile = self.user.userprofile
+        eq_(data['vouched_by'], profile.vouched_by.id)
+        eq_(data['groups'], list(profile.groups.values_list('name', flat=True)))
+        eq_(data['skills'], list(profile.skills.values_list('name', flat=True)))
+        eq_(data['accounts'],
+            [{'identifier': a.identifier, 'type': a.type}
+             for a in profile.externalaccount_set.all()])
+
+    def test_cursor_pagination(self):
+        UserFactory.create()
+        client = Client()
+        url = urlparams(self.mozilla_resource_url, limit=2, cursor='')
+        ids = []
+        while url:
+            response = client.get(url, follow=True)
+            eq_(response.status_code, 200)
+            data = json.loads(response.content)
+            ids.extend(obj['id'] for obj in data['objects'])
+            url = data['meta']['next']
+        eq_(ids, sorted(UserProfile.objects.complete().values_list('id', flat=True)))
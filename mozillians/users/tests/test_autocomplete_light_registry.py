@@ -0,0 +1,90 @@
+from django.contrib.auth.models import AnonymousUser
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+
+from mock import MagicMock, patch
+from nose.tools import eq_
+from pyes.exceptions import ElasticSearchException
+
+from mozillians.common.tests import TestCase
+from mozillians.users.autocomplete_light_registry import (UserProfileAutocomplete,
+                                                          VouchedUserAutocomplete,
+                                                          VouchedUserProfileAutocomplete)
+from mozillians.users.tests import UserFactory
+
+
+@override_settings(ES_DISABLED=False)
+class TypeaheadAutocompleteTests(TestCase):
+    def setUp(self):
+        self.user_1 = UserFactory.create(userprofile={'full_name': 'Foo Bar'})
+        self.user_2 = UserFactory.create(userprofile={'full_name': 'Foo Baz'})
+        self.unvouched = UserFactory.create(vouched=False, userprofile={'full_name': 'Foo'})
+
+    def request(self, user, q='foo'):
+        request = RequestFactory().get('/', {'q': q})
+        request.user = user
+        return request
+
+    def search(self, *users):
+        s = MagicMock()
+        s.values_list.return_value = [(user.userprofile.id,) for user in users]
+        return s
+
+    @patch('mozillians.users.autocomplete_light_registry.UserProfile.typeahead')
+    def test_user_profiles(self, typeahead_mock):
+        # The admin finds all profiles in the database.
+        autocomplete = UserProfileAutocomplete(request=self.request(self.user_1))
+        eq_(set(autocomplete.choices_for_request()),
+            set([self.unvouched.userprofile, self.user_1.userprofile,
+                 self.user_2.userprofile]))
+        eq_(typeahead_mock.called, False)
+
+    @patch('mozillians.users.autocomplete_light_registry.UserProfile.typeahead')
+    def test_vouched_user_profiles(self, typeahead_mock):
+        typeahead_mock.return_value = self.search(self.unvouched, self.user_1)
+        autocomplete = VouchedUserProfileAutocomplete(request=self.request(AnonymousUser()))
+        eq_(list(autocomplete.choices_for_request()), [self.user_1.userprofile])
+        typeahead_mock.assert_called_with('foo', include_non_vouched=False, public=True)
+
+    @patch('mozillians.users.autocomplete_light_registry.UserProfile.typeahead')
+    def test_vouched_users(self, typeahead_mock):
+        typeahead_mock.return_value = self.search(self.user_2, self.user_1)
+        autocomplete = VouchedUserAutocomplete(request=self.request(self.unvouched))
+        eq_(list(autocomplete.choices_for_request()), [self.user_1, self.user_2])
+        typeahead_mock.assert_called_with('foo', include_non_vouched=False, public=True)
+
+    @patch('mozillians.users.autocomplete_light_registry.UserProfile.typeahead')
+    def test_unvouched_staff(self, typeahead_mock):
+        staff = UserFactory.create(vouched=False, is_staff=True)
+        typeahead_mock.return_value = self.search(self.user_1)
+        autocomplete = VouchedUserAutocomplete(request=self.request(staff))
+        autocomplete.choices_for_request()
+        typeahead_mock.assert_called_with('foo', include_non_vouched=False, public=False)
+
+    @patch('mozillians.users.autocomplete_light_registry.UserProfile.typeahead')
+    def test_no_query(self, typeahead_mock):
+        autocomplete = VouchedUserProfileAutocomplete(request=self.request(self.user_1, q=''))
+        autocomplete.choices_for_request()
+        eq_(typeahead_mock.called, False)
+
+    @patch('mozillians.users.autocomplete_light_registry.UserProfile.typeahead')
+    def test_fallback_no_hits(self, typeahead_mock):
+        typeahead_mock.return_value = self.search()
+        autocomplete = VouchedUserProfileAutocomplete(request=self.request(self.user_1))
+        eq_(set(autocomplete.choices_for_request()),
+            set([self.user_1.userprofile, self.user_2.userprofile]))
+
+    @patch('mozillians.users.autocomplete_light_registry.UserProfile.typeahead')
+    def test_fallback_error(self, typeahead_mock):
+        typeahead_mock.return_value.values_list.side_effect = ElasticSearchException
+        autocomplete = VouchedUserProfileAutocomplete(request=self.request(self.user_1))
+        eq_(set(autocomplete.choices_for_request()),
+            set([self.user_1.userprofile, self.user_2.userprofile]))
+
+    @override_settings(ES_DISABLED=True)
+    @patch('mozillians.users.autocomplete_light_registry.UserProfile.typeahead')
+    def test_fallback_disabled(self, typeahead_mock):
+        autocomplete = VouchedUserProfileAutocomplete(request=self.request(self.user_1))
+        eq_(set(autocomplete.choices_for_request()),
+            set([self.user_1.userprofile, self.user_2.userprofile]))
+        eq_(typeahead_mock.called, False)
@@ -0,0 +1,88 @@
+from django.core.management import call_command
+
+from mock import patch
+from nose.tools import eq_, ok_
+
+from mozillians.common.tests import TestCase
+from mozillians.geo.lookup import GeoLookupException
+from mozillians.geo.models import Country
+from mozillians.geo.tests import CityFactory
+from mozillians.users.management.commands.reverse_geocode_profiles import RateLimiter
+from mozillians.users.models import UserProfile
+from mozillians.users.tests import UserFactory
+
+
+@patch('mozillians.users.management.commands.reverse_geocode_profiles._update_search_index')
+@patch('mozillians.users.management.commands.reverse_geocode_profiles.reverse_geocode')
+class ReverseGeocodeProfilesTests(TestCase):
+    def setUp(self):
+        self.city = CityFactory.create()
+        self.geo_error = Country.objects.create(name='Error', mapbox_id='geo_error')
+        self.profiles = []
+        for lat in [10.0, 10.0, 20.0]:
+            user = UserFactory.create(userprofile={'lat': lat, 'lng': 10.0,
+                                                   'geo_country': self.geo_error})
+            self.profiles.append(user.userprofile)
+        self.located = UserFactory.create(userprofile={'lat': 30.0, 'lng': 10.0,
+                                                       'geo_country': self.city.country})
+
+    def reverse_geocode(self, lat, lng):
+        if lat == 20.0:
+            raise GeoLookupException
+        return self.city.country, self.city.region, self.city
+
+    def test_backfill(self, reverse_geocode_mock, update_search_index_mock):
+        reverse_geocode_mock.side_effect = self.reverse_geocode
+        with patch('mozillians.users.models.queue_index_update') as queue_mock:
+            call_command('reverse_geocode_profiles', threads=1, rate=0, batch_size=2)
+        ok_(not queue_mock.called)
+
+        # Each location is resolved once, profiles already located are skipped.
+        eq_(sorted(c[0] for c in reverse_geocode_mock.call_args_list),
+            [(10.0, 10.0), (20.0, 10.0)])
+        profile_1, profile_2, profile_3 = [UserProfile.objects.get(pk=profile.pk)
+                                           for profile in self.profiles]
+        eq_(profile_1.geo_country, self.city.country)
+        eq_(profile_2.geo_country, self.city.country)
+        # Profiles repaired from the error placeholder get their region and city back.
+        eq_(profile_2.geo_region, self.city.region)
+        eq_(profile_2.geo_city, self.city)
+        eq_(profile_3.geo_country, self.geo_error)
+        update_search_index_mock.assert_called_once_with([profile_1.id, profile_2.id])
+
+    @patch('mozillians.users.management.commands.reverse_geocode_profiles.connection')
+    def test_threads_close_connections(self, connection_mock, reverse_geocode_mock,
+                                       update_search_index_mock):
+        reverse_geocode_mock.side_effect = self.reverse_geocode
+        call_command('reverse_geocode_profiles', threads=2, rate=0)
+        eq_(connection_mock.close.call_count, 2)
+
+    def test_all(self, reverse_geocode_mock, update_search_index_mock):
+        reverse_geocode_mock.side_effect = self.reverse_geocode
+        other_city = CityFactory.create()
+        with_city = UserFactory.create(userprofile={'lat': 40.0, 'lng': 10.0,
+                                                    'geo_country': other_city.country,
+                                                    'geo_region': other_city.region,
+                                                    'geo_city': other_city}).userprofile
+        call_command('reverse_geocode_profiles', threads=1, rate=0, all=True)
+        eq_(reverse_geocode_mock.call_count, 4)
+        # Opted out of sharing region and city.
+        located = UserProfile.objects.get(pk=self.located.userprofile.pk)
+        eq_(located.geo_country, self.city.country)
+        eq_(located.geo_region, None)
+        eq_(located.geo_city, None)
+        with_city = UserProfile.objects.get(pk=with_city.pk)
+        eq_(with_city.geo_region, self.city.region)
+        eq_(with_city.geo_city, self.city)
+
+
+class RateLimiterTests(TestCase):
+    @patch('mozillians.users.management.commands.reverse_geocode_profiles.time')
+    def test_wait(self, time_mock):
+        time_mock.time.return_value = 100
+        limiter = RateLimiter(2)
+        limiter.wait()
+        ok_(not time_mock.sleep.called)
+        limiter.wait()
+        limiter.wait()
+        eq_([c[0][0] for c in time_mock.sleep.call_args_list], [0.5, 1.0])
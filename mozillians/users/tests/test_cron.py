@@ -0,0 +1,91 @@
+from django.test.utils import override_settings
+
+from mock import patch
+from pyes.exceptions import ElasticSearchException
+from nose.tools import eq_, ok_
+
+from mozillians.common.tests import TestCase
+from mozillians.users.cron import index_all_profiles
+from mozillians.users.models import UserProfile
+from mozillians.users.tests import UserFactory
+
+
+@override_settings(ES_INDEXES={'default': 'foo', 'public': 'foo-public'})
+@patch('mozillians.users.cron._get_indexed_ids', return_value=set())
+@patch('mozillians.users.cron.delete_stale_indexes')
+@patch('mozillians.users.cron.swap_alias')
+@patch('mozillians.users.cron.create_versioned_index')
+@patch('mozillians.users.cron.get_es')
+class IndexAllProfilesTests(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create()
+
+    @patch('mozillians.users.cron.get_checkpoint', return_value=None)
+    @patch('mozillians.users.cron.clear_checkpoint')
+    def test_rebuild(self, clear_checkpoint_mock, get_checkpoint_mock, get_es_mock,
+                     create_index_mock, swap_alias_mock, delete_stale_mock,
+                     get_indexed_ids_mock):
+        create_index_mock.side_effect = lambda es, alias, mappings: alias + '-new'
+        index_all_profiles()
+        delete_stale_mock.assert_any_call(get_es_mock(), 'foo')
+        delete_stale_mock.assert_any_call(get_es_mock(), 'foo-public')
+        es = get_es_mock()
+        indexes = [c[1]['index'] for c in es.index.call_args_list]
+        eq_(set(indexes), set(['foo-new']))
+        swap_alias_mock.assert_any_call(es, 'foo', 'foo-new')
+        swap_alias_mock.assert_any_call(es, 'foo-public', 'foo-public-new')
+        ok_(clear_checkpoint_mock.called)
+
+    @patch('mozillians.users.cron.get_checkpoint', return_value=None)
+    @patch('mozillians.users.cron.clear_checkpoint')
+    def test_failed_swap(self, clear_checkpoint_mock, get_checkpoint_mock, get_es_mock,
+                         create_index_mock, swap_alias_mock, delete_stale_mock,
+                         get_indexed_ids_mock):
+        # The checkpoint is kept for the next run to swap again.
+        create_index_mock.side_effect = lambda es, alias, mappings: alias + '-new'
+        swap_alias_mock.side_effect = ElasticSearchException
+        with self.assertRaises(ElasticSearchException):
+            index_all_profiles()
+        ok_(not clear_checkpoint_mock.called)
+
+    @patch('mozillians.users.cron.get_checkpoint')
+    @patch('mozillians.users.cron.clear_checkpoint')
+    def test_resume(self, clear_checkpoint_mock, get_checkpoint_mock, get_es_mock,
+                    create_index_mock, swap_alias_mock, delete_stale_mock,
+                    get_indexed_ids_mock):
+        other_user = UserFactory.create()
+        get_checkpoint_mock.return_value = {
+            'started': other_user.userprofile.last_updated,
+            'indexes': {'default': 'foo-old', 'public': 'foo-public-old'},
+            'stage': 'default',
+            'last_id': self.user.userprofile.id}
+        index_all_profiles()
+        ok_(not create_index_mock.called)
+        ok_(not delete_stale_mock.called)
+        es = get_es_mock()
+        ids = [c[1]['id'] for c in es.index.call_args_list]
+        ok_(self.user.userprofile.id not in ids)
+        ok_(other_user.userprofile.id in ids)
+        swap_alias_mock.assert_any_call(es, 'foo', 'foo-old')
+
+    @patch('mozillians.users.cron.get_checkpoint')
+    @patch('mozillians.users.cron.clear_checkpoint')
+    def test_catch_up_deleted(self, clear_checkpoint_mock, get_checkpoint_mock, get_es_mock,
+                              create_index_mock, swap_alias_mock, delete_stale_mock,
+                              get_indexed_ids_mock):
+        deleted_user = UserFactory.create()
+        deleted_id = deleted_user.userprofile.id
+        get_checkpoint_mock.return_value = {
+            'started': deleted_user.userprofile.last_updated,
+            'indexes': {'default': 'foo-old', 'public': 'foo-public-old'},
+            'stage': 'public',
+            'last_id': deleted_id}
+        get_indexed_ids_mock.return_value = set([self.user.userprofile.id, deleted_id])
+        deleted_user.delete()
+        index_all_profiles()
+        es = get_es_mock()
+        doc_type = UserProfile.get_mapping_type()
+        es.delete.assert_any_call('foo-old', doc_type, deleted_id)
+        es.delete.assert_any_call('foo-public-old', doc_type, deleted_id)
+        # Caught up twice, the second time right before the swap.
+        eq_(get_indexed_ids_mock.call_count, 4)
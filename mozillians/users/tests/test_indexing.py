@@ -0,0 +1,116 @@
+from mock import MagicMock, call, patch
+from nose.tools import eq_, ok_
+from pyes.exceptions import ElasticSearchException, IndexMissingException
+
+from mozillians.common.tests import TestCase
+from mozillians.users.indexing import (BulkIndexer, clear_checkpoint, delete_stale_indexes,
+                                       get_checkpoint, save_checkpoint, stream_ids, swap_alias)
+from mozillians.users.models import UserProfile
+from mozillians.users.tests import UserFactory
+
+
+class BulkIndexerTests(TestCase):
+    def test_flush_on_size(self):
+        es = MagicMock()
+        indexer = BulkIndexer(es, max_bytes=30)
+        indexer.index({'name': 'foo'}, 'index', 'doc_type', 1)
+        ok_(not es.flush_bulk.called)
+        indexer.index({'name': 'a much longer name'}, 'index', 'doc_type', 2)
+        es.flush_bulk.assert_called_with(forced=True)
+        eq_(indexer.queued, 0)
+        eq_(indexer.indexed, 2)
+
+    def test_flush_nothing_queued(self):
+        es = MagicMock()
+        indexer = BulkIndexer(es)
+        indexer.flush()
+        ok_(not es.flush_bulk.called)
+
+    def test_failed_items(self):
+        es = MagicMock()
+        es.flush_bulk.return_value = {
+            'items': [{'index': {'_id': '1', 'ok': True}},
+                      {'index': {'_id': '2', 'error': 'MapperParsingException'}}]}
+        indexer = BulkIndexer(es)
+        indexer.index({}, 'index', 'doc_type', 1)
+        indexer.index({}, 'index', 'doc_type', 2)
+        indexer.flush()
+        eq_(indexer.indexed, 1)
+        eq_(indexer.failed, [('2', 'MapperParsingException')])
+
+
+class StreamIdsTests(TestCase):
+    def test_batches(self):
+        profiles = [UserFactory.create().userprofile for i in range(5)]
+        batches = list(stream_ids(UserProfile.objects.all(), batch_size=2))
+        eq_([len(batch) for batch in batches], [2, 2, 1])
+        eq_([id_ for batch in batches for id_ in batch],
+            sorted(profile.id for profile in profiles))
+
+    def test_resume(self):
+        profiles = [UserFactory.create().userprofile for i in range(3)]
+        batches = list(stream_ids(UserProfile.objects.all(), last_id=profiles[0].id))
+        eq_(batches, [[profiles[1].id, profiles[2].id]])
+
+
+class SwapAliasTests(TestCase):
+    def test_swap(self):
+        es = MagicMock()
+        es.get_alias.return_value = ['foo-1']
+        swap_alias(es, 'foo', 'foo-2')
+        es.change_aliases.assert_called_with(
+            [('add', 'foo-2', 'foo'), ('remove', 'foo-1', 'foo')])
+        es.delete_index.assert_called_with('foo-1')
+
+    def test_first_swap(self):
+        es = MagicMock()
+        es.get_alias.side_effect = IndexMissingException
+        swap_alias(es, 'foo', 'foo-2')
+        es.change_aliases.assert_called_with([('add', 'foo-2', 'foo')])
+        ok_(not es.delete_index.called)
+
+    def test_swap_concrete_index(self):
+        es = MagicMock()
+        es.get_alias.return_value = ['foo']
+        swap_alias(es, 'foo', 'foo-2')
+        eq_(es.mock_calls[1:], [call.delete_index('foo'),
+                                call.change_aliases([('add', 'foo-2', 'foo')])])
+
+    def test_swap_concrete_index_failed(self):
+        es = MagicMock()
+        es.get_alias.return_value = ['foo']
+        es.change_aliases.side_effect = ElasticSearchException
+        with self.assertRaises(ElasticSearchException):
+            swap_alias(es, 'foo', 'foo-2')
+        es.delete_index.assert_called_once_with('foo')
+
+        # The next run finds no index named foo and adds the alias.
+        es.reset_mock()
+        es.get_alias.side_effect = IndexMissingException
+        es.change_aliases.side_effect = None
+        swap_alias(es, 'foo', 'foo-2')
+        es.change_aliases.assert_called_with([('add', 'foo-2', 'foo')])
+        ok_(not es.delete_index.called)
+
+
+class DeleteStaleIndexesTests(TestCase):
+    def test_delete(self):
+        es = MagicMock()
+        es.get_alias.return_value = ['foo-20140101000000']
+        es.get_indices.return_value = {'foo-20140101000000': {},
+                                       'foo-20140102000000': {},
+                                       'foo-public-20140102000000': {},
+                                       'foo': {}}
+        delete_stale_indexes(es, 'foo')
+        es.delete_index.assert_called_once_with('foo-20140102000000')
+
+
+class CheckpointTests(TestCase):
+    def test_checkpoint(self):
+        with patch('mozillians.users.indexing.cache') as cache_mock:
+            save_checkpoint({'last_id': 5})
+            ok_(cache_mock.set.called)
+            get_checkpoint()
+            ok_(cache_mock.get.called)
+            clear_checkpoint()
+            ok_(cache_mock.delete.called)
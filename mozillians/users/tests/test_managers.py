@@ -2,7 +2,7 @@ from mock import patch
 from nose.tools import eq_
 
 from mozillians.common.tests import TestCase
-from mozillians.users.managers import PUBLIC
+from mozillians.users.managers import MOZILLIANS, PUBLIC
 from mozillians.users.models import UserProfile
 from mozillians.users.tests import UserFactory
 
@@ -76,3 +76,36 @@ class UserProfileQuerySetTests(TestCase):
         queryset = UserProfile.objects.all()
         queryset.privacy_level(99)
         eq_(queryset.all()[0]._privacy_level, 99)
+
+    def test_values_privacy(self):
+        user = UserFactory.create(userprofile={'privacy_ircname': PUBLIC,
+                                               'ircname': 'foo', 'bio': 'bar'})
+        queryset = (UserProfile.objects.filter(pk=user.userprofile.pk).privacy_level(PUBLIC)
+                    .values('ircname', 'privacy_ircname', 'bio', 'privacy_bio'))
+        eq_(list(queryset), [{'ircname': 'foo', 'privacy_ircname': PUBLIC,
+                              'bio': '', 'privacy_bio': MOZILLIANS}])
+
+    def test_values_list_privacy(self):
+        user = UserFactory.create(userprofile={'privacy_ircname': PUBLIC,
+                                               'ircname': 'foo', 'bio': 'bar'})
+        queryset = UserProfile.objects.filter(pk=user.userprofile.pk)
+        fields = ['ircname', 'privacy_ircname', 'bio', 'privacy_bio']
+        eq_(list(queryset.privacy_level(PUBLIC).values_list(*fields)),
+            [('foo', PUBLIC, '', MOZILLIANS)])
+        eq_(list(queryset.privacy_level(MOZILLIANS).values_list(*fields)),
+            [('foo', PUBLIC, 'bar', MOZILLIANS)])
+        eq_(list(queryset.values_list('bio', flat=True)), ['bar'])
+
+    def test_values_without_privacy_field(self):
+        user = UserFactory.create(userprofile={'bio': 'bar'})
+        queryset = UserProfile.objects.filter(pk=user.userprofile.pk).privacy_level(PUBLIC)
+        with self.assertRaises(ValueError):
+            list(queryset.values('bio'))
+        with self.assertRaises(ValueError):
+            list(queryset.values_list('bio', flat=True))
+
+    def test_values_list_privacy_extra(self):
+        user = UserFactory.create(userprofile={'bio': 'bar'})
+        queryset = (UserProfile.objects.filter(pk=user.userprofile.pk).privacy_level(PUBLIC)
+                    .extra(select={'one': '1'}).values_list('bio', 'privacy_bio', 'one'))
+        eq_(list(queryset), [('', MOZILLIANS, 1)])
@@ -33,24 +33,15 @@ class SignaledFunctionsTests(TestCase):
         user = UserFactory.create()
         update_basket_mock.assert_called_with(user.userprofile.id)
 
-    @patch('mozillians.users.models.index_objects.delay')
-    @patch('mozillians.users.models.unindex_objects.delay')
-    def test_update_index_post_save(self, unindex_objects_mock,
-                                    index_objects_mock):
+    @patch('mozillians.users.models.queue_index_update')
+    def test_update_index_post_save(self, queue_index_update_mock):
         user = UserFactory.create()
-        index_objects_mock.assert_called_with(
-            UserProfile, [user.userprofile.id], public_index=False)
-        unindex_objects_mock.assert_called_with(
-            UserProfile, [user.userprofile.id], public_index=True)
-
-    @patch('mozillians.users.models.index_objects.delay')
-    @patch('mozillians.users.models.unindex_objects.delay')
-    def test_update_index_post_save_incomplete_profile(self,
-                                                       unindex_objects_mock,
-                                                       index_objects_mock):
+        queue_index_update_mock.assert_called_with(user.userprofile.id)
+
+    @patch('mozillians.users.models.queue_index_update')
+    def test_update_index_post_save_incomplete_profile(self, queue_index_update_mock):
         UserFactory.create(userprofile={'full_name': ''})
-        ok_(not index_objects_mock.called)
-        ok_(not unindex_objects_mock.called)
+        ok_(not queue_index_update_mock.called)
 
     def test_remove_from_index_post_delete(self):
         user = UserFactory.create()
@@ -175,9 +166,43 @@ class UserProfileTests(TestCase):
         eq_(result['has_photo'], False)
         eq_(result['groups'], [group_1.name, group_2.name])
         eq_(result['skills'], [skill_1.name, skill_2.name])
+        eq_(result['group_ids'], sorted([group_1.id, group_2.id]))
+        eq_(result['skill_ids'], sorted([skill_1.id, skill_2.id]))
+        eq_(result['country_id'], profile.geo_country.id)
+        eq_(result['timezone'], profile.timezone)
         eq_(set(result['languages']),
             set([u'en', u'fr', u'english', u'french', u'français']))
 
+    def test_extract_documents(self):
+        profiles = []
+        for i in range(3):
+            profile = UserFactory.create().userprofile
+            GroupFactory.create().add_member(profile)
+            profile.skills.add(SkillFactory.create())
+            LanguageFactory.create(code='fr', userprofile=profile)
+            profiles.append(profile)
+        ids = [p.id for p in profiles]
+
+        with self.assertNumQueries(4):
+            documents = dict(UserProfile.extract_documents(ids))
+
+        for profile in profiles:
+            expected = UserProfile.extract_document(profile.id)
+            result = documents[profile.id]
+            eq_(set(result.pop('languages')), set(expected.pop('languages')))
+            eq_(result, expected)
+
+    def test_extract_documents_privacy(self):
+        profile = UserFactory.create(userprofile={'privacy_groups': PUBLIC,
+                                                  'privacy_skills': MOZILLIANS}).userprofile
+        group = GroupFactory.create()
+        group.add_member(profile)
+        profile.skills.add(SkillFactory.create())
+
+        documents = dict(UserProfile.extract_documents([profile.id], privacy_level=PUBLIC))
+        eq_(documents[profile.id]['groups'], [group.name])
+        eq_(documents[profile.id]['skills'], [])
+
     def test_get_mapping(self):
         ok_(UserProfile.get_mapping())
 
@@ -675,6 +700,17 @@ class VouchTests(TestCase):
         user_profile.set_instance_privacy_level(MOZILLIANS)
         eq_(set(user_profile.vouches_made.all()), set(Vouch.objects.filter(voucher=user_profile)))
 
+    def test_vouchee_privacy_num_queries(self):
+        voucher = UserFactory.create()
+        for privacy in [PUBLIC, PUBLIC, MOZILLIANS]:
+            vouchee = UserFactory.create(userprofile={'privacy_full_name': privacy})
+            vouchee.userprofile.vouch(voucher.userprofile)
+        user_profile = UserProfile.objects.get(pk=voucher.userprofile.pk)
+        user_profile.set_instance_privacy_level(PUBLIC)
+
+        with self.assertNumQueries(1):
+            eq_(len(user_profile.vouches_made.all()), 2)
+
     def test_vouch_reset(self):
         voucher = UserFactory.create()
         user = UserFactory.create()
@@ -756,3 +792,12 @@ class PrivacyModelTests(unittest.TestCase):
         with patch.object(UserProfile._meta, 'get_all_field_names') as mock_get_all_field_names:
             UserProfile.privacy_fields()
         ok_(not mock_get_all_field_names.called)
+
+    def test_privacy_table(self):
+        table = UserProfile.privacy_table()
+        eq_(table['ircname'], ('privacy_ircname', ''))
+        eq_(table['email'], ('privacy_email', ''))
+        eq_(set(table), set(UserProfile.privacy_fields()))
+        ok_(UserProfile.privacy_table() is table)
+        UserProfile.clear_privacy_fields_cache()
+        ok_(UserProfile.CACHED_PRIVACY_TABLE is None)
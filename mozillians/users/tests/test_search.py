@@ -0,0 +1,92 @@
+from mock import MagicMock, patch
+from nose.tools import eq_, ok_
+
+from mozillians.common.tests import TestCase
+from mozillians.geo.tests import CountryFactory
+from mozillians.groups.tests import GroupFactory, SkillFactory
+from mozillians.users.managers import MOZILLIANS, PUBLIC
+from mozillians.users.models import UserProfile
+from mozillians.users.search import (FACETS, SearchResult, facets_to_json, get_facets,
+                                     with_facets)
+from mozillians.users.tests import UserFactory
+
+
+class SearchResultTests(TestCase):
+    def setUp(self):
+        self.profile = UserFactory.create(userprofile={'full_name': 'Foo Bar',
+                                                       'ircname': 'FooBar',
+                                                       'privacy_full_name': PUBLIC,
+                                                       'privacy_ircname': MOZILLIANS,
+                                                       'privacy_email': MOZILLIANS}).userprofile
+        self.document = UserProfile.extract_document(self.profile.id)
+
+    def test_values(self):
+        result = SearchResult(self.document)
+        eq_(result.id, self.profile.id)
+        eq_(result.user.username, self.profile.user.username)
+        eq_(result.display_name, 'Foo Bar')
+        eq_(result.ircname, 'FooBar')
+        eq_(result.email, self.profile.user.email)
+
+    def test_privacy(self):
+        result = SearchResult(self.document, PUBLIC)
+        eq_(result.display_name, 'Foo Bar')
+        eq_(result.ircname, '')
+        eq_(result.email, '')
+
+    def test_get_photo_url(self):
+        result = SearchResult(self.document)
+        eq_(result.get_photo_url('70x70'), self.profile.get_photo_url('70x70'))
+
+    @patch('mozillians.users.search.get_thumbnail')
+    def test_get_photo_url_private(self, get_thumbnail_mock):
+        self.document['result']['privacy']['photo'] = MOZILLIANS
+        result = SearchResult(self.document, PUBLIC)
+        eq_(result.get_photo_url('70x70'), get_thumbnail_mock.return_value.url)
+        ok_(get_thumbnail_mock.called)
+
+
+    def test_document_without_result(self):
+        del self.document['result']
+        result = SearchResult(self.document, PUBLIC)
+        eq_(result.user.username, self.profile.user.username)
+        eq_(result.display_name, 'foo bar')
+        eq_(result.ircname, self.document['ircname'])
+        eq_(result.photo, '')
+
+class FacetTests(TestCase):
+    def test_with_facets(self):
+        s = MagicMock()
+        eq_(with_facets(s), s.facet.return_value)
+        s.facet.assert_called_with(*[field for name, field in FACETS], filtered=True)
+
+    def test_get_facets(self):
+        country = CountryFactory.create()
+        group = GroupFactory.create()
+        hidden_group = GroupFactory.create(visible=False)
+        skill = SkillFactory.create()
+        s = MagicMock()
+        s.facet_counts.return_value = {
+            'country_id': [{'term': country.id, 'count': 3}, {'term': 0, 'count': 1}],
+            'group_ids': [{'term': group.id, 'count': 2},
+                          {'term': hidden_group.id, 'count': 1}],
+            'skill_ids': [{'term': skill.id, 'count': 1}],
+            'language_codes': [{'term': 'fr', 'count': 2}],
+            'is_vouched': [{'term': 'T', 'count': 3}, {'term': 'F', 'count': 1}],
+        }
+
+        facets = get_facets(s)
+        eq_(facets, {'country': [(country, 3)],
+                     'groups': [(group, 2)],
+                     'skills': [(skill, 1)],
+                     'languages': [('fr', 2)],
+                     'vouched': [(True, 3), (False, 1)]})
+        data = facets_to_json(facets)
+        eq_(data['country'], [{'id': country.id, 'name': country.name, 'count': 3}])
+        eq_(data['languages'], [{'code': 'fr', 'name': u'French', 'count': 2}])
+        eq_(data['vouched'], [{'vouched': True, 'count': 3}, {'vouched': False, 'count': 1}])
+
+    def test_get_facets_empty(self):
+        s = MagicMock()
+        s.facet_counts.return_value = {}
+        eq_(get_facets(s), dict((name, []) for name, field in FACETS))
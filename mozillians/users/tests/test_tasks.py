@@ -2,20 +2,27 @@ from datetime import datetime
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import get_cache
 from django.test.utils import override_settings
 
+from celery.exceptions import MaxRetriesExceededError, RetryTaskError
 from mock import MagicMock, Mock, call, patch
 
 from nose.tools import eq_, ok_
 from pyes.exceptions import ElasticSearchException
 
 from mozillians.common.tests import TestCase
+from mozillians.geo.lookup import GeoLookupException
+from mozillians.geo.models import City, Country
+from mozillians.geo.tests import CityFactory
 from mozillians.groups.tests import GroupFactory
 from mozillians.users.managers import PUBLIC
 from mozillians.users.models import UserProfile
-from mozillians.users.tasks import (_email_basket_managers, index_objects,
+from mozillians.users.tasks import (GEOCODE_TASK_PENDING_DELAY, GEOCODE_TASK_PENDING_RETRIES,
+                                    _email_basket_managers, flush_index_queue,
+                                    index_objects, queue_index_update,
                                     remove_incomplete_accounts, unindex_objects,
-                                    remove_from_basket_task)
+                                    remove_from_basket_task, reverse_geocode_profile)
 from mozillians.users.tests import UserFactory
 
 
@@ -46,44 +53,51 @@ class IncompleteAccountsTests(TestCase):
 class ElasticSearchIndexTests(TestCase):
     @patch('mozillians.users.tasks.get_es')
     def test_index_objects(self, get_es_mock):
-        user_1 = UserFactory.create()
-        user_2 = UserFactory.create()
         model = MagicMock()
-        model.objects.filter.return_value = [
-            user_1.userprofile, user_2.userprofile]
-        index_objects(
-            model, [user_1.userprofile.id, user_2.userprofile.id], False)
-        model.objects.assert_has_calls([
-            call.filter(id__in=[user_1.userprofile.id, user_2.userprofile.id])])
-        model.index.assert_has_calls([
-            call(model.extract_document(), bulk=True, id_=user_1.userprofile.id,
-                 es=get_es_mock(), public_index=False),
-            call(model.extract_document(), bulk=True, id_=user_2.userprofile.id,
-                 es=get_es_mock(), public_index=False)])
-        model.refresh_index.assert_has_calls([
-            call(es=get_es_mock()),
-            call(es=get_es_mock())])
+        model.get_index.return_value = 'index'
+        model.get_mapping_type.return_value = 'doc_type'
+        model.extract_documents.return_value = [(1, 'doc1'), (2, 'doc2')]
+        index_objects(model, [1, 2], False)
+        model.extract_documents.assert_called_with([1, 2], privacy_level=None)
+        model.get_index.assert_called_with(False)
+        get_es_mock().index.assert_has_calls([
+            call('doc1', index='index', doc_type='doc_type', id=1, bulk=True),
+            call('doc2', index='index', doc_type='doc_type', id=2, bulk=True)])
+        eq_(get_es_mock().flush_bulk.call_count, 1)
+        model.refresh_index.assert_called_once_with(es=get_es_mock(), public_index=False)
 
     @patch('mozillians.users.tasks.get_es')
     def test_index_objects_public(self, get_es_mock):
-        user_1 = UserFactory.create()
-        user_2 = UserFactory.create()
         model = MagicMock()
-        model.objects.privacy_level().filter.return_value = [
-            user_1.userprofile, user_2.userprofile]
-        index_objects(
-            model, [user_1.userprofile.id, user_2.userprofile.id], True)
-        model.objects.assert_has_calls([
-            call.filter(id__in=[user_1.userprofile.id, user_2.userprofile.id]),
-            call.privacy_level(PUBLIC)])
-        model.index.assert_has_calls([
-            call(model.extract_document(), bulk=True, id_=user_1.userprofile.id,
-                 es=get_es_mock(), public_index=True),
-            call(model.extract_document(), bulk=True, id_=user_2.userprofile.id,
-                 es=get_es_mock(), public_index=True)])
-        model.refresh_index.assert_has_calls([
-            call(es=get_es_mock()),
-            call(es=get_es_mock())])
+        model.get_index.return_value = 'public_index'
+        model.get_mapping_type.return_value = 'doc_type'
+        model.extract_documents.return_value = [(1, 'doc1'), (2, 'doc2')]
+        index_objects(model, [1, 2], True)
+        model.extract_documents.assert_called_with([1, 2], privacy_level=PUBLIC)
+        model.get_index.assert_called_with(True)
+        get_es_mock().index.assert_has_calls([
+            call('doc1', index='public_index', doc_type='doc_type', id=1, bulk=True),
+            call('doc2', index='public_index', doc_type='doc_type', id=2, bulk=True)])
+        eq_(get_es_mock().flush_bulk.call_count, 1)
+        model.refresh_index.assert_called_once_with(es=get_es_mock(), public_index=True)
+
+    @patch('mozillians.users.tasks.get_es')
+    def test_index_objects_no_refresh(self, get_es_mock):
+        model = MagicMock()
+        model.extract_documents.return_value = [(1, 'doc1')]
+        index_objects(model, [1], False, refresh=False)
+        eq_(get_es_mock().flush_bulk.call_count, 1)
+        ok_(not model.refresh_index.called)
+
+    @patch('mozillians.users.tasks.get_es')
+    def test_index_objects_failures(self, get_es_mock):
+        model = MagicMock()
+        model.extract_documents.return_value = [(1, 'doc1')]
+        get_es_mock().flush_bulk.return_value = {
+            'items': [{'index': {'_id': '1', 'error': 'error'}}]}
+        failed = index_objects(model, [1], False)
+        eq_(failed, ['1'])
+        ok_(not model.refresh_index.called)
 
     @patch('mozillians.users.tasks.get_es')
     def test_unindex_objects(self, get_es_mock):
@@ -103,6 +117,130 @@ class ElasticSearchIndexTests(TestCase):
         unindex_objects(model, [1, 2, 3], 'foo')
 
 
+@patch('mozillians.users.tasks.flush_index_queue.apply_async')
+@patch('mozillians.users.tasks.unindex_objects.delay')
+@patch('mozillians.users.tasks.index_objects.delay')
+class IndexQueueTests(TestCase):
+    def setUp(self):
+        self.cache = get_cache('django.core.cache.backends.locmem.LocMemCache')
+        patcher = patch('mozillians.users.tasks.cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def reset(self, *mocks):
+        # Creating profiles queues them too, start from an empty queue.
+        self.cache.clear()
+        for mock in mocks:
+            mock.reset_mock()
+
+    def test_coalesce(self, index_mock, unindex_mock, apply_async_mock):
+        user_1 = UserFactory.create()
+        user_2 = UserFactory.create(userprofile={'privacy_full_name': PUBLIC})
+        self.reset(index_mock, unindex_mock, apply_async_mock)
+        queue_index_update(user_1.userprofile.id)
+        queue_index_update(user_2.userprofile.id)
+        queue_index_update(user_1.userprofile.id)
+        eq_(apply_async_mock.call_count, 1)
+        ok_(not index_mock.called)
+
+        with patch('mozillians.users.tasks.statsd') as statsd_mock:
+            flush_index_queue()
+        index_mock.assert_has_calls([
+            call(UserProfile, sorted([user_1.userprofile.id, user_2.userprofile.id]),
+                 public_index=False),
+            call(UserProfile, [user_2.userprofile.id], public_index=True)])
+        unindex_mock.assert_called_with(UserProfile, [user_1.userprofile.id],
+                                        public_index=True)
+        statsd_mock.incr.assert_has_calls([call('users.index_queue.flushed', 2),
+                                           call('users.index_queue.coalesced', 1)])
+
+    def test_schedule_after_flush(self, index_mock, unindex_mock, apply_async_mock):
+        user = UserFactory.create()
+        self.reset(index_mock, unindex_mock, apply_async_mock)
+        queue_index_update(user.userprofile.id)
+        flush_index_queue()
+        index_mock.reset_mock()
+
+        queue_index_update(user.userprofile.id)
+        eq_(apply_async_mock.call_count, 2)
+        flush_index_queue()
+        index_mock.assert_called_with(UserProfile, [user.userprofile.id], public_index=False)
+
+    def test_flush_empty_queue(self, index_mock, unindex_mock, apply_async_mock):
+        self.reset()
+        flush_index_queue()
+        ok_(not index_mock.called)
+
+    def test_cache_not_available(self, index_mock, unindex_mock, apply_async_mock):
+        user = UserFactory.create()
+        self.reset(index_mock, unindex_mock, apply_async_mock)
+        with patch('mozillians.users.tasks.cache') as cache_mock:
+            cache_mock.incr.side_effect = ValueError
+            queue_index_update(user.userprofile.id)
+        ok_(not apply_async_mock.called)
+        index_mock.assert_called_with(UserProfile, [user.userprofile.id], public_index=False)
+
+
+@patch('mozillians.users.tasks.queue_index_update')
+@patch('mozillians.geo.lookup.reverse_geocode')
+class ReverseGeocodeProfileTests(TestCase):
+    def setUp(self):
+        self.city = CityFactory.create()
+        self.profile = UserFactory.create(userprofile={'lat': 10.0, 'lng': 20.0,
+                                                       'geo_country': None,
+                                                       'geo_region': None,
+                                                       'geo_city': None,
+                                                       'geocode_pending': True}).userprofile
+
+    def get_geo(self):
+        profile = UserProfile.objects.get(pk=self.profile.pk)
+        return (profile.geo_country, profile.geo_region, profile.geo_city,
+                profile.geocode_pending)
+
+    def test_resolve(self, reverse_geocode_mock, queue_index_update_mock):
+        reverse_geocode_mock.return_value = (self.city.country, self.city.region, self.city)
+        reverse_geocode_profile(self.profile.id, 10.0, 20.0)
+        reverse_geocode_mock.assert_called_with(10.0, 20.0)
+        eq_(self.get_geo(), (self.city.country, self.city.region, self.city, False))
+        queue_index_update_mock.assert_called_with(self.profile.id)
+        eq_(City.objects.get(pk=self.city.pk).vouched_member_count, 1)
+
+    def test_region_city_optout(self, reverse_geocode_mock, queue_index_update_mock):
+        reverse_geocode_mock.return_value = (self.city.country, self.city.region, self.city)
+        reverse_geocode_profile(self.profile.id, 10.0, 20.0, save_region=False, save_city=False)
+        eq_(self.get_geo(), (self.city.country, None, None, False))
+
+    @patch('mozillians.users.tasks.reverse_geocode_profile.retry')
+    def test_not_committed(self, retry_mock, reverse_geocode_mock, queue_index_update_mock):
+        # The save that queued the task isn't visible yet.
+        retry_mock.side_effect = RetryTaskError
+        UserProfile.objects.filter(pk=self.profile.pk).update(geocode_pending=False)
+        with self.assertRaises(RetryTaskError):
+            reverse_geocode_profile(self.profile.id, 10.0, 20.0)
+        retry_mock.assert_called_with(countdown=GEOCODE_TASK_PENDING_DELAY,
+                                      max_retries=GEOCODE_TASK_PENDING_RETRIES)
+        ok_(not reverse_geocode_mock.called)
+
+    @patch('mozillians.users.tasks.reverse_geocode_profile.retry')
+    def test_moved(self, retry_mock, reverse_geocode_mock, queue_index_update_mock):
+        # The profile moved before the task ran, a newer task resolves it.
+        retry_mock.side_effect = MaxRetriesExceededError
+        reverse_geocode_profile(self.profile.id, 30.0, 20.0)
+        ok_(retry_mock.called)
+        ok_(not reverse_geocode_mock.called)
+        eq_(self.get_geo(), (None, None, None, True))
+        ok_(not queue_index_update_mock.called)
+
+    @patch('mozillians.users.tasks.reverse_geocode_profile.retry')
+    def test_error(self, retry_mock, reverse_geocode_mock, queue_index_update_mock):
+        error_country = Country.objects.create(name='Error', mapbox_id='geo_error')
+        reverse_geocode_mock.side_effect = GeoLookupException
+        retry_mock.side_effect = MaxRetriesExceededError
+        reverse_geocode_profile(self.profile.id, 10.0, 20.0)
+        ok_(retry_mock.called)
+        eq_(self.get_geo(), (error_country, None, None, False))
+
+
 class BasketTests(TestCase):
     @override_settings(BASKET_MANAGERS=False)
     @patch('mozillians.users.tasks.send_mail')
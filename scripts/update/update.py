@@ -98,6 +98,12 @@ def update_es_indexes(ctx):
     with ctx.lcd(settings.SRC_DIR):
         ctx.local("python2.6 manage.py cron index_all_profiles &")
 
+@task
+def update_group_top_skills(ctx):
+    with ctx.lcd(settings.SRC_DIR):
+        ctx.local("python2.6 manage.py cron update_group_top_skills &")
+
+
 @task
 def validate_fun_facts(ctx):
     with ctx.lcd(settings.SRC_DIR):
@@ -180,6 +186,7 @@ def deploy(ctx):
         ping_newrelic()
         update_celery()
         update_es_indexes()
+        update_group_top_skills()
         validate_fun_facts()
         generate_humanstxt()
 